@@ -1,16 +1,91 @@
+import atexit
+import time
 from pathlib import Path
 
 from flask import Flask, render_template, redirect, url_for, request, Response, jsonify, stream_with_context, send_from_directory, abort
-from mqtt import MQTTClient, create_puzzles
-from config import PUZZLE_ORDER, PUZZLE_ALIASES, PUZZLE_FINAL, PUZZLE_TUTORIAL, SUBTITLE_LANG
-import queue
-import json
-import threading
+from mqtt import MQTTClient, Room, SSEHub, create_puzzles
+from config import (
+    PUZZLE_ORDER, PUZZLE_ALIASES, PUZZLE_FINAL, PUZZLE_TUTORIAL, SUBTITLE_LANG,
+    SSE_CLIENT_MAX_PENDING, SSE_REPLAY_BUFFER,
+    SERVER_MODE, SERVER_HOST, SERVER_PORT, SERVER_THREADS,
+    MQTT_WORKER_QUEUE_SIZE, MQTT_WORKER_OVERFLOW, ROOMS, ROOM_BRIDGE,
+    MQTT_MIRROR_MODE, MQTT_MIRROR_WINDOW, MQTT_MIRROR_RETAIN,
+    MQTT_HOST, MQTT_PORT, MQTT_KEEPALIVE, MQTT_RECONNECT_MIN, MQTT_RECONNECT_MAX, MQTT_OUTBOUND_QUEUE_SIZE,
+    MQTT_IN_PROCESS, LATENCY_TRACING, LOCK_INSTRUMENTATION, LOCK_HOLD_WARN_MS, LOCK_DUMP_PATH,
+    JOURNAL_ENABLED, JOURNAL_DIR, JOURNAL_FSYNC_INTERVAL, JOURNAL_SNAPSHOT_INTERVAL, JOURNAL_MAX_AGE,
+    JOURNAL_RECOVERY_BUDGET, RECORD_SESSIONS, RECORDINGS_DIR,
+)
+from mqtt.bridge import BridgedClient
+from mqtt.inprocess import InProcessBroker
+from mqtt.journal import SessionJournal
+from mqtt.locks import LockRegistry
+from mqtt.metrics import render_metrics
+from mqtt.recorder import SessionRecorder
+from mqtt.sse_hub import RESYNC_FRAME, parse_filter, parse_last_event_id
 
 app = Flask(__name__)
 BASE_DIR = Path(__file__).resolve().parent #Directori base del projecte jocPro/
 
-mqtt_client = MQTTClient(app, puzzle_order=PUZZLE_ORDER)
+# Puzzle lock wait/hold per call site, only when asked for
+lock_registry = LockRegistry(hold_threshold=LOCK_HOLD_WARN_MS / 1000) if LOCK_INSTRUMENTATION else None
+if lock_registry:
+    atexit.register(lock_registry.dump, str(BASE_DIR / LOCK_DUMP_PATH))
+
+# Session journal of the main room; a supervisor worker keeps one per room
+journal = SessionJournal(
+    str(BASE_DIR / JOURNAL_DIR / (str(ROOM_BRIDGE["room"]) if ROOM_BRIDGE else "")),
+    fsync_interval=JOURNAL_FSYNC_INTERVAL,
+    snapshot_interval=JOURNAL_SNAPSHOT_INTERVAL,
+    max_age=JOURNAL_MAX_AGE,
+) if JOURNAL_ENABLED else None
+if journal:
+    atexit.register(journal.sync)
+
+# Inputs and pushes of this run, for scripts/replay_session.py
+recorder = SessionRecorder(
+    str(BASE_DIR / RECORDINGS_DIR / (str(ROOM_BRIDGE["room"]) if ROOM_BRIDGE else ""))
+) if RECORD_SESSIONS else None
+if recorder:
+    atexit.register(recorder.flush)
+
+if ROOM_BRIDGE:
+    # Worker process of supervisor.py: MQTT goes through its shared connection
+    mqtt_client = BridgedClient(
+        app,
+        PUZZLE_ORDER,
+        ROOM_BRIDGE["address"],
+        ROOM_BRIDGE["room"],
+        worker_queue_size=MQTT_WORKER_QUEUE_SIZE,
+        worker_overflow=MQTT_WORKER_OVERFLOW,
+        mirror_mode=MQTT_MIRROR_MODE,
+        mirror_window=MQTT_MIRROR_WINDOW,
+        mirror_retain=MQTT_MIRROR_RETAIN,
+        tracing=LATENCY_TRACING,
+        lock_registry=lock_registry,
+        journal=journal,
+        recorder=recorder,
+    )
+else:
+    mqtt_client = MQTTClient(
+        app,
+        puzzle_order=PUZZLE_ORDER,
+        worker_queue_size=MQTT_WORKER_QUEUE_SIZE,
+        worker_overflow=MQTT_WORKER_OVERFLOW,
+        mirror_mode=MQTT_MIRROR_MODE,
+        mirror_window=MQTT_MIRROR_WINDOW,
+        mirror_retain=MQTT_MIRROR_RETAIN,
+        host=MQTT_HOST,
+        port=MQTT_PORT,
+        keepalive=MQTT_KEEPALIVE,
+        reconnect_min=MQTT_RECONNECT_MIN,
+        reconnect_max=MQTT_RECONNECT_MAX,
+        outbound_queue_size=MQTT_OUTBOUND_QUEUE_SIZE,
+        broker=InProcessBroker() if MQTT_IN_PROCESS else None,
+        tracing=LATENCY_TRACING,
+        lock_registry=lock_registry,
+        journal=journal,
+        recorder=recorder,
+    )
 SPECIAL_PUZZLE_IDS = {PUZZLE_TUTORIAL, PUZZLE_FINAL}
 
 LEGACY_ALIAS_TO_SCENE = {
@@ -31,17 +106,36 @@ LEGACY_ALIAS_TO_SCENE = {
 # Create puzzles based on PUZZLE_ORDER
 create_puzzles(mqtt_client, PUZZLE_ORDER)
 
-# Per-client SSE queues
-_sse_clients_lock = threading.Lock()
-_sse_clients = []  # list of queues, one per connected client
+# SSE fan-out: each update is encoded once and shared by every client queue
+sse_hub = SSEHub(
+    max_pending=SSE_CLIENT_MAX_PENDING,
+    replay_size=SSE_REPLAY_BUFFER,
+    snapshot_provider=mqtt_client.get_current_state,
+)
 
-def push_state_update(data):
-    with _sse_clients_lock:
-        for q in _sse_clients:
-            q.put(data)
+def push_state_update(data, event_id):
+    return sse_hub.publish(data, event_id)
 
 mqtt_client.set_update_callback(push_state_update)
 
+recovered = journal.recover(mqtt_client, JOURNAL_RECOVERY_BUDGET) if journal else None
+if ROOM_BRIDGE and not recovered:
+    mqtt_client.restore_state()
+
+# Extra rooms on the same MQTT connection, served under /room/<room_id>/
+rooms = {
+    str(room_id): Room(
+        str(room_id),
+        mqtt_client,
+        puzzle_order,
+        sse_max_pending=SSE_CLIENT_MAX_PENDING,
+        sse_replay_size=SSE_REPLAY_BUFFER,
+        worker_queue_size=MQTT_WORKER_QUEUE_SIZE,
+        worker_overflow=MQTT_WORKER_OVERFLOW,
+    )
+    for room_id, puzzle_order in ROOMS.items()
+}
+
 def iter_scene_candidate_dirs(scene_id):
     return [
         BASE_DIR / "scenes" / scene_id,  # legacy root
@@ -321,7 +415,7 @@ def puzzle(puzzle_id):
 @app.route('/puzzle4_sample_finished', methods=['POST'])
 def puzzle4_sample_finished():
     # Simulate MQTT message: P4,4,0 (button 4 = sample finished)
-    mqtt_client.puzzles[4].handle_message(['P4', '4', '0'])
+    mqtt_client.dispatch('P4,4,0')
     return '', 204
 
 #To start the puzzle from frontend
@@ -352,28 +446,41 @@ def restart_puzzle_route(puzzle_id):
     mqtt_client.start_puzzle(puzzle_id)
     return jsonify({"status": "restarted", "puzzle_id": puzzle_id}), 200
 
-@app.route('/state_stream')
-def state_stream():
-    client_queue = queue.Queue()
-    with _sse_clients_lock:
-        _sse_clients.append(client_queue)
+def sse_response(hub):
+    # Browsers send Last-Event-ID on automatic reconnects; pages that rebuild
+    # their EventSource pass it as a query parameter instead.
+    last_event_id = parse_last_event_id(
+        request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    )
+
+    # Optional filters, e.g. /state_stream?puzzle=3 or ?puzzle=1,3&kind=puzzle_solved
+    client = hub.subscribe(
+        label=request.remote_addr or "",
+        last_event_id=last_event_id,
+        puzzles=parse_filter(request.args.get('puzzle'), int),
+        kinds=parse_filter(request.args.get('kind')),
+    )
 
     @stream_with_context
     def event_stream():
         try:
-            yield ': init\n\n'
+            yield b': init\n\n'
             while True:
-                try:
-                    data = client_queue.get(timeout=15)
-                    print("Sending SSE data:", data)
-                    yield f"data: {json.dumps(data)}\n\n"
-                except queue.Empty:
-                    yield ': keep-alive\n\n'
+                # Already-encoded frame shared with every other client
+                frame = client.get(timeout=15)
+                if frame is None:
+                    yield b': keep-alive\n\n'
+                    continue
+                write_started = time.monotonic()
+                yield frame
+                # Resumed once the server wrote the frame out
+                client.written(write_started)
+                if frame is RESYNC_FRAME:
+                    break
         except GeneratorExit:
             print("Client disconnected from SSE.")
         finally:
-            with _sse_clients_lock:
-                _sse_clients.remove(client_queue)
+            hub.unsubscribe(client)
 
     resp = Response(event_stream(), mimetype="text/event-stream")
     resp.headers['Cache-Control'] = 'no-cache'
@@ -381,9 +488,121 @@ def state_stream():
     resp.headers['X-Accel-Buffering'] = 'no'
     return resp
 
+@app.route('/state_stream')
+def state_stream():
+    return sse_response(sse_hub)
+
+def state_response(client):
+    # Cached per state version: an unchanged puzzle costs neither its lock
+    # nor the encoder, and pollers sending If-None-Match get a 304
+    etag, _, body = client.get_current_state_cached()
+    response = Response(body, mimetype="application/json")
+    if etag:
+        response.set_etag(etag)
+        response.make_conditional(request)
+    return response
+
 @app.route('/current_state')
 def current_state():
-    return mqtt_client.get_current_state()
+    return state_response(mqtt_client)
+
+##### Sales addicionals (ROOMS a config.py) #####
+def get_room(room_id):
+    room = rooms.get(room_id)
+    if room is None:
+        abort(404)
+    return room
+
+@app.route('/room/<room_id>/state_stream')
+def room_state_stream(room_id):
+    return sse_response(get_room(room_id).hub)
+
+@app.route('/room/<room_id>/current_state')
+def room_current_state(room_id):
+    return state_response(get_room(room_id).client)
+
+@app.route('/room/<room_id>/start_puzzle/<int:puzzle_id>', methods=['POST'])
+def room_start_puzzle(room_id, puzzle_id):
+    room = get_room(room_id)
+    if puzzle_id not in room.client.puzzles:
+        return jsonify({"error": "invalid puzzle"}), 404
+    if room.client.current_puzzle_id == puzzle_id:
+        return jsonify({"status": "already_started"}), 200
+    room.client.start_puzzle(puzzle_id)
+    return jsonify({"status": "started", "room": room_id, "puzzle_id": puzzle_id}), 200
+
+@app.route('/room/<room_id>/restart_puzzle/<int:puzzle_id>', methods=['POST'])
+def room_restart_puzzle(room_id, puzzle_id):
+    room = get_room(room_id)
+    if puzzle_id not in room.client.puzzles:
+        return jsonify({"error": "invalid puzzle"}), 404
+    room.client.stop_current_puzzle()
+    room.client.start_puzzle(puzzle_id)
+    return jsonify({"status": "restarted", "room": room_id, "puzzle_id": puzzle_id}), 200
+
+@app.route('/room/<room_id>/timer_expired', methods=['POST'])
+def room_timer_expired(room_id):
+    get_room(room_id).client.timer_expired()
+    return '', 204
+
+@app.route('/internal/sse_clients')
+def internal_sse_clients():
+    return jsonify({"clients": sse_hub.stats()})
+
+@app.route('/internal/dispatch')
+def internal_dispatch():
+    return jsonify({**mqtt_client.dispatcher.stats(), "router": mqtt_client.router.stats()})
+
+@app.route('/internal/scheduler')
+def internal_scheduler():
+    return jsonify(mqtt_client.scheduler.stats())
+
+@app.route('/internal/mqtt')
+def internal_mqtt():
+    stats = mqtt_client.connection_stats()
+    if mqtt_client.broker:
+        stats["in_process"] = mqtt_client.broker.stats()
+    return jsonify(stats)
+
+@app.route('/internal/latency')
+def internal_latency():
+    if mqtt_client.tracer is None:
+        return jsonify({"enabled": False})
+    recent = request.args.get('recent', default=10, type=int)
+    return jsonify({"enabled": True, **mqtt_client.tracer.stats(recent=recent)})
+
+@app.route('/internal/locks')
+def internal_locks():
+    if lock_registry is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **lock_registry.stats()})
+
+@app.route('/internal/locks/dump', methods=['POST'])
+def internal_locks_dump():
+    if lock_registry is None:
+        return jsonify({"enabled": False}), 404
+    return jsonify({"enabled": True, "path": lock_registry.dump(str(BASE_DIR / LOCK_DUMP_PATH))})
+
+@app.route('/internal/journal')
+def internal_journal():
+    if journal is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **journal.stats()})
+
+@app.route('/internal/recording')
+def internal_recording():
+    if recorder is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **recorder.stats()})
+
+@app.route('/metrics')
+def metrics():
+    hubs = [("main", mqtt_client, sse_hub)] + [(room_id, room.client, room.hub) for room_id, room in rooms.items()]
+    return Response(render_metrics(mqtt_client, hubs), mimetype="text/plain; version=0.0.4")
+
+@app.route('/internal/mirror')
+def internal_mirror():
+    return jsonify(mqtt_client.mirror.stats())
 
 @app.route('/timer_expired', methods=['POST'])
 def timer_expired():
@@ -475,9 +694,15 @@ def test_puzzle6_solve():
 
     with puzzle6.lock:
         puzzle6.solvePuzzle = solve_puzzle
+    puzzle6.touch()
 
     return jsonify({"status": "ok", "puzzle_id": 6, "solvePuzzle": solve_puzzle}), 200
 
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    if SERVER_MODE == "async":
+        from async_server import serve
+        serve(app, sse_hub, host=SERVER_HOST, port=SERVER_PORT, threads=SERVER_THREADS,
+              room_hubs={room_id: room.hub for room_id, room in rooms.items()})
+    else:
+        app.run(debug=True)
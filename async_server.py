@@ -0,0 +1,307 @@
+"""Production serving mode built on asyncio.
+
+/state_stream connections live on the event loop, so hundreds of idle
+displays cost no threads. Every other route is handed to the Flask app
+(WSGI) on a small thread pool. Enable it with SERVER_MODE = "async" in
+config.py and start with `python app.py`.
+"""
+import asyncio
+import functools
+import io
+import itertools
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, unquote
+
+from mqtt.sse_hub import RESYNC_FRAME, parse_filter, parse_last_event_id
+
+SSE_PATH = "/state_stream"
+KEEPALIVE_SECONDS = 15
+MAX_HEADER_BYTES = 64 * 1024
+# WSGI body chunks waiting for the socket: a large static file is streamed,
+# not read into memory first
+RESPONSE_QUEUE_CHUNKS = 8
+
+SSE_RESPONSE_HEAD = (
+    b"HTTP/1.1 200 OK\r\n"
+    b"Content-Type: text/event-stream\r\n"
+    b"Cache-Control: no-cache\r\n"
+    b"Connection: keep-alive\r\n"
+    b"X-Accel-Buffering: no\r\n"
+    b"\r\n"
+    b": init\n\n"
+)
+
+
+class AsyncServer:
+    def __init__(self, app, sse_hub, host="0.0.0.0", port=5000, threads=8, room_hubs=None):
+        self.app = app
+        self.sse_hub = sse_hub
+        self.room_hubs = room_hubs or {}  # room_id -> SSEHub, streamed at /room/<id>/state_stream
+        self.host = host
+        self.port = port
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="wsgi")
+        self.loop = None
+        self.server = None
+        self.streams = {}  # SSEClient -> asyncio.Event of each open /state_stream
+
+        for hub in [sse_hub, *self.room_hubs.values()]:
+            hub.add_listener(self._on_publish)
+
+    # --- SSE wake-up ---
+
+    def _on_publish(self, clients):
+        # Runs on the publishing thread: one wake-up per event, not per client
+        loop = self.loop
+        if clients and loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._wake_streams, clients)
+
+    def _wake_streams(self, clients):
+        for client in clients:
+            wake = self.streams.get(client)
+            if wake is not None:
+                wake.set()
+
+    # --- Connection handling ---
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.server = await asyncio.start_server(
+            self._handle_connection, self.host, self.port,
+            limit=MAX_HEADER_BYTES, backlog=1024
+        )
+        return self.server
+
+    async def serve_forever(self):
+        server = await self.start()
+        print(f"[async_server] Serving on http://{self.host}:{self.port}")
+        async with server:
+            await server.serve_forever()
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            request = await self._read_request(reader, writer)
+            if request is None:
+                return
+            hub = self._stream_hub(request["path"]) if request["method"] == "GET" else None
+            if hub is not None:
+                await self._serve_stream(writer, request, hub)
+            else:
+                await self._serve_wsgi(writer, request)
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+
+    def _stream_hub(self, path):
+        """SSEHub streamed at this path, if any"""
+        if path == SSE_PATH:
+            return self.sse_hub
+        prefix, _, room_id = path[:-len(SSE_PATH)].rpartition("/")
+        if prefix == "/room" and path.endswith(SSE_PATH):
+            return self.room_hubs.get(room_id)
+        return None
+
+    async def _read_request(self, reader, writer):
+        head = await reader.readuntil(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, protocol = lines[0].split(" ", 2)
+        except ValueError:
+            return None
+
+        headers = {}
+        for line in lines[1:]:
+            if not line:
+                continue
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            writer.write(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            await writer.drain()
+            return None
+        body = await reader.readexactly(length) if length else b""
+
+        path, _, query = target.partition("?")
+        peer = writer.get_extra_info("peername") or ("", 0)
+        return {
+            "method": method.upper(),
+            "path": path,
+            "query": query,
+            "protocol": protocol,
+            "headers": headers,
+            "body": body,
+            "peer": peer,
+        }
+
+    async def _serve_stream(self, writer, request, hub):
+        query = {name: values[0] for name, values in parse_qs(request["query"]).items()}
+        last_event_id = parse_last_event_id(
+            request["headers"].get("last-event-id") or query.get("last_event_id")
+        )
+        # subscribe() may take a puzzle lock for a snapshot: keep it off the loop
+        client = await self.loop.run_in_executor(
+            self.executor,
+            functools.partial(
+                hub.subscribe,
+                label=request["peer"][0],
+                last_event_id=last_event_id,
+                puzzles=parse_filter(query.get("puzzle"), int),
+                kinds=parse_filter(query.get("kind")),
+            )
+        )
+        wake = asyncio.Event()
+        wake.set()  # flush any replayed events right away
+        self.streams[client] = wake
+        try:
+            writer.write(SSE_RESPONSE_HEAD)
+            await writer.drain()
+            while True:
+                try:
+                    await asyncio.wait_for(wake.wait(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    writer.write(b": keep-alive\n\n")
+                    await writer.drain()
+                    continue
+                wake.clear()
+
+                frames = []
+                frame = client.get(timeout=0)
+                while frame is not None:
+                    frames.append(frame)
+                    if frame is RESYNC_FRAME:
+                        break
+                    frame = client.get(timeout=0)
+                if not frames:
+                    continue
+                write_started = time.monotonic()
+                writer.write(b"".join(frames))
+                await writer.drain()
+                client.written(write_started)
+                if frames[-1] is RESYNC_FRAME:
+                    return
+        finally:
+            self.streams.pop(client, None)
+            hub.unsubscribe(client)
+
+    async def _serve_wsgi(self, writer, request):
+        environ = self._build_environ(request)
+        queue = asyncio.Queue(RESPONSE_QUEUE_CHUNKS)
+        cancelled = threading.Event()
+        done = self.loop.run_in_executor(self.executor, self._call_app, environ, queue, cancelled)
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                if item[0] == "chunk":
+                    writer.write(item[1])
+                    await writer.drain()
+                    continue
+                kind, status, headers, body = item
+                head = [f"HTTP/1.1 {status}"]
+                has_length = False
+                for name, value in headers:
+                    lowered = name.lower()
+                    if lowered == "connection":
+                        continue
+                    if lowered == "content-length":
+                        has_length = True
+                    head.append(f"{name}: {value}")
+                if kind == "complete" and not has_length:
+                    head.append(f"Content-Length: {len(body)}")
+                # Without a Content-Length the body ends when the connection closes
+                head.append("Connection: close")
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+                await writer.drain()
+        finally:
+            if not done.done():
+                # Client gone: make room so the app thread sees cancelled and stops
+                cancelled.set()
+                while not queue.empty():
+                    queue.get_nowait()
+        await done
+
+    # --- WSGI bridge (runs on the thread pool) ---
+
+    def _build_environ(self, request):
+        headers = request["headers"]
+        environ = {
+            "REQUEST_METHOD": request["method"],
+            "SCRIPT_NAME": "",
+            "PATH_INFO": unquote(request["path"], encoding="latin-1"),
+            "QUERY_STRING": request["query"],
+            "SERVER_NAME": self.host,
+            "SERVER_PORT": str(self.port),
+            "SERVER_PROTOCOL": request["protocol"],
+            "REMOTE_ADDR": request["peer"][0],
+            "CONTENT_TYPE": headers.get("content-type", ""),
+            "CONTENT_LENGTH": headers.get("content-length", ""),
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": "http",
+            "wsgi.input": io.BytesIO(request["body"]),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        for name, value in headers.items():
+            if name in ("content-type", "content-length"):
+                continue
+            environ["HTTP_" + name.upper().replace("-", "_")] = value
+        return environ
+
+    def _call_app(self, environ, queue, cancelled):
+        """Run the app and feed its response to queue: ("complete", status,
+        headers, body) when it is one chunk, else ("head", status, headers,
+        first chunk) then ("chunk", bytes)...; None at the end"""
+        loop = self.loop
+        response = {}
+        written = []  # start_response's legacy write(): sent before the iterable
+
+        def start_response(status, headers, exc_info=None):
+            response["status"] = status
+            response["headers"] = headers
+            return written.append
+
+        def put(item):
+            asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+            return not cancelled.is_set()
+
+        try:
+            result = self.app(environ, start_response)
+            try:
+                chunks = (chunk for chunk in itertools.chain(written, result) if chunk)
+                first = next(chunks, b"")
+                second = next(chunks, None)
+                if second is None:
+                    put(("complete", response["status"], response["headers"], first))
+                    return
+                if not put(("head", response["status"], response["headers"], first)):
+                    return
+                for chunk in itertools.chain((second,), chunks):
+                    if not put(("chunk", chunk)):
+                        return
+            finally:
+                close = getattr(result, "close", None)
+                if close:
+                    close()
+        finally:
+            if not cancelled.is_set():
+                put(None)
+
+
+def serve(app, sse_hub, host="0.0.0.0", port=5000, threads=8, room_hubs=None):
+    """Run the app in async mode until interrupted"""
+    server = AsyncServer(app, sse_hub, host=host, port=port, threads=threads, room_hubs=room_hubs)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
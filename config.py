@@ -6,6 +6,113 @@ PUZZLE_ORDER = [8,10,3,1,5,12,4]
 
 PUZZLE_FINAL = 6
 
+# Max updates buffered per /state_stream client before it is dropped and
+# forced to resync from /current_state.
+SSE_CLIENT_MAX_PENDING = 256
+
+# Recent SSE events kept in memory so a reconnecting page can resume from its
+# Last-Event-ID. Older gaps get a full get_state() snapshot instead.
+SSE_REPLAY_BUFFER = 128
+
+# MQTT broker. The app starts without it and keeps retrying in the background,
+# waiting MQTT_RECONNECT_MIN..MQTT_RECONNECT_MAX seconds (doubling) between
+# attempts. While it is down, outbound messages (P<id>Start/End, puzzles/<id>)
+# wait in a queue of MQTT_OUTBOUND_QUEUE_SIZE, oldest dropped first, and are
+# sent in order once it is back.
+MQTT_HOST = "localhost"
+MQTT_PORT = 1883
+MQTT_KEEPALIVE = 60
+MQTT_RECONNECT_MIN = 1
+MQTT_RECONNECT_MAX = 30
+MQTT_OUTBOUND_QUEUE_SIZE = 1000
+
+# Use an in-process stand-in broker (mqtt/inprocess.py) instead of
+# MQTT_HOST:MQTT_PORT. Only this process can reach it: for CI, load tests and
+# the /test page (/test/send) on machines without Mosquitto.
+MQTT_IN_PROCESS = False
+
+# Trace every TO_FLASK message from MQTT receive to the SSE socket write and
+# keep per-puzzle, per-stage latency histograms (GET /internal/latency).
+# Costs about 10 us of CPU per message and makes every puzzle lock a
+# pure-Python TracedLock: turn on only while investigating latency.
+LATENCY_TRACING = False
+
+# Record wait and hold time of every puzzle lock per call site (GET
+# /internal/locks, POST /internal/locks/dump, /metrics). Holds of
+# LOCK_HOLD_WARN_MS or more are printed: that puzzle's input was blocked
+# meanwhile. The dump goes to LOCK_DUMP_PATH, also when the app exits.
+LOCK_INSTRUMENTATION = False
+LOCK_HOLD_WARN_MS = 100
+LOCK_DUMP_PATH = "data/lock_stats.json"
+
+# Crash-safe session journal (mqtt/journal.py): inbound messages of the
+# current puzzle, starts/stops and state snapshots, appended to JOURNAL_DIR
+# and fsynced in batches every JOURNAL_FSYNC_INTERVAL seconds by a writer
+# thread. Every JOURNAL_SNAPSHOT_INTERVAL seconds a snapshot starts a new
+# segment and the older ones are deleted. On start the app resumes the
+# puzzle the journal was on (unless it is older than JOURNAL_MAX_AGE seconds),
+# replaying for at most JOURNAL_RECOVERY_BUDGET seconds. GET /internal/journal.
+JOURNAL_ENABLED = False
+JOURNAL_DIR = "data/journal"
+JOURNAL_FSYNC_INTERVAL = 0.2
+JOURNAL_SNAPSHOT_INTERVAL = 30
+JOURNAL_MAX_AGE = 3600
+JOURNAL_RECOVERY_BUDGET = 2.0
+
+# Record every TO_FLASK input, puzzle start/stop, timer_expired and state
+# push of the main room to RECORDINGS_DIR/<start time>.jsonl, one file per
+# app run, for scripts/replay_session.py (replays at 1x, Nx or virtual time
+# and diffs the pushes). GET /internal/recording.
+RECORD_SESSIONS = False
+RECORDINGS_DIR = "data/recordings"
+
+# Inbound TO_FLASK messages are handled on one FIFO worker per puzzle.
+# When a worker already has MQTT_WORKER_QUEUE_SIZE messages waiting:
+# - "drop_oldest": discard the oldest queued message (keep latest input)
+# - "drop_newest": reject the incoming message
+MQTT_WORKER_QUEUE_SIZE = 256
+MQTT_WORKER_OVERFLOW = "drop_oldest"
+
+# Copy of every state push published on puzzles/<puzzle_id>:
+# - "off": not published (nothing in the venue listens to it)
+# - "every": one MQTT message per push (a JSON object)
+# - "batch": the pushes of a puzzle within MQTT_MIRROR_WINDOW seconds go out
+#   as one message (a JSON array, oldest first)
+# Payloads are whole even for puzzles that stream delta patches over SSE.
+# With MQTT_MIRROR_RETAIN the broker keeps the latest message per puzzle for
+# consumers that subscribe later (in "batch" mode an array: the latest push
+# is its last element).
+MQTT_MIRROR_MODE = "every"
+MQTT_MIRROR_WINDOW = 0.05
+MQTT_MIRROR_RETAIN = False
+
+# Serving mode for `python app.py`:
+# - "dev": Flask development server (one thread per open /state_stream)
+# - "async": /state_stream on an asyncio loop, other routes on SERVER_THREADS workers
+SERVER_MODE = "dev"
+SERVER_HOST = "0.0.0.0"
+SERVER_PORT = 5000
+SERVER_THREADS = 8
+
+# Extra escape rooms served by this same process, keyed by room id, each with
+# its own puzzle order. They share the MQTT connection with namespaced topics
+# (room/<id>/TO_FLASK, room/<id>/FROM_FLASK) and are reached under /room/<id>/.
+# The main room keeps the bare topics and routes. Example: {"sala2": [1, 3, 5]}
+ROOMS = {}
+
+# supervisor.py runs every room in ROOMS in its own worker process instead,
+# behind one proxy on SERVER_HOST:SERVER_PORT and one shared MQTT connection.
+# Workers listen on consecutive local ports from SUPERVISOR_WORKER_BASE_PORT;
+# the current puzzle of each room is kept in SUPERVISOR_STATE_DIR so a
+# restarted worker resumes where the crashed one was.
+SUPERVISOR_BRIDGE_PORT = 5099
+SUPERVISOR_WORKER_BASE_PORT = 5101
+SUPERVISOR_STATE_DIR = "data/rooms"
+
+# Set by supervisor.py inside a worker process ({"room": id, "address": (host, port)}).
+# Leave as None: app.py then connects to the broker directly.
+ROOM_BRIDGE = None
+
 # Subtitle language used by the scene player by default.
 # Allowed values: "es", "eng" (also accepts "en" as alias).
 SUBTITLE_LANG = "eng"
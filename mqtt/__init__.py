@@ -1,4 +1,6 @@
 from .client import MQTTClient
 from .puzzle_factory import create_puzzles
+from .rooms import Room
+from .sse_hub import SSEHub
 
-__all__ = ['MQTTClient', 'create_puzzles']
\ No newline at end of file
+__all__ = ['MQTTClient', 'Room', 'SSEHub', 'create_puzzles']
\ No newline at end of file
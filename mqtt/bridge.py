@@ -0,0 +1,144 @@
+"""Worker side of supervisor.py's pooled MQTT connection.
+
+A room worker process does not talk to the broker. BridgedClient swaps the
+paho client for a BridgeConnection: a local socket to the supervisor
+carrying newline-delimited JSON. The supervisor owns the only broker
+connection and namespaces the room's topics (room/<id>/...).
+"""
+import json
+import os
+import socket
+import threading
+import time
+from types import SimpleNamespace
+
+from .client import MQTTClient
+
+
+class BridgeConnection:
+    """paho-like client (publish/subscribe) backed by the supervisor bridge"""
+
+    def __init__(self, address, room_id, on_message, stats_provider=None):
+        self.room_id = room_id
+        self.on_message = on_message
+        self.stats_provider = stats_provider
+        self.send_lock = threading.Lock()
+        self.restored = threading.Event()
+        self.restored_state = {}
+
+        self.received = 0
+        self.transit_total = 0.0
+        self.transit_max = 0.0
+
+        self.sock = socket.create_connection(address)
+        self.send({"op": "hello", "room": room_id, "pid": os.getpid()})
+        threading.Thread(target=self._read_loop, daemon=True, name="supervisor-bridge").start()
+
+    def send(self, message):
+        line = (json.dumps(message) + "\n").encode("utf-8")
+        with self.send_lock:
+            self.sock.sendall(line)
+
+    def publish(self, topic, payload, retain=False):
+        if isinstance(payload, bytes):
+            payload = payload.decode("utf-8")
+        self.send({"op": "publish", "topic": topic, "payload": payload, "retain": retain})
+
+    def subscribe(self, topic):
+        pass  # the supervisor subscribes room/+/TO_FLASK for every worker
+
+    def _read_loop(self):
+        try:
+            for line in self.sock.makefile("rb"):
+                self._handle(json.loads(line))
+        except (OSError, ValueError) as e:
+            print(f"[Bridge] Connection to supervisor failed: {e}")
+        # Without the supervisor there is no MQTT: exit and let it restart us
+        print("[Bridge] Supervisor gone, exiting worker")
+        os._exit(1)
+
+    def _handle(self, message):
+        op = message.get("op")
+        if op == "message":
+            transit = max(0.0, time.time() - message.get("at", time.time()))
+            self.received += 1
+            self.transit_total += transit
+            self.transit_max = max(self.transit_max, transit)
+            msg = SimpleNamespace(topic=message["topic"], payload=message["payload"].encode("utf-8"))
+            self.on_message(self, None, msg)
+        elif op == "restore":
+            self.restored_state = message.get("state") or {}
+            self.restored.set()
+        elif op == "ping":
+            self.send({
+                "op": "pong",
+                "t": message.get("t"),
+                "bridge": self.stats(),
+                "worker": self.stats_provider() if self.stats_provider else {},
+            })
+
+    def stats(self):
+        received = self.received or 1
+        return {
+            "received": self.received,
+            "transit_ms_avg": round(self.transit_total / received * 1000, 3),
+            "transit_ms_max": round(self.transit_max * 1000, 3),
+        }
+
+
+class BridgedClient(MQTTClient):
+    """MQTTClient for a supervisor worker: MQTT through the bridge, room state persisted by the supervisor"""
+
+    def __init__(self, app, puzzle_order, bridge_address, room_id, **kwargs):
+        self.bridge_address = tuple(bridge_address)
+        self.room_id = room_id
+        super().__init__(app, puzzle_order, **kwargs)
+
+    def _connect(self):
+        self.client = BridgeConnection(
+            self.bridge_address, self.room_id, self._on_message, stats_provider=self._worker_stats
+        )
+        self.connected = True  # the supervisor queues nothing: it is there or we exit
+
+    def _worker_stats(self):
+        dispatch = self.dispatcher.stats()["puzzles"]
+        return {
+            "current_puzzle_id": self.current_puzzle_id,
+            "last_event_id": self.last_event_id,
+            "handled": sum(worker["handled"] for worker in dispatch),
+            "queue_wait_ms_max": max((worker["queue_wait_ms_max"] for worker in dispatch), default=0),
+            "handler_ms_max": max((worker["handler_ms_max"] for worker in dispatch), default=0),
+        }
+
+    def _save_state(self):
+        self.client.send({
+            "op": "state",
+            "state": {
+                "current_puzzle_id": self.current_puzzle_id,
+                "current_puzzle_index": self.current_puzzle_index,
+            },
+        })
+
+    def start_puzzle(self, puzzle_id):
+        super().start_puzzle(puzzle_id)
+        self._save_state()
+
+    def stop_current_puzzle(self):
+        super().stop_current_puzzle()
+        self._save_state()
+
+    def set_current_sequence_index(self, index):
+        super().set_current_sequence_index(index)
+        self._save_state()
+
+    def restore_state(self, timeout=5):
+        """Resume the puzzle this room was on before the worker restarted"""
+        if not self.client.restored.wait(timeout):
+            return
+        state = self.client.restored_state
+        if state.get("current_puzzle_index") is not None:
+            self.current_puzzle_index = state["current_puzzle_index"]
+        puzzle_id = state.get("current_puzzle_id")
+        if puzzle_id in self.puzzles:
+            print(f"[Bridge] Restoring room {self.room_id} on puzzle {puzzle_id}")
+            self.start_puzzle(puzzle_id)
@@ -1,9 +1,28 @@
-import paho.mqtt.client as mqtt
 import json
+import paho.mqtt.client as mqtt
+import random
 import threading
+import time
+from collections import deque
+
+from .clock import SystemClock
+from .dispatcher import MessageDispatcher
+from .metrics import ThreadCounters
+from .mirror import PuzzleMirror
+from .router import MessageRouter
+from .scheduler import Scheduler
+from .sse_hub import frame_payload
+from .tracing import LatencyTracer
 
 class MQTTClient:
-    def __init__(self, app, puzzle_order):
+    # Prepended to every topic this client subscribes or publishes to.
+    # The main room uses the bare topics (TO_FLASK, FROM_FLASK, puzzles/<id>).
+    topic_prefix = ""
+
+    def __init__(self, app, puzzle_order, worker_queue_size=256, worker_overflow="drop_oldest",
+                 clock=None, scheduler=None, mirror_mode="every", mirror_window=0.05, mirror_retain=False,
+                 host="localhost", port=1883, keepalive=60, reconnect_min=1, reconnect_max=30,
+                 outbound_queue_size=1000, broker=None, tracing=False, lock_registry=None, journal=None, recorder=None):
         self.app = app
         self.puzzle_order = puzzle_order
         self.puzzles = {}
@@ -11,35 +30,162 @@ class MQTTClient:
         self.current_puzzle_index = 0
         self.update_callback = None
         self.lock = threading.Lock()
+        self.push_lock = threading.Lock()
+        self.last_event_id = 0
+        self.rooms = {}  # room_id -> RoomClient sharing this connection
+        # mqtt.journal.SessionJournal: messages, starts/stops and snapshots on
+        # disk so a restarted process resumes the game (recover())
+        self.journal = journal
+        self.muted = False  # True while the journal replays: no MQTT or SSE output
+        # mqtt.recorder.SessionRecorder: inputs and pushes for scripts/replay_session.py
+        self.recorder = recorder
+        # Payload -> (puzzle_id, typed message) from each puzzle's MESSAGE_SCHEMA
+        self.router = MessageRouter()
+        # Puzzle handlers run on per-puzzle workers, never on paho's network thread
+        self.dispatcher = MessageDispatcher(max_queue=worker_queue_size, overflow=worker_overflow, journal=journal)
+        # Time source for every puzzle; a VirtualClock replays games faster than real time
+        self.clock = clock or SystemClock()
+        # One thread for every puzzle's delayed work (BasePuzzle.schedule)
+        self.scheduler = scheduler or Scheduler(clock=self.clock.monotonic)
+        # puzzles/<id> copy of every push for other MQTT consumers
+        self.mirror = PuzzleMirror(self, mode=mirror_mode, window=mirror_window, retain=mirror_retain)
+        # Per-stage latency of each TO_FLASK message, receive -> SSE write (mqtt/tracing.py)
+        self.tracer = LatencyTracer() if tracing else None
+        # ("received"|"published", topic) -> messages, for /metrics
+        self.counters = ThreadCounters()
+        # mqtt.locks.LockRegistry: puzzle locks record wait/hold per call site
+        self.locks = lock_registry
+        # Broker connection. Until it is up (and while it is down) publishes
+        # wait in a bounded queue, oldest dropped first, and go out in order
+        # on reconnect.
+        self.broker = broker  # mqtt.inprocess.InProcessBroker instead of host:port
+        self.host = host
+        self.port = port
+        self.keepalive = keepalive
+        self.reconnect_min = reconnect_min
+        self.reconnect_max = reconnect_max
+        self.connected = False
+        self.outbound_lock = threading.Lock()
+        self.outbound = deque(maxlen=outbound_queue_size)
+        self.outbound_dropped = 0
+        self.outbound_flushed = 0
+        self.connects = 0
+        self.disconnects = 0
+        if journal is not None:
+            journal.attach(self)
+        if recorder is not None:
+            recorder.attach(self)
+        self._connect()
         
-        # MQTT setup
-        self.client = mqtt.Client()
+    def _connect(self):
+        # MQTT setup. connect_async returns at once: the network loop connects,
+        # and reconnects with backoff, in the background.
+        self.client = self.broker.client() if self.broker else mqtt.Client()
         self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
         self.client.on_message = self._on_message
-        self.client.connect("localhost", 1883, 60)
+        self.client.reconnect_delay_set(self.reconnect_min, self.reconnect_max)
+        self.client.connect_async(self.host, self.port, self.keepalive)
         self.client.loop_start()
         
     def _on_connect(self, client, userdata, flags, rc):
         print(f"Connected to MQTT broker: {rc}")
-        client.subscribe("TO_FLASK")
+        if rc != 0:
+            return
+        client.subscribe(self.topic_prefix + "TO_FLASK")
+        for room in list(self.rooms.values()):
+            client.subscribe(room.topic_prefix + "TO_FLASK")
+        with self.outbound_lock:
+            self.connects += 1
+            self.connected = True
+            while self.outbound:
+                topic, payload, retain = self.outbound[0]
+                if not self._send_now(topic, payload, retain):
+                    self.connected = False  # lost again; the rest waits for the next connect
+                    break
+                self.outbound.popleft()
+                self.outbound_flushed += 1
+
+    def _on_disconnect(self, client, userdata, rc):
+        print(f"Disconnected from MQTT broker: {rc}")
+        with self.outbound_lock:
+            self.disconnects += 1
+            self.connected = False
+
+    def _send_now(self, topic, payload, retain):
+        info = self.client.publish(topic, payload, retain=retain)
+        if info is not None and info.rc == mqtt.MQTT_ERR_NO_CONN:
+            return False
+        self.counters.inc(("published", topic))
+        return True
+
+    def publish(self, topic, payload, retain=False):
+        """Publish on the broker, or queue it until the connection is back"""
+        with self.outbound_lock:
+            if self.connected and not self.outbound and self._send_now(topic, payload, retain):
+                return True
+            self.connected = False
+            if len(self.outbound) == self.outbound.maxlen:
+                self.outbound_dropped += 1
+            self.outbound.append((topic, payload, retain))
+            return False
+
+    def connection_stats(self):
+        with self.outbound_lock:
+            return {
+                "broker": "in-process" if self.broker else f"{self.host}:{self.port}",
+                "connected": self.connected,
+                "connects": self.connects,
+                "disconnects": self.disconnects,
+                "outbound_queued": len(self.outbound),
+                "outbound_max": self.outbound.maxlen,
+                "outbound_flushed": self.outbound_flushed,
+                "outbound_dropped": self.outbound_dropped,
+            }
         
     def _on_message(self, client, userdata, msg):
+        received_at = time.monotonic()
         try:
             topic = msg.topic
+            self.counters.inc(("received", topic))
             payload = msg.payload.decode('utf-8')
-            parts = payload.split(',')
-            
-            # Route to appropriate puzzle
-            if parts[0].startswith('P') and len(parts[0]) > 1:
-                puzzle_id = int(parts[0][1:])
-                if puzzle_id in self.puzzles:
-                    self.puzzles[puzzle_id].handle_message(parts)
+            target = self
+            if topic != self.topic_prefix + "TO_FLASK":
+                # room/<id>/TO_FLASK goes to that room's puzzles
+                target = self.rooms.get(topic.split('/')[1]) if topic.startswith("room/") else None
+                if target is None:
+                    return
+            target.dispatch(payload, received_at)
         except Exception as e:
             print(f"Error in _on_message: {e}")
+
+    def add_room(self, room):
+        """Share this connection with another room's client"""
+        self.rooms[room.room_id] = room
+        self.client.subscribe(room.topic_prefix + "TO_FLASK")
+
+    def dispatch(self, payload, received_at=None):
+        """Queue a TO_FLASK payload ('P4,4,0') on its puzzle's worker as a typed message"""
+        if self.recorder is not None:
+            self.recorder.record("mqtt", payload)
+        if self.tracer is None:
+            routed = self.router.route(payload)
+            return routed is not None and self.dispatcher.dispatch(*routed)
+        if received_at is None:
+            received_at = time.monotonic()
+        routed = self.router.route(payload)
+        if routed is None:
+            return False
+        trace = self.tracer.start(routed[0], received_at, time.monotonic())
+        return self.dispatcher.dispatch(*routed, trace=trace)
     
     def register_puzzle(self, puzzle):
         with self.lock:
             self.puzzles[puzzle.id] = puzzle
+            self.router.register(puzzle)
+            self.dispatcher.register(puzzle)
+            if self.journal is not None:
+                self.journal.register(puzzle)
             
     def start_puzzle(self, puzzle_id):
         with self.lock:
@@ -47,6 +193,12 @@ class MQTTClient:
                 return
             self.stop_current_puzzle()
             self.current_puzzle_id = puzzle_id
+            if self.journal is not None:
+                self.journal.started(puzzle_id, self.current_puzzle_index)
+            elif self.recorder is not None:
+                self.reseed()
+            if self.recorder is not None:
+                self.recorder.record("start", puzzle_id)
             self.puzzles[puzzle_id].reset()
             self.send_message("FROM_FLASK", f"P{puzzle_id}Start")
             
@@ -54,29 +206,65 @@ class MQTTClient:
         if self.current_puzzle_id and self.current_puzzle_id in self.puzzles:
             self.puzzles[self.current_puzzle_id].stop()
         self.current_puzzle_id = None
+        if self.journal is not None:
+            self.journal.stopped()
+        if self.recorder is not None:
+            self.recorder.record("stop")
             
-    def push_update(self, data):
-        if self.update_callback:
-            self.update_callback(data)
-        topic = f"puzzles/{data.get('puzzle_id', 'unknown')}"
-        self.client.publish(topic, json.dumps(data))
+    def push_update(self, data, full=None):
+        """Hand a push to the SSE hub and the mirror; full is the payload a delta patch encodes"""
+        if self.muted:
+            return
+        # Stamp and hand over under one lock so ids reach the SSE hub in order
+        with self.push_lock:
+            self.last_event_id += 1
+            frame = self.update_callback(data, self.last_event_id) if self.update_callback else None
+            if self.recorder is not None:
+                # As JSON now: puzzles keep mutating the dicts they pushed
+                self.recorder.record("push", frame_payload(frame) if isinstance(frame, bytes) else json.dumps(data).encode("utf-8"))
+        if full is not None:
+            # MQTT consumers of puzzles/<id> keep getting whole payloads, not patches
+            self.mirror.publish(full)
+        else:
+            # The SSE hub returns the encoded frame; the mirror reuses its JSON
+            self.mirror.publish(data, frame if isinstance(frame, bytes) else None)
         
     def set_update_callback(self, callback):
         self.update_callback = callback
         
+    def reseed(self):
+        """Reseed random with a fresh seed, journaled/recorded so replays draw the same values"""
+        seed = random.getrandbits(32)
+        random.seed(seed)
+        if self.recorder is not None:
+            self.recorder.record("seed", seed)
+        return seed
+
     def set_current_sequence_index(self, index):
         self.current_puzzle_index = index
         
     def send_message(self, topic, message):
-        self.client.publish(topic, message)
+        if self.muted:
+            return
+        self.publish(self.topic_prefix + topic, message)
         
     def get_current_state(self):
-        if self.current_puzzle_id and self.current_puzzle_id in self.puzzles:
-            return self.puzzles[self.current_puzzle_id].get_state()
-        return {}
+        return self.get_current_state_cached()[1]
+
+    def get_current_state_cached(self):
+        """(ETag or None, state, JSON bytes) of the current puzzle, see BasePuzzle.cached_state"""
+        puzzle = self.puzzles.get(self.current_puzzle_id) if self.current_puzzle_id else None
+        if puzzle is None:
+            return None, {}, b"{}"
+        return puzzle.cached_state()
         
     def timer_expired(self):
+        if self.recorder is not None:
+            self.recorder.record("timer_expired")
         if self.current_puzzle_id and self.current_puzzle_id in self.puzzles:
+            if self.journal is not None:
+                self.journal.timer()
             self.puzzles[self.current_puzzle_id].timer_expired()
+            self.puzzles[self.current_puzzle_id].touch()
         #if self.current_puzzle_id == -1:
         #    self.puzzles[-1].timer_expired()
\ No newline at end of file
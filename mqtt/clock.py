@@ -0,0 +1,68 @@
+import time
+
+
+class SystemClock:
+    """Real time: what puzzles use when running the room"""
+
+    def time(self):
+        return time.time()
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+class ScaledClock:
+    """Real time running speed times faster, for replaying recordings at Nx.
+
+    Pair it with Scheduler(clock=clock.monotonic, speed=speed) so puzzle
+    timers fire at the same pace.
+    """
+
+    def __init__(self, speed=1.0):
+        self.speed = speed
+        self._real_start = time.monotonic()
+        self._wall_start = time.time()
+
+    def _elapsed(self):
+        return (time.monotonic() - self._real_start) * self.speed
+
+    def time(self):
+        return self._wall_start + self._elapsed()
+
+    def monotonic(self):
+        return self._real_start + self._elapsed()
+
+    def sleep(self, seconds):
+        time.sleep(seconds / self.speed)
+
+
+class VirtualClock:
+    """Time that only moves when told to.
+
+    Used with VirtualScheduler to replay a game faster than real time:
+    sleep() and advance() move the clock forward instantly. time() starts
+    at start_time (now by default) so deadlines sent to pages still look
+    like real timestamps.
+    """
+
+    def __init__(self, start_time=None):
+        self.start_time = time.time() if start_time is None else start_time
+        self.now = 0.0
+
+    def time(self):
+        return self.start_time + self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+
+    def advance(self, seconds):
+        self.now += max(0, seconds)
+
+    def advance_to(self, when):
+        self.now = max(self.now, when)
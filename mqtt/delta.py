@@ -0,0 +1,92 @@
+"""JSON-patch style diffs between consecutive pushes of one puzzle.
+
+A patch is a list of operations applied in order:
+    ["set", path, value]  -> replace or add the value at path
+    ["del", path]         -> remove the key at path
+where path is a list of dict keys (strings) and list indices (ints), exactly
+as they appear once the payload is JSON encoded.
+"""
+import json
+
+
+def normalize(value):
+    """Return value with the shapes json.dumps produces (str keys, lists)"""
+    if isinstance(value, dict):
+        return {str(k): normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize(v) for v in value]
+    if isinstance(value, (set, frozenset)):
+        return [normalize(v) for v in value]
+    return value
+
+
+def diff(old, new, path=None, ops=None):
+    """Return the operations turning old into new (both normalized)"""
+    path = path or []
+    ops = [] if ops is None else ops
+
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in old:
+            if key not in new:
+                ops.append(["del", path + [key]])
+        for key, value in new.items():
+            if key not in old:
+                ops.append(["set", path + [key], value])
+            else:
+                diff(old[key], value, path + [key], ops)
+        return ops
+
+    if isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+        for index, (a, b) in enumerate(zip(old, new)):
+            diff(a, b, path + [index], ops)
+        return ops
+
+    # Compare type too so 1 / 1.0 / True stay distinct once encoded
+    if type(old) is not type(new) or old != new:
+        ops.append(["set", path, new])
+    return ops
+
+
+class DeltaEncoder:
+    """Turn a puzzle's successive pushes into keyframes and patches.
+
+    Each output carries delta_seq. A keyframe is the full payload plus
+    "keyframe": true; otherwise "patch" holds the diff against the payload
+    with delta_seq - 1. A keyframe is forced every keyframe_interval pushes
+    and whenever the encoded patch would not be shorter than the encoded
+    payload.
+    """
+
+    def __init__(self, keyframe_interval=20):
+        self.keyframe_interval = keyframe_interval
+        self.last = None
+        self.seq = 0
+        self.since_keyframe = 0
+
+    def reset(self):
+        """Next encode() starts a new chain with a keyframe"""
+        self.last = None
+        self.since_keyframe = 0
+
+    def encode(self, payload):
+        current = normalize(payload)
+        previous = self.last
+        self.last = current
+        self.seq += 1
+
+        if previous is not None and self.since_keyframe < self.keyframe_interval:
+            ops = diff(previous, current)
+            # Sizes on the wire: one op may carry a whole nested list
+            if len(json.dumps(ops)) < len(json.dumps(current)):
+                self.since_keyframe += 1
+                return {
+                    "puzzle_id": payload.get("puzzle_id"),
+                    "delta_seq": self.seq,
+                    "patch": ops,
+                }
+
+        self.since_keyframe = 0
+        keyframe = dict(payload)
+        keyframe["delta_seq"] = self.seq
+        keyframe["keyframe"] = True
+        return keyframe
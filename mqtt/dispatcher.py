@@ -0,0 +1,155 @@
+import threading
+import time
+from collections import deque
+
+from . import tracing
+
+
+OVERFLOW_POLICIES = ("drop_oldest", "drop_newest")
+CALL = object()  # queue entry marker: run the entry's callable on the worker
+
+
+class PuzzleWorker:
+    """FIFO worker running one puzzle's handle_message calls in arrival order.
+
+    When max_queue messages are already waiting, the overflow policy decides
+    which one is lost: "drop_oldest" keeps the latest hardware input,
+    "drop_newest" rejects the incoming message.
+    """
+
+    def __init__(self, puzzle, max_queue=256, overflow="drop_oldest", journal=None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.puzzle = puzzle
+        self.max_queue = max_queue
+        self.overflow = overflow
+        self.journal = journal  # mqtt.journal.SessionJournal: sees each message before the handler
+        self.cond = threading.Condition()
+        self.queue = deque()  # (message, enqueued_at, trace)
+
+        self.received = 0
+        self.handled = 0
+        self.dropped = 0
+        self.errors = 0
+        self.max_depth = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.handler_total = 0.0
+        self.handler_max = 0.0
+
+        self.thread = threading.Thread(
+            target=self._run, daemon=True, name=f"puzzle{puzzle.id}-worker"
+        )
+        self.thread.start()
+
+    def submit(self, message, trace=None):
+        """Queue a message for the puzzle; returns False if it was dropped"""
+        with self.cond:
+            self.received += 1
+            if len(self.queue) >= self.max_queue:
+                self.dropped += 1
+                if self.overflow == "drop_newest":
+                    return False
+                self.queue.popleft()
+            self.queue.append((message, time.monotonic(), trace))
+            self.max_depth = max(self.max_depth, len(self.queue))
+            self.cond.notify()
+            return True
+
+    def call(self, fn):
+        """Run fn() on the worker between two messages; never dropped"""
+        with self.cond:
+            self.queue.append((fn, time.monotonic(), CALL))
+            self.cond.notify()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.queue:
+                    self.cond.wait()
+                message, enqueued_at, trace = self.queue.popleft()
+
+            if trace is CALL:
+                try:
+                    message()
+                except Exception as e:
+                    print(f"[Dispatcher] Error in puzzle {self.puzzle.id} worker call: {e}")
+                continue
+            if self.journal is not None:
+                self.journal.handled(self.puzzle.id, message)
+            started = time.monotonic()
+            if trace:
+                # Current trace of this thread: the puzzle lock and pushes report to it
+                tracing.activate(trace)
+            try:
+                self.puzzle.handle(message)
+            except Exception as e:
+                self.errors += 1
+                print(f"[Dispatcher] Error in puzzle {self.puzzle.id} handler: {e}")
+            self.puzzle.touch()
+            finished = time.monotonic()
+            if trace:
+                tracing.activate(None)
+                trace.handled(enqueued_at, started, finished)
+
+            with self.cond:
+                self.handled += 1
+                wait = started - enqueued_at
+                handler = finished - started
+                self.wait_total += wait
+                self.wait_max = max(self.wait_max, wait)
+                self.handler_total += handler
+                self.handler_max = max(self.handler_max, handler)
+
+    def stats(self):
+        with self.cond:
+            handled = self.handled or 1
+            return {
+                "puzzle_id": self.puzzle.id,
+                "depth": len(self.queue),
+                "max_depth": self.max_depth,
+                "max_queue": self.max_queue,
+                "overflow": self.overflow,
+                "received": self.received,
+                "handled": self.handled,
+                "dropped": self.dropped,
+                "errors": self.errors,
+                "queue_wait_ms_avg": round(self.wait_total / handled * 1000, 3),
+                "queue_wait_ms_max": round(self.wait_max * 1000, 3),
+                "handler_ms_avg": round(self.handler_total / handled * 1000, 3),
+                "handler_ms_max": round(self.handler_max * 1000, 3),
+                "handler_seconds_total": round(self.handler_total, 6),
+            }
+
+
+class MessageDispatcher:
+    """Route typed TO_FLASK messages to one FIFO worker per puzzle.
+
+    Keeps slow handlers off the paho network thread: a puzzle that sleeps or
+    does file I/O only delays its own queue, never MQTT keepalives or the
+    other puzzles' input.
+    """
+
+    def __init__(self, max_queue=256, overflow="drop_oldest", journal=None):
+        self.max_queue = max_queue
+        self.overflow = overflow
+        self.journal = journal
+        self.workers = {}
+        self.unroutable = 0
+
+    def register(self, puzzle):
+        if puzzle.id not in self.workers:
+            self.workers[puzzle.id] = PuzzleWorker(puzzle, self.max_queue, self.overflow, self.journal)
+
+    def dispatch(self, puzzle_id, message, trace=None):
+        worker = self.workers.get(puzzle_id)
+        if worker is None:
+            self.unroutable += 1
+            return False
+        return worker.submit(message, trace)
+
+    def stats(self):
+        return {
+            "unroutable": self.unroutable,
+            "puzzles": [self.workers[pid].stats() for pid in sorted(self.workers)],
+        }
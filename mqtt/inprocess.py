@@ -0,0 +1,156 @@
+"""In-process stand-in for the Mosquitto broker.
+
+Implements the part of MQTT the app uses (QoS 0 publish/subscribe, retained
+messages, + and # wildcards) without any network. InProcessBroker.client()
+returns an object with the paho.mqtt.client.Client methods MQTTClient calls,
+so MQTTClient(..., broker=InProcessBroker()) runs unchanged. Messages are
+delivered synchronously on the publishing thread; MQTTClient's _on_message
+only queues them on the puzzle workers, so that stays cheap.
+"""
+import itertools
+import threading
+from types import SimpleNamespace
+
+MQTT_ERR_SUCCESS = 0
+MQTT_ERR_NO_CONN = 4
+
+
+def topic_matches(pattern, topic):
+    """MQTT filter matching: + is one level, # the rest"""
+    if pattern == topic:
+        return True
+    pattern_levels = pattern.split("/")
+    topic_levels = topic.split("/")
+    for index, level in enumerate(pattern_levels):
+        if level == "#":
+            return True
+        if index >= len(topic_levels) or (level != "+" and level != topic_levels[index]):
+            return False
+    return len(pattern_levels) == len(topic_levels)
+
+
+class InProcessClient:
+    """paho-like client attached to an InProcessBroker"""
+
+    def __init__(self, broker, client_id):
+        self.broker = broker
+        self.client_id = client_id
+        self.connected = False
+        self.on_connect = None
+        self.on_disconnect = None
+        self.on_message = None
+
+    # Connection. There is no network: "connecting" happens in loop_start(),
+    # the way paho connects from its loop thread after connect_async().
+
+    def reconnect_delay_set(self, min_delay=1, max_delay=120):
+        pass
+
+    def connect_async(self, host=None, port=None, keepalive=60):
+        pass
+
+    def connect(self, host=None, port=None, keepalive=60):
+        self.loop_start()
+
+    def loop_start(self):
+        if self.connected:
+            return
+        self.connected = True
+        self.broker.attach(self)
+        if self.on_connect:
+            self.on_connect(self, None, {}, 0)
+
+    def loop_stop(self):
+        pass
+
+    def disconnect(self):
+        if not self.connected:
+            return
+        self.connected = False
+        self.broker.detach(self)
+        if self.on_disconnect:
+            self.on_disconnect(self, None, 0)
+
+    # Pub/sub
+
+    def subscribe(self, topic, qos=0):
+        if not self.connected:
+            return MQTT_ERR_NO_CONN, None
+        self.broker.subscribe(self, topic)
+        return MQTT_ERR_SUCCESS, None
+
+    def unsubscribe(self, topic):
+        self.broker.unsubscribe(self, topic)
+        return MQTT_ERR_SUCCESS, None
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        if not self.connected:
+            return SimpleNamespace(rc=MQTT_ERR_NO_CONN)
+        self.broker.publish(topic, payload, retain)
+        return SimpleNamespace(rc=MQTT_ERR_SUCCESS)
+
+    def _deliver(self, topic, payload, retain=False):
+        if self.on_message:
+            self.on_message(self, None, SimpleNamespace(topic=topic, payload=payload, retain=retain, qos=0))
+
+
+class InProcessBroker:
+    """Topic router shared by every InProcessClient it hands out"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions = {}  # client -> set of topic filters
+        self.retained = {}       # topic -> payload
+        self.ids = itertools.count(1)
+        self.published = 0
+        self.delivered = 0
+
+    def client(self, client_id=None):
+        return InProcessClient(self, client_id or f"inprocess-{next(self.ids)}")
+
+    def attach(self, client):
+        with self.lock:
+            self.subscriptions.setdefault(client, set())
+
+    def detach(self, client):
+        with self.lock:
+            self.subscriptions.pop(client, None)
+
+    def subscribe(self, client, pattern):
+        with self.lock:
+            self.subscriptions.setdefault(client, set()).add(pattern)
+            retained = [(topic, payload) for topic, payload in self.retained.items()
+                        if topic_matches(pattern, topic)]
+        for topic, payload in retained:
+            client._deliver(topic, payload, retain=True)
+
+    def unsubscribe(self, client, pattern):
+        with self.lock:
+            self.subscriptions.get(client, set()).discard(pattern)
+
+    def publish(self, topic, payload, retain=False):
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        elif payload is None:
+            payload = b""
+        with self.lock:
+            self.published += 1
+            if retain:
+                if payload:
+                    self.retained[topic] = payload
+                else:
+                    self.retained.pop(topic, None)  # empty retained message clears it
+            targets = [client for client, patterns in self.subscriptions.items()
+                       if any(topic_matches(pattern, topic) for pattern in patterns)]
+            self.delivered += len(targets)
+        for client in targets:
+            client._deliver(topic, payload)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "clients": len(self.subscriptions),
+                "published": self.published,
+                "delivered": self.delivered,
+                "retained": len(self.retained),
+            }
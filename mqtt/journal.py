@@ -0,0 +1,371 @@
+"""Crash-safe session journal (JOURNAL_ENABLED).
+
+Puzzle workers append every message of the current puzzle just before
+handle_message, and the client appends puzzle starts, stops and
+timer_expired, to an in-memory queue. A writer thread turns them into JSON
+lines and fsyncs once per batch, so a handler never waits for the disk.
+
+Snapshots hold the puzzle's plain-data attributes (BasePuzzle.snapshot_state,
+only those that differ from a fresh instance). They run on the puzzle's own
+worker, so each one sits exactly between two journaled messages: after every
+scheduled callback (state that changed without a message), and every
+snapshot_interval, when the journal also rolls over to a new segment that
+starts with the snapshot and deletes the older ones.
+
+After a crash, recover() restores the latest start or snapshot and replays
+the messages after it with MQTT and SSE output muted, within a time budget.
+Scheduled calls are not journaled. From a start, reset() schedules them as
+it did live. From a snapshot, whatever reset() scheduled is cancelled and the
+puzzle's restore_state() schedules the step its restored state is waiting
+for again, with its full delay (or up to a saved deadline such as Puzzle5's
+waiting_deadline): a countdown or pause in progress starts over.
+"""
+import ast
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+
+
+SEGMENT_SUFFIX = ".jsonl"
+# One encoder for every record: json.dumps(..., separators=...) builds a new one per call
+_encode = json.JSONEncoder(separators=(",", ":")).encode
+# Records encoded between two GIL hand-offs: a worker never waits behind a whole batch
+WRITER_CHUNK = 32
+
+
+def _fsync_dir(directory):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class SessionJournal:
+    """Append-only journal of one room's game session, segment files in directory"""
+
+    def __init__(self, directory, fsync_interval=0.2, snapshot_interval=30, max_age=3600, keep_sessions=5):
+        self.directory = directory
+        self.fsync_interval = fsync_interval
+        self.snapshot_interval = snapshot_interval
+        self.max_age = max_age
+        self.keep_sessions = keep_sessions
+        self.client = None
+        self.baselines = {}  # puzzle_id -> {attribute: repr} of the freshly built puzzle
+        self.current = None  # puzzle whose messages are journaled
+        self.pending_snapshot = set()  # puzzle ids with a snapshot queued on their worker
+
+        self.queue = deque()  # records for the writer thread; append/popleft need no lock
+        self.cond = threading.Condition()
+        self.session = time.strftime("%Y%m%d-%H%M%S")
+        self.segment = 0
+        self.file = None
+
+        self.records = 0
+        self.bytes = 0
+        self.fsyncs = 0
+        self.batch_max = 0
+        self.fsync_ms_max = 0.0
+        self.snapshots = 0
+        self.rolls = 0
+        self.write_errors = 0
+        self.recovered = None
+
+        self.thread = threading.Thread(target=self._run, daemon=True, name="journal-writer")
+        self.thread.start()
+
+    # -- hooks (MQTTClient, PuzzleWorker, BasePuzzle) ---------------------
+
+    def attach(self, client):
+        """Called by MQTTClient: periodic snapshots go through its scheduler and workers"""
+        self.client = client
+        client.scheduler.call_later(self.snapshot_interval, self._tick)
+
+    def register(self, puzzle):
+        self.baselines[puzzle.id] = {name: repr(value) for name, value in puzzle.snapshot_state().items()}
+
+    def started(self, puzzle_id, index):
+        """Puzzle start: reseeds random before reset() so a replay picks the same values"""
+        self.current = puzzle_id
+        self.queue.append(("start", time.time(), puzzle_id, (index, self.client.reseed())))
+
+    def stopped(self):
+        if self.current is not None:
+            self.current = None
+            self.queue.append(("stop", time.time(), None, None))
+
+    def timer(self):
+        if self.current is not None:
+            self.queue.append(("timer", time.time(), self.current, None))
+
+    def handled(self, puzzle_id, message):
+        """Worker thread, just before handle_message: an append, nothing else"""
+        if puzzle_id == self.current:
+            self.queue.append(("msg", time.time(), puzzle_id, message))
+
+    def changed(self, puzzle):
+        """A scheduled callback changed the puzzle outside of a message: snapshot it"""
+        if puzzle.id == self.current:
+            self.request_snapshot(puzzle.id)
+
+    def request_snapshot(self, puzzle_id, roll=False):
+        """Snapshot on the puzzle's worker, between two of its messages"""
+        worker = self.client.dispatcher.workers.get(puzzle_id) if self.client else None
+        if worker is None or (puzzle_id in self.pending_snapshot and not roll):
+            return
+        self.pending_snapshot.add(puzzle_id)
+        worker.call(lambda: self.snapshot(self.client.puzzles[puzzle_id], roll))
+
+    def _tick(self):
+        try:
+            if self.current is not None:
+                self.request_snapshot(self.current, roll=True)
+        finally:
+            self.client.scheduler.call_later(self.snapshot_interval, self._tick)
+
+    # -- snapshots ------------------------------------------------------
+
+    def snapshot(self, puzzle, roll=False):
+        self.pending_snapshot.discard(puzzle.id)
+        if puzzle.id != self.current:
+            return
+        with puzzle.lock:
+            state = puzzle.snapshot_state()
+        baseline = self.baselines.get(puzzle.id, {})
+        diff = {name: value for name, value in state.items() if repr(value) != baseline.get(name)}
+        self.snapshots += 1
+        index = self.client.current_puzzle_index
+        self.queue.append(("snap", time.time(), puzzle.id, (index, self.client.reseed(), repr(diff), roll)))
+
+    def restore(self, puzzle, diff):
+        """One restore_state() call, so the puzzle re-arms timers for the final state only"""
+        state = {name: ast.literal_eval(value) for name, value in self.baselines.get(puzzle.id, {}).items()}
+        state.update(diff)
+        puzzle.restore_state(state)
+
+    # -- writer thread --------------------------------------------------
+
+    def sync(self, timeout=5):
+        """Block until everything queued so far is on disk"""
+        done = threading.Event()
+        self.queue.append(("sync", 0, None, done))
+        with self.cond:
+            self.cond.notify()
+        return done.wait(timeout)
+
+    def _run(self):
+        while True:
+            with self.cond:
+                self.cond.wait(self.fsync_interval)
+            if self.queue:
+                try:
+                    self._write_batch()
+                except OSError as e:
+                    self.write_errors += 1
+                    print(f"[Journal] Write failed: {e}")
+
+    def _write_batch(self):
+        lines, waiters = [], []
+        while self.queue:
+            if len(lines) % WRITER_CHUNK == WRITER_CHUNK - 1:
+                time.sleep(0)
+            kind, at, puzzle_id, data = self.queue.popleft()
+            if kind == "sync":
+                waiters.append(data)
+                continue
+            if kind == "msg":
+                # Most records: formatted directly, the writer shares the GIL with the workers
+                lines.append(f'{{"k":"msg","t":{int(at * 1000)},"p":{puzzle_id},"m":{_encode(data)}}}')
+                continue
+            line = _encode(self._record(kind, at, puzzle_id, data))
+            if kind == "snap" and data[3]:
+                # Roll over: what came before the snapshot ends the old segment
+                if lines:
+                    self._flush(lines)
+                    lines = []
+                self._roll(line)
+                continue
+            lines.append(line)
+        if lines:
+            self._flush(lines)
+        for done in waiters:
+            done.set()
+
+    def _record(self, kind, at, puzzle_id, data):
+        record = {"k": kind, "t": int(at * 1000)}  # ms since the epoch
+        if puzzle_id is not None:
+            record["p"] = puzzle_id
+        if kind == "start":
+            record["i"], record["seed"] = data
+        elif kind == "snap":
+            record["i"], record["seed"], record["state"], _ = data
+        return record
+
+    def _flush(self, lines):
+        if self.file is None:
+            self._open_segment(self.segment or 1)
+        data = ("\n".join(lines) + "\n").encode("utf-8")
+        started = time.monotonic()
+        self.file.write(data)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.fsync_ms_max = max(self.fsync_ms_max, (time.monotonic() - started) * 1000)
+        self.fsyncs += 1
+        self.records += len(lines)
+        self.bytes += len(data)
+        self.batch_max = max(self.batch_max, len(lines))
+
+    def _segment_path(self, segment):
+        return os.path.join(self.directory, f"{self.session}-{segment:06d}{SEGMENT_SUFFIX}")
+
+    def _open_segment(self, segment):
+        os.makedirs(self.directory, exist_ok=True)
+        if self.segment == 0:
+            self._prune_sessions()
+        self.segment = segment
+        self.file = open(self._segment_path(segment), "ab")
+        _fsync_dir(self.directory)
+
+    def _roll(self, snapshot_line):
+        """Start the next segment with the snapshot, then drop the older ones"""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self._open_segment(self.segment + 1)
+        self._flush([snapshot_line])
+        current = os.path.basename(self.file.name)
+        for name in self._segments():
+            if name.startswith(self.session + "-") and name != current:
+                os.remove(os.path.join(self.directory, name))
+        self.rolls += 1
+
+    def _segments(self):
+        try:
+            return sorted(name for name in os.listdir(self.directory) if name.endswith(SEGMENT_SUFFIX))
+        except FileNotFoundError:
+            return []
+
+    def _prune_sessions(self):
+        sessions = sorted({name.rsplit("-", 1)[0] for name in self._segments()} - {self.session})
+        for session in sessions[:max(0, len(sessions) - self.keep_sessions + 1)]:
+            for name in self._segments():
+                if name.startswith(session + "-"):
+                    os.remove(os.path.join(self.directory, name))
+
+    # -- recovery -------------------------------------------------------
+
+    def _read_latest(self):
+        segments = self._segments()
+        if not segments:
+            return None, []
+        name = segments[-1]
+        records = []
+        with open(os.path.join(self.directory, name), encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    break  # torn last line of a crash
+        return name, records
+
+    def recover(self, client, budget=2.0):
+        """Bring back the puzzle the last session was on; returns a summary or None"""
+        started = time.monotonic()
+        name, records = self._read_latest()
+        if not records:
+            return None
+        if time.time() - records[-1]["t"] / 1000 > self.max_age:
+            print(f"[Journal] {name} is older than {self.max_age} s, starting a new session")
+            return None
+
+        base, tail = None, []
+        for record in records:
+            if record["k"] in ("start", "snap"):
+                base, tail = record, []
+            elif record["k"] == "stop":
+                base, tail = None, []
+            elif base is not None and record.get("p") == base["p"]:
+                tail.append(record)
+        puzzle = client.puzzles.get(base["p"]) if base else None
+        if puzzle is None:
+            return None
+
+        schema = client.router.schemas.get(puzzle.id)
+        replayed = errors = 0
+        client.muted = True
+        try:
+            with client.lock:
+                client.current_puzzle_id = puzzle.id
+                client.current_puzzle_index = base["i"]
+                random.seed(base["seed"])
+                puzzle.reset()
+                if base["k"] == "snap":
+                    # Drop what reset() scheduled (Puzzle8 would show the numbers
+                    # 5 s later over a restored input phase): stop() bumps the
+                    # generation and cancels it, the attributes it clears are
+                    # restored next, and restore_state() schedules its own
+                    puzzle.stop()
+                    with puzzle.lock:
+                        self.restore(puzzle, ast.literal_eval(base["state"]))
+                    # The snapshot reseeded random after its state: values the
+                    # replayed messages draw match the live ones
+                    random.seed(base["seed"])
+            for record in tail:
+                if time.monotonic() - started > budget:
+                    break
+                try:
+                    if record["k"] == "msg":
+                        fields = [tuple(value) if isinstance(value, list) else value for value in record["m"]]
+                        puzzle.handle_message(schema.type(*fields) if schema else fields)
+                    elif record["k"] == "timer":
+                        puzzle.timer_expired()
+                except Exception as e:
+                    errors += 1
+                    print(f"[Journal] Replay error in puzzle {puzzle.id}: {e}")
+                puzzle.touch()
+                replayed += 1
+        finally:
+            client.muted = False
+
+        # Carry on in the same session, from a snapshot of the recovered state
+        self.session, segment = name[:-len(SEGMENT_SUFFIX)].rsplit("-", 1)
+        self.segment = int(segment)
+        self.current = puzzle.id
+        self.snapshot(puzzle, roll=True)
+        self.recovered = {
+            "segment": name,
+            "puzzle_id": puzzle.id,
+            "from": "snapshot" if base["k"] == "snap" else "start",
+            "replayed": replayed,
+            "skipped": len(tail) - replayed,
+            "errors": errors,
+            "ms": round((time.monotonic() - started) * 1000, 3),
+        }
+        print(f"[Journal] Recovered puzzle {puzzle.id} from {self.recovered['from']} + {replayed} messages "
+              f"in {self.recovered['ms']} ms" + (f" ({len(tail) - replayed} over budget, lost)" if replayed < len(tail) else ""))
+        return self.recovered
+
+    def stats(self):
+        return {
+            "directory": self.directory,
+            "segment": os.path.basename(self.file.name) if self.file else None,
+            "current_puzzle_id": self.current,
+            "queued": len(self.queue),
+            "records": self.records,
+            "bytes": self.bytes,
+            "fsyncs": self.fsyncs,
+            "batch_max": self.batch_max,
+            "fsync_ms_max": round(self.fsync_ms_max, 3),
+            "snapshots": self.snapshots,
+            "rolls": self.rolls,
+            "write_errors": self.write_errors,
+            "recovered": self.recovered,
+        }
@@ -0,0 +1,170 @@
+"""Contention instrumentation for the puzzle locks (LOCK_INSTRUMENTATION).
+
+With the flag on, every BasePuzzle.lock is an InstrumentedLock: each
+acquire records how long it waited and each release how long the lock was
+held, per call site (file:line function of the `with self.lock`). Holds
+longer than the threshold are printed and kept, since while a puzzle lock
+is held that puzzle's input, get_state() and /current_state all wait.
+Results: GET /internal/locks, POST /internal/locks/dump (JSON file) and
+the jocpro_puzzle_lock_* histograms of /metrics.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+from . import tracing
+from .tracing import LatencyHistogram
+
+
+def site_name(site):
+    """(code, line) -> puzzle12.py:93 _confirm_solved"""
+    code, line = site
+    return f"{os.path.basename(code.co_filename)}:{line} {code.co_name}"
+
+
+class SiteStats:
+    """Wait/hold totals of one call site"""
+
+    __slots__ = ("acquisitions", "wait_total", "wait_max", "hold_total", "hold_max", "long_holds")
+
+    def __init__(self):
+        self.acquisitions = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.hold_total = 0.0
+        self.hold_max = 0.0
+        self.long_holds = 0
+
+    def as_dict(self):
+        count = self.acquisitions or 1
+        return {
+            "acquisitions": self.acquisitions,
+            "wait_ms_avg": round(self.wait_total / count * 1000, 3),
+            "wait_ms_max": round(self.wait_max * 1000, 3),
+            "hold_ms_avg": round(self.hold_total / count * 1000, 3),
+            "hold_ms_max": round(self.hold_max * 1000, 3),
+            "long_holds": self.long_holds,
+        }
+
+
+class InstrumentedLock:
+    """threading.Lock recording wait and hold time per call site.
+
+    Statistics are only updated while the lock itself is held, so they need
+    no lock of their own.
+    """
+
+    def __init__(self, name, registry):
+        self.name = name
+        self.registry = registry
+        self._lock = threading.Lock()
+        self.sites = {}  # (code object, line) of the caller -> SiteStats
+        self.wait = LatencyHistogram()
+        self.hold = LatencyHistogram()
+        self._acquired_at = 0.0
+        self._site = None
+
+    def acquire(self, blocking=True, timeout=-1):
+        frame = sys._getframe(1)
+        if frame.f_code.co_name == "__enter__" and frame.f_back is not None:
+            frame = frame.f_back
+        started = time.monotonic()
+        if not self._lock.acquire(blocking, timeout):
+            return False
+        acquired_at = time.monotonic()
+        waited = acquired_at - started
+        site = (frame.f_code, frame.f_lineno)
+        stats = self.sites.get(site)
+        if stats is None:
+            stats = self.sites[site] = SiteStats()
+        stats.acquisitions += 1
+        stats.wait_total += waited
+        if waited > stats.wait_max:
+            stats.wait_max = waited
+        self.wait.observe(waited)
+        self._acquired_at = acquired_at
+        self._site = stats, site
+        trace = tracing.current()
+        if trace is not None:
+            trace.add("lock_wait", waited)
+        return True
+
+    def release(self):
+        held = time.monotonic() - self._acquired_at
+        stats, site = self._site
+        stats.hold_total += held
+        if held > stats.hold_max:
+            stats.hold_max = held
+        self.hold.observe(held)
+        long_hold = held >= self.registry.hold_threshold
+        if long_hold:
+            stats.long_holds += 1
+        self._lock.release()
+        if long_hold:
+            self.registry.long_hold(self.name, site_name(site), held)
+
+    def locked(self):
+        return self._lock.locked()
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def stats(self):
+        sites = sorted(list(self.sites.items()), key=lambda item: item[1].hold_max, reverse=True)
+        return {
+            "lock": self.name,
+            "locked": self.locked(),
+            "wait": self.wait.stats(),
+            "hold": self.hold.stats(),
+            "sites": {site_name(site): stats.as_dict() for site, stats in sites},
+        }
+
+
+class LockRegistry:
+    """Every InstrumentedLock of the process and the long holds they saw"""
+
+    def __init__(self, hold_threshold=0.1, keep=100):
+        self.hold_threshold = hold_threshold
+        self.lock = threading.Lock()
+        self.locks = []
+        self.long_holds = deque(maxlen=keep)
+
+    def create(self, name):
+        lock = InstrumentedLock(name, self)
+        with self.lock:
+            self.locks.append(lock)
+        return lock
+
+    def long_hold(self, name, site, held):
+        print(f"[Locks] {name} held {held * 1000:.1f} ms at {site}")
+        with self.lock:
+            self.long_holds.append({
+                "at": time.time(),
+                "lock": name,
+                "site": site,
+                "hold_ms": round(held * 1000, 3),
+                "thread": threading.current_thread().name,
+            })
+
+    def stats(self):
+        with self.lock:
+            locks = list(self.locks)
+            long_holds = list(self.long_holds)
+        return {
+            "hold_threshold_ms": round(self.hold_threshold * 1000, 3),
+            "locks": [lock.stats() for lock in locks],
+            "long_holds": long_holds,
+        }
+
+    def dump(self, path):
+        """Write stats() as JSON to path; returns the path"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"dumped_at": time.time(), **self.stats()}, f, indent=2)
+        return path
@@ -0,0 +1,163 @@
+"""Prometheus text exposition of the backend counters (GET /metrics).
+
+Nothing here runs on the message path except ThreadCounters.inc(): every
+thread counts into its own dict, and a scrape sums them and reads the
+stats the dispatcher, router, SSE hubs, scheduler and tracer already keep.
+"""
+import threading
+from collections import Counter
+
+
+class ThreadCounters:
+    """Counters without a shared lock: one dict per thread, summed on read"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._local = threading.local()
+        self._per_thread = []
+
+    def inc(self, key, amount=1):
+        try:
+            counts = self._local.counts
+        except AttributeError:
+            counts = self._local.counts = {}
+            with self.lock:
+                self._per_thread.append(counts)
+        counts[key] = counts.get(key, 0) + amount
+
+    def totals(self):
+        with self.lock:
+            per_thread = list(self._per_thread)
+        totals = Counter()
+        for counts in per_thread:
+            totals.update(dict(counts))
+        return totals
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(int(value))
+
+
+class MetricsText:
+    """Builds one exposition: declare a metric, then add its samples"""
+
+    def __init__(self):
+        self.lines = []
+
+    def metric(self, name, kind, help_text, samples):
+        """samples: [(labels dict, value)]"""
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            self.lines.append(f"{name}{_labels(labels)} {_number(value)}")
+
+    def histogram(self, name, help_text, samples):
+        """samples: [(labels dict, tracing.LatencyHistogram)]"""
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} histogram")
+        for labels, histogram in samples:
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                self.lines.append(f"{name}_bucket{_labels({**labels, 'le': le})} {cumulative}")
+            self.lines.append(f"{name}_sum{_labels(labels)} {_number(histogram.sum)}")
+            self.lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+
+    def render(self):
+        return "\n".join(self.lines) + "\n"
+
+
+def render_metrics(connection, hubs):
+    """Exposition for this process; hubs is [(room label, MQTTClient, SSEHub)]"""
+    out = MetricsText()
+
+    totals = connection.counters.totals()
+    out.metric("jocpro_mqtt_messages_received_total", "counter", "MQTT messages received, by topic",
+               [({"topic": topic}, count) for (kind, topic), count in sorted(totals.items()) if kind == "received"])
+    out.metric("jocpro_mqtt_messages_published_total", "counter", "MQTT messages handed to the broker, by topic",
+               [({"topic": topic}, count) for (kind, topic), count in sorted(totals.items()) if kind == "published"])
+    mqtt = connection.connection_stats()
+    out.metric("jocpro_mqtt_connected", "gauge", "1 while the broker connection is up",
+               [({}, 1 if mqtt["connected"] else 0)])
+    out.metric("jocpro_mqtt_disconnects_total", "counter", "Broker connections lost", [({}, mqtt["disconnects"])])
+    out.metric("jocpro_mqtt_outbound_queue_depth", "gauge", "Messages waiting for the broker to come back",
+               [({}, mqtt["outbound_queued"])])
+    out.metric("jocpro_mqtt_outbound_dropped_total", "counter", "Messages lost because the outbound queue was full",
+               [({}, mqtt["outbound_dropped"])])
+
+    routers, workers, sse = [], [], []
+    for room, client, hub in hubs:
+        dispatch = client.dispatcher.stats()
+        routers.append((room, client.router.stats(), dispatch))
+        for worker in dispatch["puzzles"]:
+            workers.append(({"room": room, "puzzle": worker["puzzle_id"]}, worker))
+        sse.append(({"room": room}, hub.totals()))
+
+    out.metric("jocpro_mqtt_malformed_total", "counter", "TO_FLASK payloads that did not fit the puzzle's schema",
+               [({"room": room, "puzzle": puzzle_id}, count)
+                for room, router, _ in routers for puzzle_id, count in router["malformed_by_puzzle"].items()])
+    out.metric("jocpro_mqtt_unroutable_total", "counter", "TO_FLASK payloads for no registered puzzle",
+               [({"room": room}, router["unroutable"] + dispatch["unroutable"]) for room, router, dispatch in routers])
+
+    for name, field, kind, help_text in (
+        ("jocpro_puzzle_messages_received_total", "received", "counter", "Messages queued for the puzzle worker"),
+        ("jocpro_puzzle_messages_handled_total", "handled", "counter", "Messages handle_message finished"),
+        ("jocpro_puzzle_messages_dropped_total", "dropped", "counter", "Messages lost to a full worker queue"),
+        ("jocpro_puzzle_handler_errors_total", "errors", "counter", "handle_message calls that raised"),
+        ("jocpro_puzzle_queue_depth", "depth", "gauge", "Messages waiting on the puzzle worker"),
+    ):
+        out.metric(name, kind, help_text, [(labels, worker[field]) for labels, worker in workers])
+    out.metric("jocpro_puzzle_handler_seconds_total", "counter", "Time spent in handle_message",
+               [(labels, worker["handler_seconds_total"]) for labels, worker in workers])
+
+    out.metric("jocpro_sse_clients", "gauge", "Connected /state_stream clients",
+               [(labels, totals["clients"]) for labels, totals in sse])
+    out.metric("jocpro_sse_events_published_total", "counter", "State updates published to the SSE hub",
+               [(labels, totals["published"]) for labels, totals in sse])
+    out.metric("jocpro_sse_events_delivered_total", "counter", "Frames handed to client connections",
+               [(labels, totals["delivered"]) for labels, totals in sse])
+    out.metric("jocpro_sse_events_coalesced_total", "counter", "Queued updates replaced by a newer one",
+               [(labels, totals["coalesced"]) for labels, totals in sse])
+    out.metric("jocpro_sse_events_dropped_total", "counter", "Updates dropped for clients that fell behind",
+               [(labels, totals["dropped"]) for labels, totals in sse])
+    out.metric("jocpro_sse_clients_evicted_total", "counter", "Clients forced to resync",
+               [(labels, totals["evicted"]) for labels, totals in sse])
+    out.metric("jocpro_sse_queue_depth", "gauge", "Frames waiting in client queues",
+               [(labels, totals["pending"]) for labels, totals in sse])
+
+    scheduler = connection.scheduler.stats()
+    out.metric("jocpro_scheduler_pending", "gauge", "Delayed puzzle callbacks waiting", [({}, scheduler["pending"])])
+    out.metric("jocpro_threads", "gauge", "Live threads in this process", [({}, threading.active_count())])
+
+    if connection.locks is not None:
+        with connection.locks.lock:
+            locks = list(connection.locks.locks)
+        out.histogram("jocpro_puzzle_lock_wait_seconds", "Time spent waiting for a puzzle lock",
+                      [({"lock": lock.name}, lock.wait) for lock in locks])
+        out.histogram("jocpro_puzzle_lock_hold_seconds", "Time a puzzle lock was held",
+                      [({"lock": lock.name}, lock.hold) for lock in locks])
+        out.metric("jocpro_puzzle_lock_long_holds_total", "counter", "Holds over LOCK_HOLD_WARN_MS",
+                   [({"lock": lock.name}, sum(site.long_holds for site in list(lock.sites.values()))) for lock in locks])
+
+    if connection.tracer is not None:
+        histograms = connection.tracer.histograms()
+        out.histogram(
+            "jocpro_message_stage_seconds",
+            "Per-stage latency of TO_FLASK messages, receive to SSE write (see mqtt/tracing.py)",
+            [({"puzzle": puzzle_id, "stage": stage}, histogram)
+             for (puzzle_id, stage), histogram in sorted(histograms.items(), key=lambda item: (str(item[0][0]), item[0][1]))],
+        )
+    return out.render()
@@ -0,0 +1,104 @@
+import json
+import threading
+
+from .sse_hub import coalesce_key, frame_payload
+
+
+MIRROR_MODES = ("off", "every", "batch")
+
+
+class PuzzleMirror:
+    """Copy of the state pushes on puzzles/<puzzle_id> for other MQTT consumers.
+
+    Modes:
+    - "off": nothing is published
+    - "every": one MQTT message per push, the push's JSON object
+    - "batch": pushes of one puzzle within `window` seconds of the first go
+      out as one message holding a JSON array of them, in order. A
+      countdown/snapshot refresh replaces an older one still in the batch
+      (same coalesce key as the SSE client queues); other events are kept.
+
+    Payloads are always whole: delta puzzles hand the mirror the payload
+    their SSE patch encodes (MQTTClient.push_update). Otherwise the JSON is
+    the one already encoded for the SSE frame, so a push is serialized once.
+    With retain=True the broker keeps the latest message per puzzle for
+    consumers that connect later; a patch, which means nothing without its
+    base, is never retained.
+    """
+
+    def __init__(self, mqtt_client, mode="every", window=0.05, retain=False):
+        if mode not in MIRROR_MODES:
+            raise ValueError(f"Unknown mirror mode: {mode}")
+        self.mqtt_client = mqtt_client
+        self.mode = mode
+        self.window = window
+        self.retain = retain
+        self.lock = threading.Lock()
+        self.batches = {}  # puzzle_id -> [(coalesce key, payload, retainable), ...] waiting for the window
+
+        self.pushes = 0
+        self.published = 0
+        self.superseded = 0
+        self.reused_encoding = 0
+        self.bytes = 0
+
+    def publish(self, data, frame=None):
+        """Mirror one push; frame is its SSE encoding, if the hub made one"""
+        with self.lock:
+            self.pushes += 1
+            if frame is not None:
+                self.reused_encoding += 1
+        if self.mode == "off":
+            return
+
+        payload = frame_payload(frame) if frame is not None else json.dumps(data).encode("utf-8")
+        puzzle_id = data.get("puzzle_id", "unknown")
+        retainable = "patch" not in data
+        if self.mode == "every":
+            self._send(puzzle_id, payload, retainable)
+            return
+
+        key = coalesce_key(data)
+        with self.lock:
+            batch = self.batches.get(puzzle_id)
+            if batch is None:
+                self.batches[puzzle_id] = [(key, payload, retainable)]
+                first = True
+            else:
+                if key is not None and batch[-1][0] == key:
+                    batch.pop()
+                    self.superseded += 1
+                batch.append((key, payload, retainable))
+                first = False
+        if first:
+            self.mqtt_client.scheduler.call_later(self.window, self._flush, puzzle_id)
+
+    def _flush(self, puzzle_id):
+        with self.lock:
+            batch = self.batches.pop(puzzle_id, None)
+        if batch:
+            payload = b"[" + b",".join(payload for _, payload, _ in batch) + b"]"
+            self._send(puzzle_id, payload, all(retainable for _, _, retainable in batch))
+
+    def _send(self, puzzle_id, payload, retainable=True):
+        topic = f"{self.mqtt_client.topic_prefix}puzzles/{puzzle_id}"
+        self.mqtt_client.publish(topic, payload, retain=self.retain and retainable)
+        with self.lock:
+            self.published += 1
+            self.bytes += len(payload)
+
+    def stats(self):
+        with self.lock:
+            waiting = sum(len(batch) for batch in self.batches.values())
+            return {
+                "mode": self.mode,
+                "window_ms": round(self.window * 1000, 3),
+                "retain": self.retain,
+                "pushes": self.pushes,
+                "published": self.published,
+                "saved": self.pushes - self.published - waiting if self.mode != "off" else self.pushes,
+                "superseded": self.superseded,
+                "waiting": waiting,
+                "reused_encoding": self.reused_encoding,
+                "bytes": self.bytes,
+            }
@@ -1,38 +1,206 @@
 from abc import ABC, abstractmethod
+import itertools
+import json
 import threading
+import time
+
+from ..delta import DeltaEncoder
+from ..tracing import TracedLock
+
+# State versions come from one counter per process: next() is atomic, and a
+# version never repeats across puzzles. BOOT_ID tells this process's ETags
+# apart from those of an earlier run.
+_STATE_VERSIONS = itertools.count(1)
+BOOT_ID = f"{int(time.time() * 1000):x}"
+
+# Values snapshot_state() keeps: they round-trip through repr/ast.literal_eval
+PLAIN_TYPES = (type(None), bool, int, float, str, tuple, list, dict, set, frozenset)
+
+
+def _is_plain(value):
+    kind = type(value)
+    if kind not in PLAIN_TYPES:
+        return False
+    if kind is float:
+        return value == value and value not in (float("inf"), float("-inf"))
+    if kind is dict:
+        return all(_is_plain(key) and _is_plain(item) for key, item in value.items())
+    if kind in (tuple, list, set, frozenset):
+        return all(_is_plain(item) for item in value)
+    return True
 
 class BasePuzzle(ABC):
+    # Opt-in: send diffs against the previous push instead of full payloads.
+    # The matching frontend must decode them with static/js/sse_delta.js.
+    # Only the SSE stream carries diffs: the MQTT mirror still gets full payloads.
+    delta_push = False
+    delta_keyframe_interval = 20
+    # TO_FLASK fields, compiled once by mqtt/router.py: handle_message gets a
+    # namedtuple of typed values. None passes the raw split fields instead.
+    MESSAGE_SCHEMA = None
+    # Left out of snapshot_state(): identity and run bookkeeping
+    SNAPSHOT_EXCLUDE = frozenset({"id", "generation", "stale_dropped", "_scheduled", "state_version", "_state_cache"})
+    # get_state() is cached per state_version (cached_state). Puzzles whose
+    # state reads the clock (countdowns) turn this off.
+    STATE_CACHEABLE = True
+
     def __init__(self, puzzle_id, mqtt_client):
         self.id = puzzle_id
         self.mqtt_client = mqtt_client
-        self.lock = threading.Lock()
+        self.clock = mqtt_client.clock  # use instead of time.* so games can run on virtual time
+        if mqtt_client.locks:
+            # LOCK_INSTRUMENTATION: wait/hold per call site in /internal/locks
+            self.lock = mqtt_client.locks.create(f"{mqtt_client.topic_prefix}puzzle{puzzle_id}")
+        elif mqtt_client.tracer:
+            # Traced: lock waits inside handle_message count in /internal/latency
+            self.lock = TracedLock()
+        else:
+            self.lock = threading.Lock()
         self.solved = False
-        
+        # Run generation: bumped by reset()/stop(). Scheduled callbacks and
+        # pushes left over from an older run are dropped instead of applied.
+        self.generation = 0
+        self.stale_dropped = 0
+        self._run = threading.local()  # generation of the scheduled callback on this thread
+        self._push_lock = threading.Lock()
+        self._delta = DeltaEncoder(self.delta_keyframe_interval) if self.delta_push else None
+        self._scheduled_lock = threading.Lock()
+        self._scheduled = set()  # pending ScheduledCall handles, cancelled on stop()/reset()
+        # Bumped (touch) after anything that may change get_state(): handled
+        # messages, scheduled callbacks, reset/stop, timer_expired and pushes
+        self.state_version = next(_STATE_VERSIONS)
+        self._state_cache = None  # (version, state dict, JSON bytes)
+
     @abstractmethod
-    def handle_message(self, parts):
-        """Handle incoming MQTT message"""
+    def handle_message(self, message):
+        """Handle incoming MQTT message (typed per MESSAGE_SCHEMA)"""
         pass
-    
+
     @abstractmethod
     def get_state(self):
         """Return current state as dict"""
         pass
-    
+
     def reset(self):
         """Reset puzzle to initial state"""
+        self._new_generation()
+        self.cancel_scheduled()
         with self.lock:
             self.solved = False
-            
+
     def stop(self):
         """Stop any running timers/threads"""
-        pass
-        
+        self._new_generation()
+        self.cancel_scheduled()
+
+    def _new_generation(self):
+        with self._push_lock:
+            self.generation += 1
+            if self._delta:
+                self._delta.reset()
+        self.touch()
+
+    def touch(self):
+        """The state changed: the next cached_state() calls get_state() again"""
+        self.state_version = next(_STATE_VERSIONS)
+
+    def cached_state(self):
+        """(ETag or None, state dict, JSON bytes), get_state() only when the version moved"""
+        cache = self._state_cache
+        version = self.state_version  # read first: a change from here on gets a newer one
+        if cache is not None and cache[0] == version:
+            return f"{BOOT_ID}-{version}", cache[1], cache[2]
+        state = self.get_state()
+        body = json.dumps(state).encode("utf-8")
+        if not self.STATE_CACHEABLE:
+            return None, state, body
+        self._state_cache = (version, state, body)
+        return f"{BOOT_ID}-{version}", state, body
+
+    def handle(self, message):
+        """handle_message stamped with the generation current when it starts.
+
+        A reset()/stop() landing while it runs bumps self.generation, so its
+        later pushes and schedule() calls count as stale, as for callbacks.
+        """
+        self._run.generation = self.generation
+        try:
+            self.handle_message(message)
+        finally:
+            self._run.generation = None
+
+    def _current_generation(self):
+        """Generation the running code belongs to"""
+        generation = getattr(self._run, "generation", None)
+        return self.generation if generation is None else generation
+
+    def schedule(self, delay, fn, *args):
+        """Run fn(*args) after delay seconds on the shared scheduler.
+
+        Returns a handle with cancel(). Pending calls are cancelled
+        automatically by stop() and reset(), and a call that still fires
+        after them is skipped.
+        """
+        handle = self.mqtt_client.scheduler.call_later(
+            delay, self._run_scheduled, self._current_generation(), fn, args
+        )
+        with self._scheduled_lock:
+            self._scheduled = {h for h in self._scheduled if h.pending}
+            self._scheduled.add(handle)
+        return handle
+
+    def cancel_scheduled(self):
+        """Cancel every pending call made through schedule()"""
+        with self._scheduled_lock:
+            handles, self._scheduled = self._scheduled, set()
+        for handle in handles:
+            handle.cancel()
+
+    def _run_scheduled(self, generation, fn, args):
+        if generation != self.generation:
+            self.stale_dropped += 1
+            return
+        self._run.generation = generation
+        try:
+            fn(*args)
+        finally:
+            self._run.generation = None
+            self.touch()
+        if self.mqtt_client.journal is not None:
+            self.mqtt_client.journal.changed(self)
+
+    def snapshot_state(self):
+        """Plain-data attributes, {name: value}: what the session journal keeps"""
+        return {
+            name: value for name, value in vars(self).items()
+            if name not in self.SNAPSHOT_EXCLUDE and _is_plain(value)
+        }
+
+    def restore_state(self, state):
+        """Set attributes from a snapshot_state() dict"""
+        for name, value in state.items():
+            setattr(self, name, value)
+        self.touch()
+
     def timer_expired(self):
         """Handle timer expiration"""
         pass
-            
+
     def _push(self, data):
         """Push update with puzzle metadata"""
         base = {"puzzle_id": self.id}
         base.update(data)
-        self.mqtt_client.push_update(base)
\ No newline at end of file
+        # Check the generation and hand over under one lock, so nothing from
+        # an older run can follow the first push of a new one. Delta patches
+        # are encoded here too so they leave in sequence order.
+        with self._push_lock:
+            generation = self._current_generation()
+            if generation != self.generation:
+                self.stale_dropped += 1
+                return
+            base["generation"] = generation
+            self.touch()
+            if self._delta:
+                self.mqtt_client.push_update(self._delta.encode(base), base)
+            else:
+                self.mqtt_client.push_update(base)
@@ -1,9 +1,12 @@
 from .base import BasePuzzle
-import threading
-import time
 import random
 
 class Puzzle1(BasePuzzle):
+    MESSAGE_SCHEMA = "P1,a:int,b:int"
+
+    # Each solved sum resends the whole operations list
+    delta_push = True
+
     def __init__(self, mqtt_client):
         super().__init__(puzzle_id=1, mqtt_client=mqtt_client)
         self.suma_results_pool = [
@@ -61,10 +64,19 @@ class Puzzle1(BasePuzzle):
 
     def stop(self):
         """Cleanup on puzzle stop"""
+        super().stop()
         with self.lock:
             self.processing_wrong_result = False
             self.countdown_next_round_active = False
-            
+
+    def restore_state(self, state):
+        super().restore_state(state)
+        # A recovered pause has lost the callback that ends it: schedule it again
+        if self.processing_wrong_result:
+            self.schedule(self.incorrect_feedback_seconds, self._delayed_reset)
+        elif self.countdown_next_round_active:
+            self.schedule(3, self._countdown_and_advance, self.round + 1, 5)
+
     def get_state(self):
         """Return current puzzle state"""
         with self.lock:
@@ -75,15 +87,9 @@ class Puzzle1(BasePuzzle):
                 "round_size": self.round_sizes[self.round]
             }
             
-    def handle_message(self, parts):
+    def handle_message(self, message):
         """Handle MQTT message: P1,a,b"""
-        if len(parts) < 3:
-            return
-        try:
-            a, b = map(int, parts[1:3])
-        except ValueError:
-            return
-        self._check_sum_or_reset(a, b)
+        self._check_sum_or_reset(message.a, message.b)
         
     def _check_sum_or_reset(self, a, b):
         """Validate sum and update state"""
@@ -125,33 +131,8 @@ class Puzzle1(BasePuzzle):
                                 "next_round": next_round
                             })
                             
-                            def _countdown_and_advance():
-                                time.sleep(3)  # Show last solved message
-                                
-                                # Countdown 5..1
-                                for sec in range(5, 0, -1):
-                                    self._push({
-                                        "countdown_next_round": {"seconds": sec},
-                                        "round": self.round,
-                                        "next_round": next_round
-                                    })
-                                    time.sleep(1)
-                                    
-                                # Start next round
-                                with self.lock:
-                                    self.round = next_round
-                                    self.processing_wrong_result = False
-                                    self.countdown_next_round_active = False
-                                    self._reset_operations()
-                                    self._push({
-                                        "operations": self.operations_with_metadata.copy(),
-                                        "round": self.round,
-                                        "round_start": True,
-                                        "start_timer": True,
-                                        "round_size": self.round_sizes[self.round]
-                                    })
-                                    
-                            threading.Thread(target=_countdown_and_advance, daemon=True).start()
+                            # Show last solved message for 3s, then countdown 5..1
+                            self.schedule(3, self._countdown_and_advance, next_round, 5)
                         else:
                             # Puzzle complete
                             self.solved = True
@@ -184,11 +165,35 @@ class Puzzle1(BasePuzzle):
                 "round": self.round,
                 "round_size": self.round_sizes[self.round]
             })
-            threading.Thread(target=self._delayed_reset, daemon=True).start()
+            self.schedule(self.incorrect_feedback_seconds, self._delayed_reset)
+
+    def _countdown_and_advance(self, next_round, seconds):
+        """Push one countdown second, then the next one or the new round"""
+        if seconds > 0:
+            self._push({
+                "countdown_next_round": {"seconds": seconds},
+                "round": self.round,
+                "next_round": next_round
+            })
+            self.schedule(1, self._countdown_and_advance, next_round, seconds - 1)
+            return
+
+        # Start next round
+        with self.lock:
+            self.round = next_round
+            self.processing_wrong_result = False
+            self.countdown_next_round_active = False
+            self._reset_operations()
+            self._push({
+                "operations": self.operations_with_metadata.copy(),
+                "round": self.round,
+                "round_start": True,
+                "start_timer": True,
+                "round_size": self.round_sizes[self.round]
+            })
             
     def _delayed_reset(self):
         """Reset operations after wrong answer"""
-        time.sleep(self.incorrect_feedback_seconds)
         with self.lock:
             self.processing_wrong_result = False
             self._reset_operations()
@@ -207,7 +212,6 @@ class Puzzle1(BasePuzzle):
             self.processing_wrong_result = True
             
         def _later():
-            time.sleep(5)  # Show timeout message
             with self.lock:
                 self._reset_operations()
                 self.processing_wrong_result = False
@@ -218,4 +222,4 @@ class Puzzle1(BasePuzzle):
                     "round_size": self.round_sizes[self.round]
                 })
                 
-        threading.Thread(target=_later, daemon=True).start()
\ No newline at end of file
+        self.schedule(5, _later)  # Show timeout message
\ No newline at end of file
@@ -2,6 +2,8 @@ from .base import BasePuzzle
 import random
 
 class Puzzle10(BasePuzzle):
+    MESSAGE_SCHEMA = "P10,box:int,code:str"
+
     def __init__(self, mqtt_client):
         super().__init__(puzzle_id=10, mqtt_client=mqtt_client)
 
@@ -39,20 +41,14 @@ class Puzzle10(BasePuzzle):
                 "puzzle_solved": False
             })
 
-    def handle_message(self, parts):
+    def handle_message(self, message):
         # Expect: P10,box,code (e.g. P10,3,213)
-        if len(parts) < 3:
-            return
-
-        try:
-            box = int(parts[1])
-        except ValueError:
-            return
+        box = message.box
 
         if not (0 <= box <= 9):
             return
 
-        code = parts[2].strip()
+        code = message.code
 
         with self.lock:
             if self.solved:
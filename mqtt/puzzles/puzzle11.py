@@ -15,6 +15,11 @@ STEP_SEQUENCES = [
 ]
 
 class Puzzle11(BasePuzzle):
+    MESSAGE_SCHEMA = "P11,box:int,token:int,color:int"
+
+    # Substep pushes repeat every counter
+    delta_push = True
+
     def __init__(self, mqtt_client):
         super().__init__(puzzle_id=11, mqtt_client=mqtt_client)
         self.current_step = 0
@@ -43,17 +48,9 @@ class Puzzle11(BasePuzzle):
                 "step_completion_count": self.step_completion_count,
             })
 
-    def handle_message(self, parts):
+    def handle_message(self, message):
         # Expect: P11,box,token,color
-        if len(parts) < 4:
-            return
-
-        try:
-            box = int(parts[1])
-            token = int(parts[2])
-            color = int(parts[3])
-        except ValueError:
-            return
+        box, token, color = message.box, message.token, message.color
 
         with self.lock:
             if self.solved:
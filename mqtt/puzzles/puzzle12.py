@@ -1,13 +1,42 @@
 from .base import BasePuzzle
-import threading
+from functools import lru_cache
+import itertools
 import random
-import time
+
+BUTTONS = 6
+BUTTON_BITS = 8  # bits per button count in a packed key
+# More boxes could carry a button's count into the next one's byte
+MAX_BOXES = (1 << BUTTON_BITS) - 1
+# Every valid panel: 6 buttons, each 0 or 1
+BUTTON_STATES = frozenset(itertools.product((0, 1), repeat=BUTTONS))
+
+
+@lru_cache(maxsize=256)
+def pack(counts):
+    """(2, 2, 1, 2, 2, 1) -> one int with a byte per button, so summing tuples is summing ints"""
+    key = 0
+    for i, count in enumerate(counts):
+        key |= count << (BUTTON_BITS * i)
+    return key
+
+
+@lru_cache(maxsize=1024)
+def unpack(key, buttons=BUTTONS):
+    """pack() back to a tuple of counts"""
+    mask = (1 << BUTTON_BITS) - 1
+    return tuple((key >> (BUTTON_BITS * i)) & mask for i in range(buttons))
+
 
 class Puzzle12(BasePuzzle):
+    MESSAGE_SCHEMA = "P12,box:int,buttons:bits"
+    # Scheduler handles: restore_state() schedules the pause again instead
+    SNAPSHOT_EXCLUDE = BasePuzzle.SNAPSHOT_EXCLUDE | {"_solve_timer", "_transition_timer"}
+    # Print every box state with the totals: two prints per message under the lock
+    LOG_TOTALS = False
+
     def __init__(self, mqtt_client):
         super().__init__(puzzle_id=12, mqtt_client=mqtt_client)
         
-        self.lock = threading.Lock()
         self.solved = False
         self.processing_wrong_result = False
         self.current_giff = 0
@@ -18,19 +47,30 @@ class Puzzle12(BasePuzzle):
             { "id": 2, "duration": 45, "num_giff": 5 },
             { "id": 3, "duration": 90, "num_giff": 5 }
         ]
-        # box_states[box_id] = list of 6 ints (0/1), box_id 1-based
+        # box_states[box_id] = tuple of 6 ints (0/1), box_id 1-based
         self.box_states = {}
-        self._solve_timer = None  # threading.Timer for 5-second confirmation
+        # pack() of the per-button sums over box_states, kept up to date per message
+        self.totals_key = 0
+        self._solve_timer = None  # scheduled 3-second confirmation
+        # Pause after a solved streak: input is held for the next round meanwhile
+        self.transitioning = False
+        self.pending_boxes = {}
+        self._transition_timer = None
 
         #negre,verd,vermell,groc,blau,blanc
         self.botons = (((2,2,1,2,2,1),(2,1,2,1,2,2),(1,1,1,3,3,1),(2,1,3,2,1,1),(1,2,1,2,1,3)),
                         ((2,2,5,2,2,2),(2,3,4,2,3,1),(3,3,2,3,1,3),(1,1,3,4,4,2),(4,1,1,5,1,3)),
                         ((4,4,4,4,5,4),(4,3,5,2,6,5),(1,4,6,4,8,2),(6,2,2,8,4,3),(4,5,5,3,4,4)))
                         #((0,4,4,4,4,2),(0,3,6,5,2,2),(0,5,3,2,3,5),(0,3,5,6,2,2),(0,2,2,4,8,2)))
+        self.target_keys = tuple(tuple(pack(target) for target in streak) for streak in self.botons)
 
     def reset(self):
         print("Starting Puzzle 12")
+        super().reset()
         with self.lock:
+            self._cancel_solve_timer()
+            self._end_transition()
+            self.processing_wrong_result = False
             self.current_streak = 1
             self.current_giff = self.get_giff()
             self.solved = False
@@ -43,49 +83,91 @@ class Puzzle12(BasePuzzle):
                 "duration": self.counters[self.current_streak - 1]["duration"]
             })
 
-    def handle_message(self, parts):
-        # parts = ['P12', '<box_id>', '<buttons_string>']
-        if len(parts) < 3:
-            return
-        try:
-            box_id = int(parts[1])
-            btn_str = parts[2].strip()
-            buttons = [int(c) for c in btn_str]  # e.g. '110010' -> [1,1,0,0,1,0]
-        except (ValueError, IndexError):
+    def handle_message(self, message):
+        # P12,<box_id>,<buttons> with buttons '110010' -> (1, 1, 0, 0, 1, 0)
+        box_id, buttons = message.box, message.buttons
+        if buttons not in BUTTON_STATES:
+            print(f"[Puzzle12] Ignoring box {box_id}: buttons {buttons} are not {BUTTONS} bits")
             return
 
         with self.lock:
             if self.solved or self.processing_wrong_result:
                 return
+            if self.transitioning:
+                # Counts for the round that starts when the pause ends
+                self.pending_boxes[box_id] = buttons
+                return
 
-            self.box_states[box_id] = buttons
+            if not self._set_box(box_id, buttons):
+                return
 
-            # Sum each button position across all boxes
-            totals = [0] * 6
-            for state in self.box_states.values():
-                for i, v in enumerate(state):
-                    totals[i] += v
+            if self.LOG_TOTALS:
+                totals = list(unpack(self.totals_key))
+                print(f"Received box {box_id} state: {buttons}, Totals so far: {totals}")
+                print(f"Totals: {totals}, Target: {self._target()}")
+            self._check_target()
 
-            print(f"Received box {box_id} state: {buttons}, Totals so far: {totals}")
+    def _set_box(self, box_id, buttons):
+        """Swap this box's previous buttons for the new ones in the running sums"""
+        previous = self.box_states.get(box_id)
+        if previous is not None:
+            self.totals_key -= pack(previous)
+        elif len(self.box_states) >= MAX_BOXES:
+            print(f"[Puzzle12] Ignoring box {box_id}: already {MAX_BOXES} boxes")
+            return False
+        self.totals_key += pack(buttons)
+        self.box_states[box_id] = buttons
+        return True
 
-            # Target: botons[streak_index][giff_index]
-            streak_idx = self.current_streak - 1
-            giff_idx = self.current_giff - 1
-            target = list(self.botons[streak_idx][giff_idx])
+    def _check_target(self):
+        if self.totals_key == self._target_key():
+            # Start 5-second confirmation timer if not already running
+            if self._solve_timer is None:
+                self._solve_timer = self.schedule(3.0, self._confirm_solved)
+                print("Correct! Starting 3s confirmation timer.")
+        else:
+            # Cancel confirmation timer if state no longer matches
+            self._cancel_solve_timer()
 
-            print(f"Totals: {totals}, Target: {target}")
+    def _target(self):
+        # Target: botons[streak_index][giff_index]
+        return list(self.botons[self.current_streak - 1][self.current_giff - 1])
 
-            if totals == target:
-                # Start 5-second confirmation timer if not already running
-                if self._solve_timer is None:
-                    self._solve_timer = threading.Timer(3.0, self._confirm_solved)
-                    self._solve_timer.start()
-                    print("Correct! Starting 3s confirmation timer.")
-            else:
-                # Cancel confirmation timer if state no longer matches
-                if self._solve_timer is not None:
-                    self._solve_timer.cancel()
-                    self._solve_timer = None
+    def _target_key(self):
+        return self.target_keys[self.current_streak - 1][self.current_giff - 1]
+
+    def _clear_boxes(self):
+        self.box_states = {}
+        self.totals_key = 0
+
+    def _cancel_solve_timer(self):
+        if self._solve_timer is not None:
+            self._solve_timer.cancel()
+            self._solve_timer = None
+
+    def _end_transition(self):
+        if self._transition_timer is not None:
+            self._transition_timer.cancel()
+            self._transition_timer = None
+        self.transitioning = False
+        self.pending_boxes = {}
+
+    def stop(self):
+        super().stop()
+        with self.lock:
+            self._cancel_solve_timer()
+            self._end_transition()
+
+    def restore_state(self, state):
+        super().restore_state(state)
+        # A recovered pause or confirmation has lost its scheduled end: start it again
+        if not self.transitioning:
+            self._end_transition()
+            if not self.solved and self.current_streak:
+                self._check_target()
+        elif self._transition_timer is None:
+            last = self.current_streak >= self.streaks
+            self._transition_timer = self.schedule(3 if last else 4, self._finish_transition)
 
     def _confirm_solved(self):
         with self.lock:
@@ -95,36 +177,42 @@ class Puzzle12(BasePuzzle):
                 })
             self._solve_timer = None
             # Re-check in case state changed during the 5 seconds
-            totals = [0] * 6
-            for state in self.box_states.values():
-                for i, v in enumerate(state):
-                    totals[i] += v
-
-            streak_idx = self.current_streak - 1
-            giff_idx = self.current_giff - 1
-            target = list(self.botons[streak_idx][giff_idx])
-
-            if totals != target:
+            if self.totals_key != self._target_key():
                 print("State changed during confirmation, not solved.")
                 return
 
             print(f"Streak {self.current_streak} solved!")
 
+            # Brief pause before declaring the puzzle solved or starting the next
+            # round, scheduled so input and get_state() are not held up meanwhile
+            self.transitioning = True
             if self.current_streak >= self.streaks:
                 self.mqtt_client.send_message("FROM_FLASK", f"P{self.id}End")
-                time.sleep(3)  # Brief pause before declaring puzzle solved
+                self._transition_timer = self.schedule(3, self._finish_transition)
+            else:
+                self._transition_timer = self.schedule(4, self._finish_transition)
+
+    def _finish_transition(self):
+        with self.lock:
+            if not self.transitioning:
+                return
+            self._transition_timer = None
+            pending = self.pending_boxes
+            self.transitioning = False
+            self.pending_boxes = {}
+
+            if self.current_streak >= self.streaks:
                 self.solved = True
                 self._push({
                     "puzzle_id": self.id,
                     "puzzle_solved": True
                 })
             else:
-                time.sleep(4)  # Brief pause before next round
                 self.current_streak += 1
                 self.current_giff = self.get_giff()
                 if self.current_streak == 4:
                     self.mqtt_client.send_message("FROM_FLASK", f"P{self.id}Color{self.current_giff}")
-                self.box_states = {}
+                self._clear_boxes()
                 self._push({
                     "puzzle_id": self.id,
                     "startRound": True,
@@ -133,6 +221,11 @@ class Puzzle12(BasePuzzle):
                     "num_giff": self.current_giff,
                     "duration": self.counters[self.current_streak - 1]["duration"]
                 })
+                if pending:
+                    for box_id, buttons in pending.items():
+                        self._set_box(box_id, buttons)
+                    print(f"Applied {len(pending)} box states received during the pause, Totals: {list(unpack(self.totals_key))}")
+                    self._check_target()
 
     def get_state(self):
         with self.lock:
@@ -148,6 +241,7 @@ class Puzzle12(BasePuzzle):
                 "num_giff": self.current_giff,
                 "duration": self.counters[self.current_streak - 1]["duration"] if 1 <= self.current_streak <= self.streaks else None,
                 "target": target,
+                "transitioning": self.transitioning,
                 "box_states": self.box_states.copy()
             }
 
@@ -160,24 +254,21 @@ class Puzzle12(BasePuzzle):
     def timer_expired(self):
         print("Final puzzle timer expired. Resetting current round.")
         with self.lock:
-            if self.processing_wrong_result:
+            if self.processing_wrong_result or self.transitioning:
                 return
             self.processing_wrong_result = True
 
             # Cancel solve confirmation timer if running
-            if self._solve_timer is not None:
-                self._solve_timer.cancel()
-                self._solve_timer = None
+            self._cancel_solve_timer()
 
             def _later():
-                time.sleep(5)
                 with self.lock:
                     self.current_giff = self.get_giff()
                     if self.current_streak == 4:
                         self.mqtt_client.send_message("FROM_FLASK", f"P{self.id}Color{self.current_giff}")
                     self.solved = False
                     self.processing_wrong_result = False
-                    self.box_states = {}
+                    self._clear_boxes()
                     self._push({
                         "puzzle_id": self.id,
                         "startRound": True,
@@ -187,4 +278,4 @@ class Puzzle12(BasePuzzle):
                         "duration": self.counters[self.current_streak - 1]["duration"]
                     })
 
-            threading.Thread(target=_later, daemon=True).start()
+            self.schedule(5, _later)
@@ -1,9 +1,9 @@
 from .base import BasePuzzle
-import threading
-import time
 import random
 
 class Puzzle2(BasePuzzle):
+    MESSAGE_SCHEMA = "P2,player:int,symbol:int"
+
     def __init__(self, mqtt_client):
         super().__init__(puzzle_id=2, mqtt_client=mqtt_client)
         
@@ -30,6 +30,8 @@ class Puzzle2(BasePuzzle):
         self.progress = {p: 0 for p in self.sequences.keys()}
         self.alarm_mode = False
         self.alarm_timer = None
+        self.alarm_switching = False  # the 5 s alarm sound before alarm_mode flips
+        self.alarm_deadline = None    # clock.time() when alarm_timer fires
         self.input_blocked = False
         self.block_until = 0
         self.errorsToReset = 3
@@ -49,6 +51,7 @@ class Puzzle2(BasePuzzle):
             self.error_counter = 0
             self.progress = {p: 0 for p in self.sequences.keys()}
             self.alarm_mode = False
+            self.alarm_switching = False
             self.input_blocked = False
             self.block_until = 0
             
@@ -66,12 +69,12 @@ class Puzzle2(BasePuzzle):
             # Schedule new alarm
             alarm_delay = random.randint(20, 40)
             print(f"[Puzzle2] Rescheduling alarm mode in {alarm_delay} seconds after reset")
-            self.alarm_timer = threading.Timer(alarm_delay, self._enter_alarm_mode)
-            self.alarm_timer.start()
+            self._schedule_alarm(alarm_delay, self._enter_alarm_mode)
 
 
     def stop(self):
         """Cleanup on puzzle stop"""
+        super().stop()
         with self.lock:
             if self.alarm_timer:
                 try:
@@ -81,7 +84,23 @@ class Puzzle2(BasePuzzle):
                 self.alarm_timer = None
             self.input_blocked = False
             self.alarm_mode = False
-            
+
+    def restore_state(self, state):
+        super().restore_state(state)
+        # The alarm cycle lives in scheduled calls: schedule the pending step
+        # again for its saved deadline (block_until ends an input block on its own)
+        if self.solved or self.alarm_deadline is None:
+            return
+        if self.alarm_switching:
+            step = self._deactivate_alarm if self.alarm_mode else self._activate_alarm
+        else:
+            step = self._exit_alarm_mode if self.alarm_mode else self._enter_alarm_mode
+        self._schedule_alarm(max(0, self.alarm_deadline - self.clock.time()), step)
+
+    def _schedule_alarm(self, delay, fn):
+        self.alarm_deadline = self.clock.time() + delay
+        self.alarm_timer = self.schedule(delay, fn)
+
     def get_state(self):
         """Return current puzzle state"""
         with self.lock:
@@ -102,7 +121,8 @@ class Puzzle2(BasePuzzle):
         print(f"[Puzzle2] Playing alarm sound and blocking input for 5s")
         with self.lock:
             self.input_blocked = True
-            self.block_until = time.time() + 5
+            self.block_until = self.clock.time() + 5
+            self.alarm_switching = True
             
             # Play alarm sound
             self._push({
@@ -111,23 +131,22 @@ class Puzzle2(BasePuzzle):
                 }
             })
             
-        # Activate alarm mode after 5s
-        def _later():
-            time.sleep(5)
-            with self.lock:
-                self.alarm_mode = True
-                self.input_blocked = False
-                print(f"[Puzzle2] Alarm mode ACTIVE, pushing update to frontend")
-                
-                self._push({"alarm_mode": True})
-                
-                # Schedule exit after 20-40s
-                alarm_duration = random.randint(20, 40)
-                print(f"[Puzzle2] Scheduling alarm exit in {alarm_duration} seconds")
-                self.alarm_timer = threading.Timer(alarm_duration, self._exit_alarm_mode)
-                self.alarm_timer.start()
-                
-        threading.Thread(target=_later, daemon=True).start()
+            # Activate alarm mode after 5s
+            self._schedule_alarm(5, self._activate_alarm)
+
+    def _activate_alarm(self):
+        with self.lock:
+            self.alarm_mode = True
+            self.alarm_switching = False
+            self.input_blocked = False
+            print(f"[Puzzle2] Alarm mode ACTIVE, pushing update to frontend")
+            
+            self._push({"alarm_mode": True})
+            
+            # Schedule exit after 20-40s
+            alarm_duration = random.randint(20, 40)
+            print(f"[Puzzle2] Scheduling alarm exit in {alarm_duration} seconds")
+            self._schedule_alarm(alarm_duration, self._exit_alarm_mode)
         
     def _exit_alarm_mode(self):
         """Exit alarm mode - play sound and revert mapping"""
@@ -138,7 +157,8 @@ class Puzzle2(BasePuzzle):
         print(f"[Puzzle2] Playing normal sound and blocking input for 5s")
         with self.lock:
             self.input_blocked = True
-            self.block_until = time.time() + 5
+            self.block_until = self.clock.time() + 5
+            self.alarm_switching = True
             
             self._push({
                 "play_normal_sound": {
@@ -146,38 +166,30 @@ class Puzzle2(BasePuzzle):
                 }
             })
             
-        # Deactivate alarm mode after 5s
-        def _later():
-            time.sleep(5)
-            with self.lock:
-                self.alarm_mode = False
-                self.input_blocked = False
-                print(f"[Puzzle2] Alarm mode INACTIVE, pushing update to frontend")
-                
-                self._push({"alarm_mode": False})
-                
-                # Schedule next alarm entry after 20-40s
-                alarm_delay = random.randint(20, 40)
-                print(f"[Puzzle2] Scheduling next alarm mode in {alarm_delay} seconds")
-                self.alarm_timer = threading.Timer(alarm_delay, self._enter_alarm_mode)
-                self.alarm_timer.start()
-                
-        threading.Thread(target=_later, daemon=True).start()
+            # Deactivate alarm mode after 5s
+            self._schedule_alarm(5, self._deactivate_alarm)
+
+    def _deactivate_alarm(self):
+        with self.lock:
+            self.alarm_mode = False
+            self.alarm_switching = False
+            self.input_blocked = False
+            print(f"[Puzzle2] Alarm mode INACTIVE, pushing update to frontend")
+            
+            self._push({"alarm_mode": False})
+            
+            # Schedule next alarm entry after 20-40s
+            alarm_delay = random.randint(20, 40)
+            print(f"[Puzzle2] Scheduling next alarm mode in {alarm_delay} seconds")
+            self._schedule_alarm(alarm_delay, self._enter_alarm_mode)
         
-    def handle_message(self, parts):
+    def handle_message(self, message):
         """Handle MQTT message: P2,player,symbol"""
-        if len(parts) < 3:
-            return
-            
-        try:
-            player = int(parts[1])
-            symbol = int(parts[2])
-        except ValueError:
-            return
+        player, symbol = message.player, message.symbol
             
         with self.lock:
             # Block input during transition
-            if self.input_blocked and time.time() < self.block_until:
+            if self.input_blocked and self.clock.time() < self.block_until:
                 print(f"[Puzzle2] Input blocked, ignoring message from player {player}")
                 return
                 
@@ -235,7 +247,7 @@ class Puzzle2(BasePuzzle):
 
                     # Block input during error animation (4 seconds)
                     self.input_blocked = True
-                    self.block_until = time.time() + 4
+                    self.block_until = self.clock.time() + 4
 
                     self._push({
                         "players": self._snapshot(),
@@ -249,12 +261,11 @@ class Puzzle2(BasePuzzle):
 
                     # Unblock after 4 seconds
                     def _unblock_later():
-                        time.sleep(4)
                         with self.lock:
                             self.input_blocked = False
                             print(f"[Puzzle2] Error flash finished, input unblocked")
 
-                    threading.Thread(target=_unblock_later, daemon=True).start()
+                    self.schedule(4, _unblock_later)
 
                 else:
                     # Counter not yet at threshold: flash the erroring player only
@@ -1,9 +1,9 @@
 from .base import BasePuzzle
-import threading
-import time
 import random
 
 class Puzzle3(BasePuzzle):
+    MESSAGE_SCHEMA = "P3,player:int,answer:int"
+
     def __init__(self, mqtt_client):
         super().__init__(puzzle_id=3, mqtt_client=mqtt_client)
         
@@ -18,6 +18,7 @@ class Puzzle3(BasePuzzle):
         self.total_players = 10
         self.answered_players = {}       # {player: answer_idx}
         self.correct_question_ids = set()  # questions solved correctly in this run
+        self.pending_checkpoint = None   # checkpoint to resume from once a new set is drawn
 
     def _checkpoint_for_streak(self, streak):
         """Return the last unlocked checkpoint based on solved questions."""
@@ -65,6 +66,7 @@ class Puzzle3(BasePuzzle):
         self.current_question_idx = 0
         self.streak = 0
         self.answered_players = {}
+        self.pending_checkpoint = None
         # Keep self.correct_question_ids so correctly solved questions
         # are not reintroduced when creating new sets after failures.
         
@@ -90,7 +92,6 @@ class Puzzle3(BasePuzzle):
     def _schedule_next_question(self, delay=5):
         """Schedule next question after delay"""
         def _later():
-            time.sleep(delay)
             with self.lock:
                 if self.streak >= self.total_required:
                     return  # already solved
@@ -102,7 +103,7 @@ class Puzzle3(BasePuzzle):
                 self.answered_players = {}
                 self._push_question()
                 
-        threading.Thread(target=_later, daemon=True).start()
+        self.schedule(delay, _later)
         
     def reset(self):
         """Full reset to start"""
@@ -122,9 +123,20 @@ class Puzzle3(BasePuzzle):
 
     def stop(self):
         """Cleanup on puzzle stop"""
+        super().stop()
         with self.lock:
             self.answered_players = {}
-            
+
+    def restore_state(self, state):
+        super().restore_state(state)
+        if self.streak >= self.total_required:
+            return
+        # Recovered while showing a result: the next question or the new set was still to come
+        if self.pending_checkpoint is not None:
+            self.schedule(5, self._resume_from_checkpoint, self.pending_checkpoint)
+        elif len(self.answered_players) >= self.total_players:
+            self._schedule_next_question()
+
     def get_state(self):
         """Return current puzzle state"""
         with self.lock:
@@ -149,22 +161,19 @@ class Puzzle3(BasePuzzle):
                 "total_players": self.total_players
             }
             
-    def handle_message(self, parts):
+    def handle_message(self, message):
         """Handle MQTT message: P3,player,answerIndex"""
-        if len(parts) < 3:
-            return
-            
-        try:
-            player = int(parts[1])
-            answer_idx = int(parts[2])
-        except ValueError:
-            return
+        player, answer_idx = message.player, message.answer
         
         with self.lock:
             # Ignore if already solved
             if self.streak >= self.total_required:
                 return
                 
+            # Ignore answers while a failed question waits for the new set
+            if self.pending_checkpoint is not None:
+                return
+                
             # Validate player range
             if not (0 <= player < self.total_players):
                 return
@@ -242,18 +251,17 @@ class Puzzle3(BasePuzzle):
                     self._schedule_next_question(delay=5)
                 else:
                     # Wrong: show result for 5s, then load a new set and resume from checkpoint
-                    checkpoint = self.streak
+                    self.pending_checkpoint = self.streak
+                    self.schedule(5, self._resume_from_checkpoint, self.pending_checkpoint)
 
-                    def _later(saved_checkpoint=checkpoint):
-                        time.sleep(5)
-                        with self.lock:
-                            self._choose_new_set()
-                            if self.chosen_questions:
-                                self.current_question_idx = min(
-                                    saved_checkpoint,
-                                    len(self.chosen_questions) - 1
-                                )
-                                self.streak = self.current_question_idx
-                            self._push_question()
-                            
-                    threading.Thread(target=_later, daemon=True).start()
+    def _resume_from_checkpoint(self, checkpoint):
+        """Load a new set and continue from the checkpoint reached before the failure"""
+        with self.lock:
+            self._choose_new_set()
+            if self.chosen_questions:
+                self.current_question_idx = min(
+                    checkpoint,
+                    len(self.chosen_questions) - 1
+                )
+                self.streak = self.current_question_idx
+            self._push_question()
@@ -1,10 +1,10 @@
 from .base import BasePuzzle
-import threading
-import time
 import os
 import wave
 
 class Puzzle4(BasePuzzle):
+    MESSAGE_SCHEMA = "P4,button:int,song:int=0"
+
     def __init__(self, mqtt_client):
         super().__init__(puzzle_id=4, mqtt_client=mqtt_client)
         
@@ -46,6 +46,10 @@ class Puzzle4(BasePuzzle):
             9: ("9", f"{self.streak2_folder}/pista4.wav"),
         }
         self.streak2_required_order = ["6", "1", "0", "9", "8", "4", "2", "7"]
+
+        # Durations read once here, not on the shared scheduler thread
+        # {rel_path_full: seconds} of every audio file that exists
+        self.audio_durations = self._read_audio_durations()
         
         # State
         self.total_required = 2
@@ -66,12 +70,24 @@ class Puzzle4(BasePuzzle):
         """Get required order for current streak"""
         return self.streak1_required_order if self.streak == 0 else self.streak2_required_order
 
+    def _read_audio_durations(self):
+        """Duration of each sample and track found under the static folder"""
+        rel_paths = [self.streak1_sample, self.streak2_sample]
+        for track_map in (self.streak1_track_map, self.streak2_track_map):
+            rel_paths.extend(rel_path for _, rel_path in track_map.values())
+        durations = {}
+        for rel_path in rel_paths:
+            rel_path_full = f"{self.AUDIO_SUBDIR}{rel_path}"
+            full_fs_path = os.path.join(self.mqtt_client.app.static_folder, rel_path_full)
+            if os.path.exists(full_fs_path):
+                durations[rel_path_full] = self._read_audio_duration(full_fs_path)
+        return durations
+
     def _get_audio_duration(self, rel_path_full):
         """Return wav duration in seconds when available."""
-        full_fs_path = os.path.join(self.mqtt_client.app.static_folder, rel_path_full)
-        if not os.path.exists(full_fs_path):
-            return 0
+        return self.audio_durations.get(rel_path_full, 0)
 
+    def _read_audio_duration(self, full_fs_path):
         try:
             with wave.open(full_fs_path, "rb") as wav_file:
                 frames = wav_file.getnframes()
@@ -86,7 +102,6 @@ class Puzzle4(BasePuzzle):
     def _play_sample_with_delay(self, sample_url, duration):
         """Play sample and automatically unblock after duration"""
         def _delayed_unblock():
-            time.sleep(duration)
             with self.lock:
                 if not self.solved and self.playing_sample:
                     self.playing_sample = False
@@ -99,7 +114,7 @@ class Puzzle4(BasePuzzle):
                         "played_sequence": [],
                         "storing": False
                     })
-        threading.Thread(target=_delayed_unblock, daemon=True).start()
+        self.schedule(duration, _delayed_unblock)
         
     def reset(self):
         """Full reset"""
@@ -113,10 +128,10 @@ class Puzzle4(BasePuzzle):
             self.history = []
             self.solved = False
             self.playing_sample = True
+            self.validating = False
             
             # Delay initial push so frontend is ready
             def _later():
-                time.sleep(3)
                 with self.lock:
                     if self.solved:
                         return
@@ -141,14 +156,32 @@ class Puzzle4(BasePuzzle):
                         self.streak1_sample,
                         self.streak1_sample_duration
                     )
-            threading.Thread(target=_later, daemon=True).start()
+            self.schedule(3, _later)
             
     def stop(self):
         """Cleanup on puzzle stop"""
+        super().stop()
         with self.lock:
             self.playing_sample = False
             self.validating = False
 
+    def restore_state(self, state):
+        super().restore_state(state)
+        # Input stays blocked until a scheduled call clears these flags: schedule it again
+        if self.solved:
+            return
+        if self.validating:
+            is_correct = self.played_sequence == self._get_current_required_order()
+            self.schedule(self.VALIDATION_FEEDBACK_SECONDS, self._handle_validation, is_correct)
+        elif self.playing_sample:
+            if self.streak >= self.total_required:
+                self.schedule(2, self._finish_solved, list(self._get_current_required_order()),
+                              self.streak, self.total_required)
+            elif self.streak == 0:
+                self._play_sample_with_delay(self.streak1_sample, self.streak1_sample_duration)
+            else:
+                self._play_sample_with_delay(self.streak2_sample, self.streak2_sample_duration)
+
     def get_state(self):
         with self.lock:
             return {
@@ -163,10 +196,8 @@ class Puzzle4(BasePuzzle):
                 "playing_sample": self.playing_sample
             }
 
-    def _handle_validation(self, is_correct, final_track_duration=0):
-        if final_track_duration and final_track_duration > 0:
-            time.sleep(final_track_duration)
-
+    def _handle_validation(self, is_correct):
+        """Runs once the last played track has finished"""
         if is_correct:
             with self.lock:
                 temp_sequence = self.played_sequence.copy()
@@ -184,58 +215,64 @@ class Puzzle4(BasePuzzle):
             })
 
             if streak >= total_required:
-                time.sleep(2)
-                
-                with self.lock:
-                    if self.solved:
-                        return
-                    self.solved = True
-
-                self.mqtt_client.send_message("FROM_FLASK", f"P{self.id}End")
-                self._push({
-                    "puzzle_solved": True,
-                    "streak": streak,
-                    "total_required": total_required,
-                    "played_sequence": temp_sequence,
-                    "play_final": {"url": f"/static/{self.AUDIO_SUBDIR}{self.streak2_folder}/correcta.mp3"}
-                })
+                self.schedule(2, self._finish_solved, temp_sequence, streak, total_required)
                 return
 
-            time.sleep(self.VALIDATION_FEEDBACK_SECONDS)
-            for seconds in [5, 4, 3, 2, 1]:
-                self._push({
-                    "sample_countdown_seconds": seconds,
-                    "streak": -1,
-                    "total_required": total_required
-                })
-                time.sleep(2)
-
-            with self.lock:
-                if self.solved:
-                    return
-                self._push({
-                    "streak": -1,    
-                    "streak_bis": self.streak,
-                    "total_required": total_required,
-                    "storing": False,
-                    "current_progress": 0,
-                    "played_sequence": [],
-                    "playing_sample": True,
-                    "sample_song": {"url": f"/static/{self.AUDIO_SUBDIR}{self.streak2_sample}"},
-                    "listening": True
-                })
-
-                streak2_rel_path_full = f"{self.AUDIO_SUBDIR}{self.streak2_sample}"
-                self.streak2_sample_duration = self._get_audio_duration(streak2_rel_path_full) or self.streak2_sample_duration
-                self._play_sample_with_delay(self.streak2_sample, self.streak2_sample_duration)
+            self.schedule(self.VALIDATION_FEEDBACK_SECONDS, self._sample_countdown, 5)
             return
 
         self._push({
             "validation_feedback": False
         })
 
-        time.sleep(self.VALIDATION_FEEDBACK_SECONDS)
+        self.schedule(self.VALIDATION_FEEDBACK_SECONDS, self._clear_attempt)
+
+    def _finish_solved(self, temp_sequence, streak, total_required):
+        with self.lock:
+            if self.solved:
+                return
+            self.solved = True
+
+        self.mqtt_client.send_message("FROM_FLASK", f"P{self.id}End")
+        self._push({
+            "puzzle_solved": True,
+            "streak": streak,
+            "total_required": total_required,
+            "played_sequence": temp_sequence,
+            "play_final": {"url": f"/static/{self.AUDIO_SUBDIR}{self.streak2_folder}/correcta.mp3"}
+        })
+
+    def _sample_countdown(self, seconds):
+        """Countdown 5..1 (2s each) before playing the streak 2 sample"""
+        if seconds > 0:
+            self._push({
+                "sample_countdown_seconds": seconds,
+                "streak": -1,
+                "total_required": self.total_required
+            })
+            self.schedule(2, self._sample_countdown, seconds - 1)
+            return
+
+        with self.lock:
+            if self.solved:
+                return
+            self._push({
+                "streak": -1,    
+                "streak_bis": self.streak,
+                "total_required": self.total_required,
+                "storing": False,
+                "current_progress": 0,
+                "played_sequence": [],
+                "playing_sample": True,
+                "sample_song": {"url": f"/static/{self.AUDIO_SUBDIR}{self.streak2_sample}"},
+                "listening": True
+            })
+
+            streak2_rel_path_full = f"{self.AUDIO_SUBDIR}{self.streak2_sample}"
+            self.streak2_sample_duration = self._get_audio_duration(streak2_rel_path_full) or self.streak2_sample_duration
+            self._play_sample_with_delay(self.streak2_sample, self.streak2_sample_duration)
 
+    def _clear_attempt(self):
         with self.lock:
             self.current_progress = 0
             self.played_sequence = []
@@ -249,16 +286,9 @@ class Puzzle4(BasePuzzle):
                 "played_sequence": []
             })
 
-    def handle_message(self, parts):
+    def handle_message(self, message):
         """Handle MQTT message: P4,button,song"""
-        if len(parts) < 2:
-            return
-            
-        try:
-            button = int(parts[1])
-            song = int(parts[2]) if len(parts) >= 3 else 0
-        except ValueError:
-            return
+        button, song = message.button, message.song
             
         with self.lock:
             if self.solved:
@@ -344,7 +374,7 @@ class Puzzle4(BasePuzzle):
                     rel_path_full
                 )
                 
-                if not os.path.exists(full_fs_path):
+                if rel_path_full not in self.audio_durations:
                     print(f"[Puzzle4] Audio file NOT FOUND: {full_fs_path}")
                     
                 self.history.append(track_name)
@@ -378,12 +408,12 @@ class Puzzle4(BasePuzzle):
                         })
                                                 
                         
-                        # Handle validation result in separate thread. What happens after validation (like playing sample, showing messages, etc) can take time, so we don't want to block MQTT message handling thread
-                        threading.Thread(
-                            target=self._handle_validation,
-                            args=(is_correct, self._get_audio_duration(rel_path_full)),
-                            daemon=True
-                        ).start()
+                        # Handle validation result once the last track has played. What happens after validation (like playing sample, showing messages, etc) is chained on the scheduler, so the MQTT message handling thread is never blocked
+                        self.schedule(
+                            self._get_audio_duration(rel_path_full),
+                            self._handle_validation,
+                            is_correct
+                        )
                         
                         return
                         
@@ -1,8 +1,9 @@
 from .base import BasePuzzle
-import threading
-import time
 
 class Puzzle5(BasePuzzle):
+    MESSAGE_SCHEMA = "P5,player:int,error_time:float"
+    STATE_CACHEABLE = False  # get_state() counts down from the clock
+
     def __init__(self, mqtt_client):
         super().__init__(puzzle_id=5, mqtt_client=mqtt_client)
 
@@ -30,7 +31,7 @@ class Puzzle5(BasePuzzle):
             self.solved = False
             self.active_round = False
             self.waiting = True
-            self.waiting_deadline = time.time() + self.initial_countdown_seconds
+            self.waiting_deadline = self.clock.time() + self.initial_countdown_seconds
             self._cancel_timer()
             
             # Push countdown message
@@ -46,11 +47,37 @@ class Puzzle5(BasePuzzle):
             
     def stop(self):
         """Cleanup on puzzle stop"""
+        super().stop()
         self._cancel_timer()
         with self.lock:
             self.active_round = False
             self.waiting = False
-            
+
+    def restore_state(self, state):
+        super().restore_state(state)
+        # Recovered between two steps of a round: schedule the next step again
+        if self.solved:
+            return
+        times = self.round_times.get(self.current_round, {})
+        if self.waiting:
+            # A failed round clears its times before the retry
+            if self.current_round == 0:
+                next_round = 1
+            elif times:
+                next_round = self.current_round + 1
+            else:
+                next_round = self.current_round
+            delay = self.initial_countdown_seconds
+            if self.waiting_deadline:
+                delay = max(0, self.waiting_deadline - self.clock.time())
+            self._schedule_round_start(next_round, delay)
+        elif self.active_round:
+            if len(times) >= 10:
+                self._evaluate_round_locked()
+        elif self.current_round:
+            total = sum(abs(t) for t in times.values())
+            self.schedule(5, self._finish_round, self.current_round, total <= self.round_limits[self.current_round])
+
     def get_state(self):
         """Return current puzzle state"""
         with self.lock:
@@ -72,10 +99,10 @@ class Puzzle5(BasePuzzle):
                 "active_round": self.active_round,
                 "waiting": self.waiting,
                 "countdown_deadline": self.waiting_deadline,
-                "waiting_seconds": max(0, int(round(self.waiting_deadline - time.time()))) if self.waiting and self.waiting_deadline else None,
+                "waiting_seconds": max(0, int(round(self.waiting_deadline - self.clock.time()))) if self.waiting and self.waiting_deadline else None,
                 }
             
-    def handle_message(self, parts):
+    def handle_message(self, message):
         """
         Handle MQTT message: P5,player,error_time
         
@@ -83,14 +110,7 @@ class Puzzle5(BasePuzzle):
         - P5,3,-1.5  -> Player 3 finished 1.5 seconds early (10-1.5=8.5s total)
         - P5,7,3.35  -> Player 7 finished 3.35 seconds late (10+3.35=13.35s total)
         """
-        if len(parts) < 3:
-            return
-            
-        try:
-            player = int(parts[1])
-            error_time = float(parts[2])
-        except ValueError:
-            return
+        player, error_time = message.player, message.error_time
             
         with self.lock:
             # Ignore if puzzle solved, round not active, or still in initial countdown
@@ -137,13 +157,11 @@ class Puzzle5(BasePuzzle):
     def _schedule_round_start(self, round_number, delay):
         """Schedule a round to start after delay seconds"""
         def _later():
-            time.sleep(delay)
             with self.lock:
                 if not self.solved:
                     self._start_round_locked(round_number)
                     
-        self._round_start_timer = threading.Timer(0, _later)
-        self._round_start_timer.start()
+        self._round_start_timer = self.schedule(delay, _later)
         
     def _start_round_locked(self, round_number):
         """Start a specific round"""
@@ -167,71 +185,69 @@ class Puzzle5(BasePuzzle):
         
     def _evaluate_round_locked(self):
         """Evaluate round result after all players submit"""
-        def _delayed_evaluation():
-            # Wait 2 seconds with all boxes filled
-            time.sleep(2)
+        # Wait 2 seconds with all boxes filled
+        self.schedule(2, self._show_round_result)
+
+    def _show_round_result(self):
+        with self.lock:
+            round_number = self.current_round
+            times = self.round_times.get(round_number, {})
             
-            with self.lock:
-                round_number = self.current_round
-                times = self.round_times.get(round_number, {})
-                
-                # Calculate total error using absolute values
-                total = sum(abs(t) for t in times.values())
-                limit = self.round_limits[round_number]
-                success = total <= limit
-                
-                self.active_round = False
-                
-                # Send result immediately (triggers green/red color)
-                self._push({
-                    "round": round_number,
-                    "round_result": {
-                        "success": success,
-                        "total": total,
-                        "limit": limit
-                    }
-                })
-                
-            # Wait 5 more seconds showing the colored result
-            time.sleep(5)
+            # Calculate total error using absolute values
+            total = sum(abs(t) for t in times.values())
+            limit = self.round_limits[round_number]
+            success = total <= limit
             
-            with self.lock:
-                if success:
-                    if round_number >= self.total_rounds:
-                        # Puzzle completed!
-                        self.solved = True
-                        self.mqtt_client.send_message("FROM_FLASK", "P5_End")
-                        self._push({
-                            "puzzle_solved": True
-                        })
-                    else:
-                        # Schedule next round with configured initial countdown
-                        self.waiting = True
-                        next_round = round_number + 1
-                        self.waiting_deadline = time.time() + self.initial_countdown_seconds
-                        
-                        self._push({
-                            "countdown_message": f"Ronda {next_round} empieza en {self.initial_countdown_seconds} segundos",
-                            "waiting_seconds": self.initial_countdown_seconds,
-                            "countdown_deadline": self.waiting_deadline,
-                            "objective": self.round_objectives[next_round],
-                        })
-                        
-                        self._schedule_round_start(next_round, delay=self.initial_countdown_seconds)
+            self.active_round = False
+            
+            # Send result immediately (triggers green/red color)
+            self._push({
+                "round": round_number,
+                "round_result": {
+                    "success": success,
+                    "total": total,
+                    "limit": limit
+                }
+            })
+            
+        # Wait 5 more seconds showing the colored result
+        self.schedule(5, self._finish_round, round_number, success)
+
+    def _finish_round(self, round_number, success):
+        with self.lock:
+            if success:
+                if round_number >= self.total_rounds:
+                    # Puzzle completed!
+                    self.solved = True
+                    self.mqtt_client.send_message("FROM_FLASK", "P5_End")
+                    self._push({
+                        "puzzle_solved": True
+                    })
                 else:
-                    # Failed - retry same round with 9-second countdown
-                    self.round_times[round_number] = {}
+                    # Schedule next round with configured initial countdown
                     self.waiting = True
-                    self.waiting_deadline = time.time() + 9
+                    next_round = round_number + 1
+                    self.waiting_deadline = self.clock.time() + self.initial_countdown_seconds
                     
                     self._push({
-                        "countdown_message": f"Ronda {round_number} reinicia en 9 segundos",
-                        "waiting_seconds": 9,
+                        "countdown_message": f"Ronda {next_round} empieza en {self.initial_countdown_seconds} segundos",
+                        "waiting_seconds": self.initial_countdown_seconds,
                         "countdown_deadline": self.waiting_deadline,
-                        "objective": self.round_objectives[round_number]
+                        "objective": self.round_objectives[next_round],
                     })
                     
-                    self._schedule_round_start(round_number, delay=9)
-                    
-        # Run evaluation in separate thread to avoid blocking
-        threading.Thread(target=_delayed_evaluation, daemon=True).start()
+                    self._schedule_round_start(next_round, delay=self.initial_countdown_seconds)
+            else:
+                # Failed - retry same round with 9-second countdown
+                self.round_times[round_number] = {}
+                self.waiting = True
+                self.waiting_deadline = self.clock.time() + 9
+                
+                self._push({
+                    "countdown_message": f"Ronda {round_number} reinicia en 9 segundos",
+                    "waiting_seconds": 9,
+                    "countdown_deadline": self.waiting_deadline,
+                    "objective": self.round_objectives[round_number]
+                })
+                
+                self._schedule_round_start(round_number, delay=9)
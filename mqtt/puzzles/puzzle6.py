@@ -1,8 +1,9 @@
 from .base import BasePuzzle
-import threading
-import time
 
 class Puzzle6(BasePuzzle):
+    MESSAGE_SCHEMA = "P6,box:int"
+    STATE_CACHEABLE = False  # get_state() counts down from the clock
+
     def __init__(self, mqtt_client):
         super().__init__(puzzle_id=6, mqtt_client=mqtt_client)
         
@@ -13,7 +14,7 @@ class Puzzle6(BasePuzzle):
         self.restart_deadline = None
         self.last_reset_box = None
         self.last_reset_message = None
-        self.monitor_thread = None
+        self.monitor_timer = None
         self.last_sent_remaining = None
         self.solvePuzzle = False
         
@@ -24,7 +25,7 @@ class Puzzle6(BasePuzzle):
         self.restart_deadline = None
         self.last_sent_remaining = None
         
-        start_ts = int(time.time())
+        start_ts = int(self.clock.time())
         self.end_time = start_ts + self.duration_seconds
         
         self._push({
@@ -34,39 +35,39 @@ class Puzzle6(BasePuzzle):
             }
         })
         
-        # Spawn monitor thread
-        self.monitor_thread = threading.Thread(target=self._monitor_loop, daemon=True)
-        self.monitor_thread.start()
+        # Start monitor ticks (replacing the previous countdown's, if any)
+        if self.monitor_timer:
+            self.monitor_timer.cancel()
+        self.monitor_timer = self.schedule(0, self._monitor_tick)
         
-    def _monitor_loop(self):
-        """Background thread that monitors countdown and sends periodic updates"""
-        while True:
-            with self.lock:
-                if not self.active or self.solved:
-                    break
-                    
-                remaining = int(self.end_time - time.time())
-                if remaining < 0:
-                    remaining = 0
-                    
-                # Send tick updates every 10 seconds to reduce network traffic
-                if remaining != self.last_sent_remaining and remaining % 10 == 0:
-                    self._push({
-                        "countdown_tick": {"remaining": remaining}
-                    })
-                    self.last_sent_remaining = remaining
-                    
-                # Check if countdown finished
-                if remaining <= 0:
-                    self.solved = True
-                    self.active = False
-                    self.mqtt_client.send_message("FROM_FLASK", "P6End")
-                    self._push({
-                        "puzzle_solved": True
-                    })
-                    break
-                    
-            time.sleep(1)
+    def _monitor_tick(self):
+        """Scheduled every second: monitors countdown and sends periodic updates"""
+        with self.lock:
+            if not self.active or self.solved:
+                return
+                
+            remaining = int(self.end_time - self.clock.time())
+            if remaining < 0:
+                remaining = 0
+                
+            # Send tick updates every 10 seconds to reduce network traffic
+            if remaining != self.last_sent_remaining and remaining % 10 == 0:
+                self._push({
+                    "countdown_tick": {"remaining": remaining}
+                })
+                self.last_sent_remaining = remaining
+                
+            # Check if countdown finished
+            if remaining <= 0:
+                self.solved = True
+                self.active = False
+                self.mqtt_client.send_message("FROM_FLASK", "P6End")
+                self._push({
+                    "puzzle_solved": True
+                })
+                return
+                
+            self.monitor_timer = self.schedule(1, self._monitor_tick)
             
     def reset(self):
         """Full reset - restart countdown"""
@@ -78,23 +79,38 @@ class Puzzle6(BasePuzzle):
                 
     def stop(self):
         """Cleanup on puzzle stop"""
+        super().stop()
         with self.lock:
             self.active = False
             self.restart_pending = False
             self.restart_deadline = None
             self.last_sent_remaining = None
-            # Monitor thread will exit on next iteration due to active=False
-            
+            self.monitor_timer = None
+
+    def restore_state(self, state):
+        super().restore_state(state)
+        # The countdown and the restart run on scheduled calls: start them again
+        # against the restored deadlines
+        if self.solved:
+            return
+        if self.restart_pending:
+            delay = 10
+            if self.restart_deadline:
+                delay = max(0, self.restart_deadline - self.clock.time())
+            self.schedule(delay, self._restart_countdown)
+        elif self.active:
+            self.monitor_timer = self.schedule(0, self._monitor_tick)
+
     def get_state(self):
         """Return current puzzle state"""
         with self.lock:
             remaining = None
             if self.active and self.end_time:
-                remaining = max(0, int(self.end_time - time.time()))
+                remaining = max(0, int(self.end_time - self.clock.time()))
                 
             waiting_seconds = None
             if self.restart_pending and self.restart_deadline:
-                waiting_seconds = max(0, int(self.restart_deadline - time.time()))
+                waiting_seconds = max(0, int(self.restart_deadline - self.clock.time()))
                 
             return {
                 "puzzle_id": self.id,
@@ -108,7 +124,7 @@ class Puzzle6(BasePuzzle):
                 "puzzle_solved": self.solved
             }
             
-    def handle_message(self, parts):
+    def handle_message(self, message):
         """
         Handle MQTT message: P6,boxNumber
         
@@ -117,13 +133,7 @@ class Puzzle6(BasePuzzle):
         if self.solvePuzzle:
             return
 
-        if len(parts) < 2:
-            return
-            
-        try:
-            box = int(parts[1])
-        except ValueError:
-            return
+        box = message.box
             
         with self.lock:
             if self.solved:
@@ -138,7 +148,7 @@ class Puzzle6(BasePuzzle):
             self.restart_pending = True
             self.last_reset_box = box
             self.last_reset_message = f"Caja Numero {box} sin energía, cargando sistema..."
-            self.restart_deadline = time.time() + 10
+            self.restart_deadline = self.clock.time() + 10
             
             self._push({
                 "countdown_reset": {
@@ -149,13 +159,12 @@ class Puzzle6(BasePuzzle):
             })
             
             # Schedule restart after 10 seconds
-            def _restart_countdown():
-                time.sleep(10)
-                with self.lock:
-                    if self.solved:
-                        return
-                    self.restart_pending = False
-                    self.mqtt_client.send_message("FROM_FLASK", "P6Start")
-                    self._start_countdown_locked()
-                    
-            threading.Thread(target=_restart_countdown, daemon=True).start()
\ No newline at end of file
+            self.schedule(10, self._restart_countdown)
+
+    def _restart_countdown(self):
+        with self.lock:
+            if self.solved:
+                return
+            self.restart_pending = False
+            self.mqtt_client.send_message("FROM_FLASK", "P6Start")
+            self._start_countdown_locked()
\ No newline at end of file
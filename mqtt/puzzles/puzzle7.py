@@ -2,6 +2,8 @@ from .base import BasePuzzle
 import threading
 
 class Puzzle7(BasePuzzle):
+    MESSAGE_SCHEMA = "P7,box:int,code:str"
+
     def __init__(self, mqtt_client):
         super().__init__(puzzle_id=7, mqtt_client=mqtt_client)
         
@@ -34,7 +36,7 @@ class Puzzle7(BasePuzzle):
             
     def stop(self):
         """Cleanup on puzzle stop"""
-        pass
+        super().stop()
         
     def get_state(self):
         """Return current puzzle state"""
@@ -45,7 +47,7 @@ class Puzzle7(BasePuzzle):
                 "puzzle_solved": self.solved
             }
             
-    def handle_message(self, parts):
+    def handle_message(self, message):
         """
         Handle MQTT message: P7,boxIndex,code
         
@@ -55,20 +57,14 @@ class Puzzle7(BasePuzzle):
         
         Code is kept as string to preserve leading zeros
         """
-        if len(parts) < 3:
-            return
-            
-        try:
-            box = int(parts[1])
-        except ValueError:
-            return
+        box = message.box
             
         # Validate box range
         if not (0 <= box <= 9):
             return
             
         # Keep code as string to preserve leading zeros
-        code = parts[2].strip()
+        code = message.code
         
         with self.lock:
             # Ignore if puzzle already solved
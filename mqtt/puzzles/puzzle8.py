@@ -1,9 +1,9 @@
 from .base import BasePuzzle
-import threading
-import time
 import random
 
 class Puzzle8(BasePuzzle):
+    MESSAGE_SCHEMA = "P8,symbol:int,token:int,color:int"
+
     def __init__(self, mqtt_client):
         super().__init__(puzzle_id=8, mqtt_client=mqtt_client)
         
@@ -19,7 +19,6 @@ class Puzzle8(BasePuzzle):
         self.round_total = 2 #You can set this to 1, 2, or 3 for different difficulty levels
         self.round = 0
         self.phase = "idle"
-        self._timers = []
         
         # Target data shown during "tokens" phase
         self.target_symbols_order = []      # Box order symbols (round 1 compatibility)
@@ -53,26 +52,10 @@ class Puzzle8(BasePuzzle):
         payload.update(data)
         super()._push(payload)
         
-    def _schedule(self, fn, delay):
-        """Schedule a function to run after delay seconds"""
-        t = threading.Timer(delay, fn)
-        self._timers.append(t)
-        t.start()
-        
-    def _cancel_timers(self):
-        """Cancel all scheduled timers"""
-        for t in self._timers:
-            try:
-                t.cancel()
-            except Exception:
-                pass
-        self._timers.clear()
-        
     def reset(self):
         """Full reset"""
         super().reset()
         with self.lock:
-            self._cancel_timers()
             self.round = 1
             self.phase = "idle"
             self.target_symbols_order = []
@@ -87,16 +70,34 @@ class Puzzle8(BasePuzzle):
             self._push({"clear": True})
 
             # Wait 5s then show numbers
-            self._schedule(self._show_numbers, 5)
+            self.schedule(5, self._show_numbers)
             
     def stop(self):
         """Cleanup on puzzle stop"""
+        super().stop()
         with self.lock:
-            self._cancel_timers()
             self.phase = "idle"
             self.player_colors.clear()
             self.player_symbols.clear()
 
+    def restore_state(self, state):
+        super().restore_state(state)
+        # Each phase ends in a scheduled call: schedule the one for the restored phase
+        if self.solved:
+            return
+        if self.phase == "idle":
+            self.schedule(5, self._show_numbers)
+        elif self.phase == "numbers":
+            self.schedule(3, self._show_tokens)
+        elif self.phase == "tokens":
+            if self._tokens_part + 1 < len(self.target_sets):
+                self.schedule(3, self._show_tokens_part2 if self._tokens_part == 0 else self._show_tokens_part3)
+            else:
+                self.schedule(5 if len(self.target_sets) == 1 else 3, self._enter_input_phase)
+        elif self.phase == "input":
+            # Every box already filled: the result was still to come
+            self._evaluate_inputs_locked()
+
     def _build_solution_rows_locked(self):
         """Build a per-terminal solution snapshot for the simulator."""
         rows = []
@@ -221,7 +222,7 @@ class Puzzle8(BasePuzzle):
                 
             self.phase = "numbers"
             self._push({"round": self.round, "phase": self.phase,"token_numbers": self.token_numbers})
-            self._schedule(self._show_tokens, 3)
+            self.schedule(3, self._show_tokens)
             
     def _show_tokens(self):
         """Phase 2: Show symbol/color combinations"""
@@ -256,7 +257,7 @@ class Puzzle8(BasePuzzle):
                 
                 # Show part 1
                 self._push({"round": self.round, "phase": self.phase,"symbols": symbols1, "colors": colors1})
-                self._schedule(self._show_tokens_part2, 3)
+                self.schedule(3, self._show_tokens_part2)
                 
             # Round 2: Two sequential sets (3s each)
             elif self.round == 2:
@@ -275,7 +276,7 @@ class Puzzle8(BasePuzzle):
                 self.target_colors_per_symbol = colors1.copy()
                 
                 self._push({"round": self.round, "phase": self.phase,"symbols": symbols1, "colors": colors1})
-                self._schedule(self._show_tokens_part2, 3)
+                self.schedule(3, self._show_tokens_part2)
                 
             # Round 1: Single set (5s)
             else:
@@ -287,7 +288,7 @@ class Puzzle8(BasePuzzle):
                 self.target_colors_per_symbol = colors.copy()
                 
                 self._push({"round": self.round, "phase": self.phase,"symbols": symbols, "colors": colors})
-                self._schedule(self._enter_input_phase, 5)
+                self.schedule(5, self._enter_input_phase)
                 
     def _show_tokens_part2(self):
         """Show second set of symbols/colors"""
@@ -305,9 +306,9 @@ class Puzzle8(BasePuzzle):
             
             # If round 3, schedule part 3; else go to input
             if len(self.target_sets) >= 3:
-                self._schedule(self._show_tokens_part3, 3)
+                self.schedule(3, self._show_tokens_part3)
             else:
-                self._schedule(self._enter_input_phase, 3)
+                self.schedule(3, self._enter_input_phase)
                 
     def _show_tokens_part3(self):
         """Show third set of symbols/colors (round 3 only)"""
@@ -322,7 +323,7 @@ class Puzzle8(BasePuzzle):
             self._tokens_part = 2
             part3 = self.target_sets[2]
             self._push({"round": self.round, "phase": self.phase,"symbols": part3["symbols"], "colors": part3["colors"]})
-            self._schedule(self._enter_input_phase, 3)
+            self.schedule(3, self._enter_input_phase)
             
     def _enter_input_phase(self):
         """Phase 3: Players input their answers"""
@@ -381,9 +382,8 @@ class Puzzle8(BasePuzzle):
                                  
         success = all(box_results.values())
         
-        # Show results in separate thread
-        def _flow():
-            time.sleep(2)
+        # Show results after 2s, then move on 5s later
+        def _show_result():
             with self.lock:
                 self._push({
                     "round": self.round, "phase": self.phase,
@@ -393,8 +393,9 @@ class Puzzle8(BasePuzzle):
                     }
                 })
                 
-            time.sleep(5)
+            self.schedule(5, _next_round)
             
+        def _next_round():
             with self.lock:
                 if success and self.round >= self.round_total:
                     # Puzzle solved!
@@ -412,32 +413,26 @@ class Puzzle8(BasePuzzle):
                 if success and self.round < self.round_total:
                     self.round += 1
                     
-                self._schedule(self._show_numbers, 5)
+                self.schedule(5, self._show_numbers)
                 
-        threading.Thread(target=_flow, daemon=True).start()
+        self.schedule(2, _show_result)
         
-    def handle_message(self, parts):
+    def handle_message(self, message):
         """
         Handle MQTT message: P8,symbolCode,tokenNumber,colorCode
         
         Example: P8,2,18,1 -> symbol=delta, token=18 (box 0), color=red
         """
-        if len(parts) < 4:
-            return
-            
         with self.lock:
             if self.solved or self.phase != "input":
                 return
                 
-            try:
-                symbol_code = int(parts[1])
-                print("Received symbol code:", symbol_code)
-                token_number = int(parts[2])
-                print("Received token number:", token_number)
-                color_code = int(parts[3])
-                print("Received color code:", color_code)
-            except ValueError:
-                return
+            symbol_code = message.symbol
+            print("Received symbol code:", symbol_code)
+            token_number = message.token
+            print("Received token number:", token_number)
+            color_code = message.color
+            print("Received color code:", color_code)
                 
             # Map codes to names
             symbol_name = self.symbol_code_map.get(symbol_code)
@@ -1,12 +1,14 @@
 from .base import BasePuzzle
-import threading
-import time
 
 class Puzzle9(BasePuzzle):
+    MESSAGE_SCHEMA = "P9,box:int,token:int"
+
+    # Token moves resend all ten boxes; the diff is one entry
+    delta_push = True
+
     def __init__(self, mqtt_client):
         super().__init__(puzzle_id=9, mqtt_client=mqtt_client)
         
-        self.lock = threading.Lock()
         self.box_tokens = {i: None for i in range(0,10)}
         self.solution = {
             1: 6, 2: 3, 3: 7, 4: 0, 5: 8,
@@ -16,6 +18,7 @@ class Puzzle9(BasePuzzle):
         self._good_timer_running = False
 
     def reset(self):
+        super().reset()
         with self.lock:
             self.box_tokens = {i: None for i in range(0,10)}
             self.solved = False
@@ -26,15 +29,9 @@ class Puzzle9(BasePuzzle):
                 "puzzle_solved": False
             })
 
-    def handle_message(self, parts):
+    def handle_message(self, message):
         # Expect: P9,box,token  (token -1 means empty)
-        if len(parts) < 3:
-            return
-        try:
-            box = int(parts[1])
-            token = int(parts[2])
-        except ValueError:
-            return
+        box, token = message.box, message.token
         if not (0 <= box <= 9):  # CHANGED
             return
 
@@ -58,7 +55,13 @@ class Puzzle9(BasePuzzle):
 
             if status == "good" and not self._good_timer_running:
                 self._good_timer_running = True
-                threading.Thread(target=self._finish_after_delay, daemon=True).start()
+                self.schedule(3, self._finish_after_delay)
+
+    def restore_state(self, state):
+        super().restore_state(state)
+        # A recovered confirmation has lost its scheduled end: start it again
+        if self._good_timer_running and not self.solved:
+            self.schedule(3, self._finish_after_delay)
 
     def get_state(self):
         with self.lock:
@@ -83,7 +86,6 @@ class Puzzle9(BasePuzzle):
         return "good" if correct else "wrong"
 
     def _finish_after_delay(self):
-        time.sleep(3)
         with self.lock:
             # Re-check (players could have changed tokens during the 5s)
             if self.solved:
@@ -0,0 +1,115 @@
+"""Session recordings for replay (RECORD_SESSIONS).
+
+Every inbound TO_FLASK payload, puzzle start/stop, timer_expired, random
+seed and state push of the main room is written as one JSON line with its
+time in seconds since the recording started:
+
+    {"at": 12.5, "mqtt": "P9,3,0"}
+    {"at": 12.5012, "push": {"puzzle_id": 9, ...}}
+
+Pushes are recorded as the JSON the SSE hub encoded at push time.
+
+Input lines are steps in the format SimulatedClient.run() and
+scripts/simulate_game.py --scenario read; scripts/replay_session.py plays
+a recording back and diffs the pushes. As with the session journal the
+client only appends to a deque; a writer thread encodes and writes.
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+
+
+class SessionRecorder:
+    """Appends one process's session to directory/<start time>.jsonl"""
+
+    def __init__(self, directory, flush_interval=0.5):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.path = os.path.join(directory, time.strftime("%Y%m%d-%H%M%S") + ".jsonl")
+        self.started = time.monotonic()
+        self.queue = deque()  # (kind, monotonic, value); append/popleft need no lock
+        self.cond = threading.Condition()
+        self.file = None
+        self.header = None
+        self.records = {}  # kind -> lines written
+        self.write_errors = 0
+
+        self.thread = threading.Thread(target=self._run, daemon=True, name="session-recorder")
+        self.thread.start()
+
+    def attach(self, client):
+        self.header = {"recording": time.strftime("%Y-%m-%dT%H:%M:%S"), "puzzle_order": list(client.puzzle_order)}
+
+    def record(self, kind, value=True):
+        self.queue.append((kind, time.monotonic(), value))
+
+    def flush(self, timeout=5):
+        """Block until everything recorded so far is written"""
+        done = threading.Event()
+        self.queue.append(("flush", 0, done))
+        with self.cond:
+            self.cond.notify()
+        return done.wait(timeout)
+
+    def _run(self):
+        while True:
+            with self.cond:
+                self.cond.wait(self.flush_interval)
+            if self.queue:
+                try:
+                    self._write_batch()
+                except (OSError, TypeError, ValueError) as e:
+                    self.write_errors += 1
+                    print(f"[Recorder] Write failed: {e}")
+
+    def _write_batch(self):
+        lines, waiters = [], []
+        while self.queue:
+            kind, at, value = self.queue.popleft()
+            if kind == "flush":
+                waiters.append(value)
+                continue
+            if kind == "push":
+                # Pushes come already encoded (see MQTTClient.push_update)
+                lines.append(f'{{"at":{round(at - self.started, 6)},"push":{value.decode("utf-8")}}}')
+            else:
+                lines.append(json.dumps({"at": round(at - self.started, 6), kind: value}, separators=(",", ":")))
+            self.records[kind] = self.records.get(kind, 0) + 1
+        if lines:
+            if self.file is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self.file = open(self.path, "a", encoding="utf-8")
+                self.file.write(json.dumps(self.header or {}) + "\n")
+            self.file.write("\n".join(lines) + "\n")
+            self.file.flush()
+        for done in waiters:
+            done.set()
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "seconds": round(time.monotonic() - self.started, 3),
+            "queued": len(self.queue),
+            "records": dict(self.records),
+            "write_errors": self.write_errors,
+        }
+
+
+def load_recording(path):
+    """(header, steps, pushes) of a recording; pushes are (at, payload)"""
+    header, steps, pushes = {}, [], []
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f):
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                break  # cut off mid-line when the process died
+            if number == 0 and "at" not in record:
+                header = record
+            elif "push" in record:
+                pushes.append((record["at"], record["push"]))
+            else:
+                steps.append(record)
+    return header, steps, pushes
@@ -0,0 +1,56 @@
+from .client import MQTTClient
+from .puzzle_factory import create_puzzles
+from .sse_hub import SSEHub
+
+
+class RoomClient(MQTTClient):
+    """Puzzle state of one extra room, on the main client's MQTT connection.
+
+    Topics are namespaced as room/<id>/TO_FLASK, room/<id>/FROM_FLASK and
+    room/<id>/puzzles/<puzzle_id>. The scheduler, clock and mirror settings
+    are shared too;
+    puzzles, current puzzle and message workers are the room's own.
+    """
+
+    def __init__(self, connection, room_id, puzzle_order,
+                 worker_queue_size=256, worker_overflow="drop_oldest"):
+        self.connection = connection
+        self.room_id = room_id
+        self.topic_prefix = f"room/{room_id}/"
+        super().__init__(
+            connection.app,
+            puzzle_order,
+            worker_queue_size=worker_queue_size,
+            worker_overflow=worker_overflow,
+            clock=connection.clock,
+            scheduler=connection.scheduler,
+            mirror_mode=connection.mirror.mode,
+            mirror_window=connection.mirror.window,
+            mirror_retain=connection.mirror.retain,
+        )
+        self.tracer = connection.tracer  # one set of latency histograms per process
+        self.locks = connection.locks
+
+    def _connect(self):
+        self.client = self.connection.client
+        self.connection.add_room(self)
+
+    def publish(self, topic, payload, retain=False):
+        # Connection state and the offline queue belong to the shared connection
+        return self.connection.publish(topic, payload, retain)
+
+
+class Room:
+    """One escape room hosted by this process: its client, puzzles and SSE hub"""
+
+    def __init__(self, room_id, connection, puzzle_order, sse_max_pending=256, sse_replay_size=128,
+                 worker_queue_size=256, worker_overflow="drop_oldest"):
+        self.id = room_id
+        self.client = RoomClient(connection, room_id, puzzle_order, worker_queue_size, worker_overflow)
+        self.hub = SSEHub(
+            max_pending=sse_max_pending,
+            replay_size=sse_replay_size,
+            snapshot_provider=self.client.get_current_state,
+        )
+        self.client.set_update_callback(self.hub.publish)
+        self.puzzles = create_puzzles(self.client, puzzle_order)
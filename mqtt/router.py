@@ -0,0 +1,127 @@
+"""Compiled routing of TO_FLASK payloads to typed puzzle messages.
+
+Each puzzle declares MESSAGE_SCHEMA, e.g. "P8,symbol:int,token:int,color:int"
+(a default makes a trailing field optional: "P4,button:int,song:int=0").
+A schema is compiled once into a namedtuple type and a straight-line parse
+function, so routing a payload is one split, a dict lookup on its first field
+and those conversions. Handlers get the typed namedtuple; payloads that do
+not fit the schema are counted instead of reaching them.
+"""
+from collections import Counter, namedtuple
+from functools import lru_cache
+
+
+@lru_cache(maxsize=4096)
+def _bits(value):
+    """'110010' -> (1, 1, 0, 0, 1, 0); button panels repeat a few states, so cached"""
+    return tuple(map(int, value.strip()))
+
+
+FIELD_TYPES = {
+    "int": int,
+    "float": float,
+    "str": str.strip,
+    "bits": _bits,
+}
+
+
+class MessageSchema:
+    """One compiled MESSAGE_SCHEMA"""
+
+    def __init__(self, spec):
+        head, *fields = [field.strip() for field in spec.split(",")]
+        self.spec = spec
+        self.prefix = head
+        names, converters, defaults = [], [], []
+        for field in fields:
+            declaration, has_default, default = field.partition("=")
+            name, _, type_name = declaration.partition(":")
+            if type_name not in FIELD_TYPES:
+                raise ValueError(f"Unknown field type {type_name!r} in schema {spec!r}")
+            converter = FIELD_TYPES[type_name]
+            names.append(name)
+            converters.append(converter)
+            if has_default:
+                defaults.append(converter(default))
+            elif defaults:
+                raise ValueError(f"Required field {name!r} after an optional one in schema {spec!r}")
+        self.converters = tuple(converters)
+        self.defaults = tuple(defaults)
+        self.required = len(converters) - len(defaults)
+        self.type = namedtuple(f"{head}Message", names)
+        self.parse = self._compile()
+
+    def _compile(self):
+        """Build parse(parts) for this schema: straight-line field conversions.
+
+        parse raises ValueError (or IndexError for missing fields) when the
+        payload does not fit.
+        """
+        namespace = {"_new": tuple.__new__, "_type": self.type}
+        values = []
+        for index, converter in enumerate(self.converters):
+            namespace[f"_c{index}"] = converter
+            value = f"_c{index}(parts[{index + 1}])"
+            if index >= self.required:
+                namespace[f"_d{index}"] = self.defaults[index - self.required]
+                value = f"({value} if len(parts) > {index + 1} else _d{index})"
+            values.append(value)
+        source = f"def parse(parts):\n    return _new(_type, ({', '.join(values)},))\n"
+        exec(source, namespace)
+        return namespace["parse"]
+
+
+@lru_cache(maxsize=None)
+def compile_schema(spec):
+    """Compiled schema, shared by every client (and room) using it"""
+    return MessageSchema(spec)
+
+
+class MessageRouter:
+    """Turn raw TO_FLASK payloads into (puzzle_id, typed message)"""
+
+    def __init__(self):
+        self.routes = {}  # "P8" -> (puzzle_id, compiled parse or None)
+        self.schemas = {}  # puzzle_id -> MessageSchema
+        self.routed = 0
+        self.unroutable = 0
+        self.malformed = Counter()  # puzzle_id -> payloads that did not fit its schema
+        self.last_malformed = None
+
+    def register(self, puzzle):
+        schema = compile_schema(puzzle.MESSAGE_SCHEMA) if puzzle.MESSAGE_SCHEMA else None
+        if schema and schema.prefix != f"P{puzzle.id}":
+            raise ValueError(f"Puzzle {puzzle.id} schema must start with P{puzzle.id}: {schema.spec!r}")
+        self.schemas[puzzle.id] = schema
+        self.routes[f"P{puzzle.id}"] = (puzzle.id, schema.parse if schema else None)
+
+    def route(self, payload):
+        """(puzzle_id, message) for a payload like 'P8,2,18,1', or None"""
+        parts = payload.split(",")
+        route = self.routes.get(parts[0])
+        if route is None:
+            self.unroutable += 1
+            return None
+        puzzle_id, parse = route
+        if parse is None:
+            # Puzzle without a schema gets the raw fields
+            self.routed += 1
+            return puzzle_id, parts
+        try:
+            message = parse(parts)
+        except (ValueError, IndexError):
+            self.malformed[puzzle_id] += 1
+            self.last_malformed = payload
+            return None
+        self.routed += 1
+        return puzzle_id, message
+
+    def stats(self):
+        return {
+            "routed": self.routed,
+            "unroutable": self.unroutable,
+            "malformed": sum(self.malformed.values()),
+            "malformed_by_puzzle": {str(pid): count for pid, count in sorted(self.malformed.items())},
+            "last_malformed": self.last_malformed,
+            "schemas": {str(pid): schema.spec for pid, schema in sorted(self.schemas.items()) if schema},
+        }
@@ -0,0 +1,165 @@
+import heapq
+import itertools
+import threading
+import time
+
+from .clock import ScaledClock
+
+
+class ScheduledCall:
+    """Handle for a callback queued on the Scheduler"""
+
+    __slots__ = ("when", "fn", "args", "cancelled", "done")
+
+    def __init__(self, when, fn, args):
+        self.when = when
+        self.fn = fn
+        self.args = args
+        self.cancelled = False
+        self.done = False
+
+    def cancel(self):
+        """Skip the callback if it has not started yet"""
+        self.cancelled = True
+
+    @property
+    def pending(self):
+        return not (self.cancelled or self.done)
+
+
+class Scheduler:
+    """Run every delayed puzzle callback from one heap on one thread.
+
+    Replaces the threading.Timer / Thread + time.sleep pattern: puzzles call
+    BasePuzzle.schedule() and get a cancellable handle back. Callbacks run
+    one at a time, so they must not sleep; chain another schedule() instead.
+
+    speed other than 1 needs clock to be the monotonic of a ScaledClock at
+    that speed; without a clock, one is created.
+    """
+
+    def __init__(self, clock=None, name="puzzle-scheduler", speed=1.0):
+        if clock is None:
+            clock = ScaledClock(speed).monotonic if speed != 1 else time.monotonic
+        elif speed != 1 and getattr(getattr(clock, "__self__", None), "speed", 1) != speed:
+            raise ValueError(f"Scheduler speed={speed} needs the monotonic of a ScaledClock({speed})")
+        self.clock = clock
+        self.speed = speed  # clock seconds per real second (mqtt.clock.ScaledClock)
+        self.name = name
+        self.cond = threading.Condition()
+        self.heap = []  # (when, seq, ScheduledCall)
+        self._seq = itertools.count()
+        self.thread = None
+
+        self.scheduled = 0
+        self.executed = 0
+        self.cancelled = 0
+        self.errors = 0
+
+    def call_later(self, delay, fn, *args):
+        call = ScheduledCall(self.clock() + max(0, delay), fn, args)
+        with self.cond:
+            heapq.heappush(self.heap, (call.when, next(self._seq), call))
+            self.scheduled += 1
+            self._ensure_thread_locked()
+            self.cond.notify()
+        return call
+
+    def _ensure_thread_locked(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, daemon=True, name=self.name)
+            self.thread.start()
+
+    def _next_due_locked(self):
+        """Pop and return the next due call, or return the seconds to wait"""
+        while self.heap:
+            when, _, call = self.heap[0]
+            if call.cancelled:
+                heapq.heappop(self.heap)
+                self.cancelled += 1
+                continue
+            delay = when - self.clock()
+            if delay > 0:
+                return delay
+            heapq.heappop(self.heap)
+            return call
+        return None
+
+    def _run(self):
+        while True:
+            with self.cond:
+                due = self._next_due_locked()
+                while not isinstance(due, ScheduledCall):
+                    self.cond.wait(due / self.speed if due is not None else None)
+                    due = self._next_due_locked()
+            self._execute(due)
+
+    def _execute(self, call):
+        if call.cancelled:
+            return
+        try:
+            call.fn(*call.args)
+        except Exception as e:
+            self.errors += 1
+            print(f"[Scheduler] Error in {getattr(call.fn, '__qualname__', call.fn)}: {e}")
+        finally:
+            call.done = True
+            self.executed += 1
+
+    def stats(self):
+        with self.cond:
+            return {
+                "pending": sum(1 for _, _, call in self.heap if not call.cancelled),
+                "scheduled": self.scheduled,
+                "executed": self.executed,
+                "cancelled": self.cancelled,
+                "errors": self.errors,
+                "thread_alive": self.thread is not None and self.thread.is_alive(),
+            }
+
+
+class VirtualScheduler(Scheduler):
+    """Scheduler driven by a VirtualClock instead of a thread.
+
+    Nothing runs until advance() or run_until_idle() is called; callbacks
+    then run on the caller's thread in due order, with the clock moved to
+    each call's due time first.
+    """
+
+    def __init__(self, clock, name="virtual-scheduler"):
+        super().__init__(clock=clock.monotonic, name=name)
+        self.virtual_clock = clock
+
+    def _ensure_thread_locked(self):
+        pass
+
+    def _pop_due_before(self, deadline):
+        with self.cond:
+            while self.heap:
+                when, _, call = self.heap[0]
+                if call.cancelled:
+                    heapq.heappop(self.heap)
+                    self.cancelled += 1
+                    continue
+                if when > deadline:
+                    return None
+                heapq.heappop(self.heap)
+                return call
+            return None
+
+    def _run_until(self, deadline):
+        call = self._pop_due_before(deadline)
+        while call is not None:
+            self.virtual_clock.advance_to(call.when)
+            self._execute(call)
+            call = self._pop_due_before(deadline)
+
+    def advance(self, seconds):
+        """Move time forward, running every call that falls due on the way"""
+        deadline = self.virtual_clock.monotonic() + max(0, seconds)
+        self._run_until(deadline)
+        self.virtual_clock.advance_to(deadline)
+
+    def run_until_idle(self, limit=3600):
+        """Run pending calls until none is left or limit virtual seconds pass"""
+        self._run_until(self.virtual_clock.monotonic() + limit)
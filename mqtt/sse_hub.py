@@ -0,0 +1,405 @@
+import itertools
+import json
+import threading
+import time
+from collections import Counter, deque
+
+from . import tracing
+from .puzzles.base import BOOT_ID
+
+
+# Sent to a client that fell too far behind, right before its stream is closed.
+# The page reloads /current_state and EventSource reconnects on its own.
+RESYNC_FRAME = b"event: resync\ndata: {}\n\n"
+
+# Times subscribe() rebuilds a snapshot that raced with a publish
+SNAPSHOT_ATTEMPTS = 3
+
+# Fields whose latest value fully supersedes an older queued update
+COALESCE_FIELDS = (
+    "countdown_tick",
+    "countdown_next_round",
+    "sample_countdown_seconds",
+    "operations",
+    "players",
+    "current_step",
+)
+
+# Fields allowed next to a coalesce field. Anything else (solved flashes,
+# results, sounds...) makes the update a one-shot event that is always kept.
+SNAPSHOT_FIELDS = {
+    "puzzle_id",
+    "generation",
+    "round",
+    "next_round",
+    "round_size",
+    "round_total",
+    "start_timer",
+    "streak",
+    "target",
+    "total_required",
+    "error_counter",
+    "alarm_mode",
+    "current_substep",
+    "completed_steps",
+    "event_count",
+    "substep_success_count",
+    "step_completion_count",
+    "puzzle_solved",
+} | set(COALESCE_FIELDS)
+
+
+# Last-Event-ID of another server run (or without one): always gets a snapshot
+STALE_EVENT_ID = -1
+
+
+def encode_event(data, event_id=None):
+    """Encode an update into its final SSE wire bytes; ids go out as <BOOT_ID>-<n>"""
+    if event_id is None:
+        return f"data: {json.dumps(data)}\n\n".encode("utf-8")
+    return f"id: {BOOT_ID}-{event_id}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+
+
+def frame_payload(frame):
+    """JSON bytes inside a frame from encode_event, without re-serializing"""
+    return frame[frame.index(b"data: ") + 6:-2]
+
+
+def parse_last_event_id(raw):
+    """Return the event number of a reconnecting page's Last-Event-ID, or None.
+
+    Ids are "<BOOT_ID>-<n>": counters restart with the process, so an id
+    from an earlier run gives STALE_EVENT_ID rather than a number that may
+    fall inside this run's replay window.
+    """
+    if not raw:
+        return None
+    epoch, _, number = raw.strip().rpartition("-")
+    if epoch != BOOT_ID:
+        return STALE_EVENT_ID
+    try:
+        return int(number)
+    except ValueError:
+        return STALE_EVENT_ID
+
+
+def parse_filter(raw, cast=str):
+    """Parse a comma separated ?puzzle=/?kind= filter; None when absent or invalid"""
+    if not raw:
+        return None
+    try:
+        values = {cast(item.strip()) for item in raw.split(",") if item.strip()}
+    except ValueError:
+        return None
+    return values or None
+
+
+def coalesce_key(data):
+    """Return the key under which a queued update may be superseded, or None"""
+    if not any(field in data for field in COALESCE_FIELDS):
+        return None
+    if not data.keys() <= SNAPSHOT_FIELDS:
+        return None
+    return (data.get("puzzle_id"), frozenset(data.keys()))
+
+
+class SSEClient:
+    """Bounded outbound buffer for one /state_stream connection.
+
+    A queued update is replaced when a newer one with the same coalesce key
+    arrives. If the client still has max_pending updates waiting, it is
+    evicted: its buffer is dropped and it only receives RESYNC_FRAME.
+    """
+
+    def __init__(self, client_id, max_pending, label="", puzzles=None, kinds=None):
+        self.id = client_id
+        self.label = label
+        self.puzzles = frozenset(puzzles) if puzzles else None  # None = every puzzle
+        self.kinds = frozenset(kinds) if kinds else None        # None = every field
+        self.max_pending = max_pending
+        self.cond = threading.Condition()
+        self.pending = deque()  # entries are [frame, key, traced, event_id]; frame None once superseded
+        self.by_key = {}        # coalesce key -> entry still queued
+        self.live = 0           # queued entries not superseded yet
+        self.evicted = False
+        self.writing = []       # (trace, published_at, dequeued_at) of frames handed out by get()
+        self.connected_at = time.time()
+        self.delivered = 0
+        self.coalesced = 0
+        self.dropped = 0
+
+    def wants(self, puzzle_id, fields):
+        """Return True if an update for puzzle_id with these fields matches the filters"""
+        if self.puzzles is not None and puzzle_id not in self.puzzles:
+            return False
+        if self.kinds is None:
+            return True
+        # Delta patches may carry any field, so they always pass a kind filter
+        return "patch" in fields or not self.kinds.isdisjoint(fields)
+
+    def put(self, frame, key=None, traced=None, event_id=None):
+        """Queue a frame; traced is (trace, published_at) for latency tracing"""
+        with self.cond:
+            if self.evicted:
+                self.dropped += 1
+                return False
+
+            if key is not None:
+                previous = self.by_key.pop(key, None)
+                if previous is not None:
+                    previous[0] = None
+                    self.live -= 1
+                    self.coalesced += 1
+
+            if self.live >= self.max_pending:
+                self._evict_locked()
+                return False
+
+            entry = [frame, key, traced, event_id]
+            self.pending.append(entry)
+            self.live += 1
+            if key is not None:
+                self.by_key[key] = entry
+
+            # Superseded entries stay in place until read; compact a stalled queue
+            if len(self.pending) > 2 * self.max_pending:
+                self.pending = deque(e for e in self.pending if e[0] is not None)
+
+            self.cond.notify()
+            return True
+
+    def put_snapshot(self, frame, event_id):
+        """Queue a snapshot ahead of the buffer, dropping the frames it already covers (id <= event_id)"""
+        with self.cond:
+            if self.evicted:
+                return False
+            for entry in self.pending:
+                if entry[0] is not None and entry[3] is not None and entry[3] <= event_id:
+                    entry[0] = None
+                    if entry[1] is not None and self.by_key.get(entry[1]) is entry:
+                        del self.by_key[entry[1]]
+                    self.live -= 1
+                    self.coalesced += 1
+            self.pending.appendleft([frame, None, None, event_id])
+            self.live += 1
+            self.cond.notify()
+            return True
+
+    def get(self, timeout):
+        """Return the next frame to send, or None if nothing arrived in time"""
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            while True:
+                while self.pending:
+                    entry = self.pending.popleft()
+                    frame, key, traced, _ = entry
+                    if frame is None:
+                        continue
+                    if key is not None and self.by_key.get(key) is entry:
+                        del self.by_key[key]
+                    if traced is not None:
+                        self.writing.append((*traced, time.monotonic()))
+                    self.live -= 1
+                    self.delivered += 1
+                    return frame
+                if self.evicted:
+                    return RESYNC_FRAME
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.cond.wait(remaining)
+
+    def written(self, write_started):
+        """The frames get() returned so far reached the socket; closes their traces"""
+        with self.cond:
+            if not self.writing:
+                return
+            writing, self.writing = self.writing, []
+        for trace, published_at, dequeued_at in writing:
+            trace.delivered(published_at, dequeued_at, write_started)
+
+    def _evict_locked(self):
+        self.dropped += self.live + 1
+        self.pending.clear()
+        self.by_key.clear()
+        self.live = 0
+        self.evicted = True
+        self.cond.notify()
+        print(f"[SSE] Client {self.id} {self.label} too far behind, forcing resync")
+
+    def stats(self):
+        with self.cond:
+            return {
+                "id": self.id,
+                "label": self.label,
+                "puzzles": sorted(self.puzzles) if self.puzzles is not None else None,
+                "kinds": sorted(self.kinds) if self.kinds is not None else None,
+                "connected_seconds": round(time.time() - self.connected_at, 1),
+                "pending": self.live,
+                "max_pending": self.max_pending,
+                "delivered": self.delivered,
+                "coalesced": self.coalesced,
+                "dropped": self.dropped,
+                "evicted": self.evicted,
+            }
+
+
+class SSEHub:
+    """Broadcast puzzle updates to the /state_stream clients that want them.
+
+    Each event is serialized once in publish() and the same immutable
+    bytes object is handed to every interested subscriber. Clients
+    subscribed to specific puzzles are indexed by puzzle id, so a publish
+    only visits the unfiltered clients plus that puzzle's subscribers.
+
+    The last replay_size frames are kept so a reconnecting page can resume
+    from its Last-Event-ID; an older gap falls back to a full snapshot from
+    snapshot_provider.
+    """
+
+    def __init__(self, max_pending=256, replay_size=128, snapshot_provider=None):
+        self.max_pending = max_pending
+        self.snapshot_provider = snapshot_provider
+        self.lock = threading.Lock()
+        self.clients = []       # every SSEClient, one per connected browser
+        self.unfiltered = []    # clients receiving every puzzle
+        self.by_puzzle = {}     # puzzle_id -> list of clients filtered on it
+        self.replay = deque(maxlen=replay_size)  # (event_id, frame, key, puzzle_id, fields)
+        self.last_event_id = 0
+        self.listeners = []     # called after every publish, outside the hub lock
+        self.published = 0
+        self.closed = Counter()  # delivered/coalesced/dropped/evicted of clients already gone
+        self._client_ids = itertools.count(1)
+
+    def add_listener(self, callback):
+        """Call callback(clients) after each publish with the clients that got the event"""
+        self.listeners.append(callback)
+
+    def subscribe(self, label="", last_event_id=None, puzzles=None, kinds=None):
+        """Register a client; puzzles/kinds optionally restrict what it receives"""
+        client = SSEClient(
+            next(self._client_ids), self.max_pending, label=label,
+            puzzles=puzzles, kinds=kinds
+        )
+        needs_snapshot = False
+        with self.lock:
+            self.clients.append(client)
+            if client.puzzles is None:
+                self.unfiltered.append(client)
+            else:
+                for puzzle_id in client.puzzles:
+                    self.by_puzzle.setdefault(puzzle_id, []).append(client)
+
+            if last_event_id is not None and last_event_id != self.last_event_id:
+                oldest = self.replay[0][0] if self.replay else self.last_event_id + 1
+                if oldest - 1 <= last_event_id < self.last_event_id:
+                    for event_id, frame, key, puzzle_id, fields in self.replay:
+                        if event_id > last_event_id and client.wants(puzzle_id, fields):
+                            client.put(frame, key, event_id=event_id)
+                else:
+                    # Gap older than the buffer, or an id from a previous server run
+                    # (STALE_EVENT_ID)
+                    needs_snapshot = True
+            snapshot_id = self.last_event_id
+
+        if not (needs_snapshot and self.snapshot_provider):
+            return client
+
+        # Outside the hub lock: get_state() takes the puzzle lock, and puzzles
+        # publish while holding it. The client is already registered, so
+        # publishes landing meanwhile are queued; a snapshot built while none
+        # landed covers exactly the events up to snapshot_id, and put_snapshot()
+        # drops those from the queue so nothing older follows it.
+        for attempt in range(1, SNAPSHOT_ATTEMPTS + 1):
+            snapshot = dict(self.snapshot_provider() or {})
+            with self.lock:
+                latest = self.last_event_id
+            if latest == snapshot_id:
+                break
+            # Still racing after the last attempt: keep the id read before it,
+            # which only covers events the snapshot includes.
+            if attempt < SNAPSHOT_ATTEMPTS:
+                snapshot_id = latest
+        if client.puzzles is None or snapshot.get("puzzle_id") in client.puzzles:
+            snapshot["snapshot"] = True
+            client.put_snapshot(encode_event(snapshot, snapshot_id), snapshot_id)
+        return client
+
+    def unsubscribe(self, client):
+        with self.lock:
+            if client not in self.clients:
+                return
+            self.clients.remove(client)
+            with client.cond:
+                self.closed.update(
+                    delivered=client.delivered, coalesced=client.coalesced,
+                    dropped=client.dropped, evicted=int(client.evicted),
+                )
+            if client.puzzles is None:
+                self.unfiltered.remove(client)
+                return
+            for puzzle_id in client.puzzles:
+                subscribers = self.by_puzzle.get(puzzle_id, [])
+                if client in subscribers:
+                    subscribers.remove(client)
+                if not subscribers:
+                    self.by_puzzle.pop(puzzle_id, None)
+
+    def client_count(self):
+        with self.lock:
+            return len(self.clients)
+
+    def publish(self, data, event_id=None):
+        """Send an update to interested clients; event_id must increase between calls"""
+        puzzle_id = data.get("puzzle_id")
+        fields = data.keys()
+        trace = tracing.current()
+        with self.lock:
+            if event_id is None:
+                event_id = self.last_event_id + 1
+            if trace is None:
+                frame = encode_event(data, event_id)
+                traced = None
+            else:
+                started = time.monotonic()
+                frame = encode_event(data, event_id)
+                published_at = time.monotonic()
+                trace.add("serialize", published_at - started)
+                traced = (trace, published_at)
+            key = coalesce_key(data)
+            self.last_event_id = event_id
+            self.published += 1
+            self.replay.append((event_id, frame, key, puzzle_id, frozenset(fields)))
+
+            targets = [
+                client
+                for group in (self.unfiltered, self.by_puzzle.get(puzzle_id, ()))
+                for client in group
+                if client.kinds is None or client.wants(puzzle_id, fields)
+            ]
+            for client in targets:
+                client.put(frame, key, traced, event_id)
+
+        for callback in self.listeners:
+            callback(targets)
+        return frame
+
+    def stats(self):
+        with self.lock:
+            clients = list(self.clients)
+        return [client.stats() for client in clients]
+
+    def totals(self):
+        """Counters over every client this hub has had, for /metrics"""
+        with self.lock:
+            clients = list(self.clients)
+            totals = Counter(self.closed)
+            totals["published"] = self.published
+        totals["clients"] = len(clients)
+        for client in clients:
+            with client.cond:
+                totals.update(
+                    delivered=client.delivered, coalesced=client.coalesced, dropped=client.dropped,
+                    evicted=int(client.evicted), pending=client.live,
+                )
+        return totals
@@ -0,0 +1,228 @@
+"""Latency of one TO_FLASK message from MQTT receive to SSE delivery.
+
+MQTTClient gives each inbound message a Trace (id + monotonic receive time).
+The puzzle worker makes it the current trace of its thread while
+handle_message runs, so puzzle locks, _push and SSEHub.publish find it
+without any signature change; the SSE client queues carry it on to the
+socket write. Stages, in seconds, one histogram per puzzle and stage:
+
+- parse: receive -> typed message (decode + MessageRouter)
+- queue_wait: time waiting on the puzzle worker queue
+- lock_wait: time handle_message spent waiting for the puzzle lock
+- handler: handle_message, lock wait included
+- serialize: SSE encoding of the pushes the message caused
+- sse_queue: time a frame waited in a /state_stream client queue
+- socket_write: writing the frame to the client socket
+- total: receive -> frame written, per client that got it
+"""
+import itertools
+from bisect import bisect_left
+import threading
+import time
+from collections import deque
+
+STAGES = ("parse", "queue_wait", "lock_wait", "handler", "serialize", "sse_queue", "socket_write", "total")
+# Known once handle_message returns; serialize is summed over its pushes
+HANDLING_STAGES = ("parse", "queue_wait", "lock_wait", "handler", "serialize")
+
+# Histogram bucket upper bounds, seconds
+LATENCY_BUCKETS = (
+    0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+_local = threading.local()
+
+
+def current():
+    """Trace of the message this thread is handling, or None"""
+    return getattr(_local, "trace", None)
+
+
+def activate(trace):
+    _local.trace = trace
+
+
+class LatencyHistogram:
+    """Fixed-bucket histogram; percentiles are interpolated inside a bucket"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, fraction):
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.max
+                return min(self.max, lower + (upper - lower) * (rank - seen) / count)
+            seen += count
+        return self.max
+
+    def merge(self, other):
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def stats(self):
+        return {
+            "count": self.count,
+            "avg_ms": round(self.sum / self.count * 1000, 3) if self.count else 0.0,
+            "p50_ms": round(self.percentile(0.5) * 1000, 3),
+            "p90_ms": round(self.percentile(0.9) * 1000, 3),
+            "p99_ms": round(self.percentile(0.99) * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+
+class Trace:
+    """One inbound message on its way to the screens"""
+
+    __slots__ = ("id", "puzzle_id", "received_at", "tracer", "stages")
+
+    def __init__(self, trace_id, puzzle_id, received_at, parsed_at, tracer):
+        self.id = trace_id
+        self.puzzle_id = puzzle_id
+        self.received_at = received_at
+        self.tracer = tracer
+        self.stages = {"parse": parsed_at - received_at}  # stage -> seconds
+
+    def add(self, stage, seconds):
+        """Sum a stage that can happen several times (lock waits, pushes)"""
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def handled(self, enqueued_at, started, finished):
+        """handle_message returned: observe every stage up to it at once"""
+        stages = self.stages
+        stages["queue_wait"] = started - enqueued_at
+        stages["handler"] = finished - started
+        stages.setdefault("lock_wait", 0.0)
+        self.tracer.observe(self.puzzle_id, [(stage, stages[stage]) for stage in HANDLING_STAGES if stage in stages])
+
+    def delivered(self, published_at, dequeued_at, write_started):
+        """The frame of one of this trace's pushes was written to a client"""
+        now = time.monotonic()
+        delivery = (
+            ("sse_queue", dequeued_at - published_at),
+            ("socket_write", now - write_started),
+            ("total", now - self.received_at),
+        )
+        for stage, seconds in delivery:
+            self.stages.setdefault(stage, seconds)  # first client and push only
+        self.tracer.observe(self.puzzle_id, delivery)
+
+    def as_dict(self):
+        return {
+            "trace_id": self.id,
+            "puzzle_id": self.puzzle_id,
+            "stages_ms": {stage: round(seconds * 1000, 3) for stage, seconds in self.stages.items()},
+        }
+
+
+class LatencyTracer:
+    """Per-puzzle, per-stage latency histograms plus the last traces.
+
+    Every thread records into its own histograms, without a lock on the
+    message path; stats() merges them.
+    """
+
+    def __init__(self, recent=50):
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.last_id = 0
+        self.recent = deque(maxlen=recent)
+        self._local = threading.local()
+        self._per_thread = []  # one {(puzzle_id, stage): LatencyHistogram} per recording thread
+
+    def start(self, puzzle_id, received_at, parsed_at):
+        trace = Trace(next(self.ids), puzzle_id, received_at, parsed_at, self)
+        self.last_id = trace.id
+        self.recent.append(trace)
+        return trace
+
+    def observe(self, puzzle_id, values):
+        """Add (stage, seconds) pairs to this thread's histograms"""
+        try:
+            histograms = self._local.histograms
+        except AttributeError:
+            histograms = self._local.histograms = {}
+            with self.lock:
+                self._per_thread.append(histograms)
+        for stage, seconds in values:
+            histogram = histograms.get((puzzle_id, stage))
+            if histogram is None:
+                histogram = histograms[(puzzle_id, stage)] = LatencyHistogram()
+            histogram.observe(seconds)
+
+    def histograms(self):
+        """{(puzzle_id, stage): LatencyHistogram} merged across threads"""
+        with self.lock:
+            per_thread = list(self._per_thread)
+        merged = {}
+        for histograms in per_thread:
+            for key, histogram in list(histograms.items()):
+                if key not in merged:
+                    merged[key] = LatencyHistogram(histogram.buckets)
+                merged[key].merge(histogram)
+        return merged
+
+    def stats(self, recent=10):
+        puzzles = {}
+        for (puzzle_id, stage), histogram in self.histograms().items():
+            puzzles.setdefault(puzzle_id, {})[stage] = histogram.stats()
+        last = [trace.as_dict() for trace in list(self.recent)[-recent:]] if recent else []
+        return {
+            "traces": self.last_id,
+            "stages": list(STAGES),
+            "puzzles": [
+                {"puzzle_id": puzzle_id,
+                 "stages": {stage: puzzles[puzzle_id][stage] for stage in STAGES if stage in puzzles[puzzle_id]}}
+                for puzzle_id in sorted(puzzles, key=str)
+            ],
+            "recent": last,
+        }
+
+
+class TracedLock:
+    """threading.Lock that adds its wait to the current trace, if any"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def acquire(self, blocking=True, timeout=-1):
+        if self._lock.acquire(False):
+            return True  # free: nothing to wait for, nothing to time
+        trace = getattr(_local, "trace", None)
+        if trace is None or not blocking:
+            return self._lock.acquire(blocking, timeout)
+        started = time.monotonic()
+        acquired = self._lock.acquire(blocking, timeout)
+        trace.add("lock_wait", time.monotonic() - started)
+        return acquired
+
+    def release(self):
+        self._lock.release()
+
+    def locked(self):
+        return self._lock.locked()
+
+    __enter__ = acquire
+
+    def __exit__(self, *exc):
+        self._lock.release()
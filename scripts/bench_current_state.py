@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Cost of a /current_state poll: get_state() every time vs the versioned cache.
+
+A puzzle (Puzzle8 by default, whose get_state() rebuilds its solution rows
+and input status) runs on the in-process broker and gets random TO_FLASK
+input at --input-rate while a poller reads the state as fast as it can:
+- "uncached": get_state() + json.dumps on every poll (the old endpoint)
+- "cached": MQTTClient.get_current_state_cached(), which only calls
+  get_state() when the puzzle's state_version moved
+Reports polls per second, get_state() calls and how many polls a page with
+If-None-Match would have got as 304.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+sys.path.insert(0, str(REPO_ROOT / "scripts"))
+
+from bench_puzzle_throughput import random_payloads  # noqa: E402
+from mqtt.client import MQTTClient  # noqa: E402
+from mqtt.inprocess import InProcessBroker  # noqa: E402
+from mqtt.puzzle_factory import PUZZLE_CLASSES  # noqa: E402
+
+
+def run(puzzle_id, seconds, input_rate, cached):
+    app = SimpleNamespace(static_folder=str(REPO_ROOT / "static"))
+    client = MQTTClient(app, [puzzle_id], broker=InProcessBroker())
+    puzzle = PUZZLE_CLASSES[puzzle_id](client)
+    client.register_puzzle(puzzle)
+    client.start_puzzle(puzzle_id)
+
+    calls = [0]
+    get_state = puzzle.get_state
+
+    def counted_get_state():
+        calls[0] += 1
+        return get_state()
+
+    puzzle.get_state = counted_get_state
+    stop = threading.Event()
+
+    def feed():
+        payloads = random_payloads(PUZZLE_CLASSES[puzzle_id], int(seconds * input_rate) + 1)
+        started = time.perf_counter()
+        for index, payload in enumerate(payloads):
+            delay = started + index / input_rate - time.perf_counter()
+            if delay > 0 and stop.wait(delay):
+                return
+            client.dispatch(payload)
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+    polls = not_modified = 0
+    last_etag = None
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        if cached:
+            etag, _, body = client.get_current_state_cached()
+            not_modified += etag is not None and etag == last_etag
+            last_etag = etag
+        else:
+            body = json.dumps(puzzle.get_state()).encode("utf-8")
+        polls += 1
+    stop.set()
+    puzzle.stop()
+    return polls / seconds, calls[0], not_modified
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--puzzle", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--input-rates", type=float, nargs="+", default=[1, 20, 200])
+    args = parser.parse_args()
+
+    print(f"{'input msg/s':>12} {'mode':>9} {'polls/s':>10} {'get_state':>10} {'304s':>8}")
+    for rate in args.input_rates:
+        for cached in (False, True):
+            stdout = sys.stdout
+            sys.stdout = open(os.devnull, "w")  # handlers print every message
+            try:
+                per_second, calls, not_modified = run(args.puzzle, args.seconds, rate, cached)
+            finally:
+                sys.stdout.close()
+                sys.stdout = stdout
+            mode = "cached" if cached else "uncached"
+            print(f"{rate:>12g} {mode:>9} {per_second:>10.0f} {calls:>10} {not_modified if cached else '-':>8}")
+
+
+if __name__ == "__main__":
+    main()
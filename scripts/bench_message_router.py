@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Cost of turning a TO_FLASK payload into handler input.
+
+Compares the old path (split, startswith('P'), int(parts[0][1:]), then the
+handler's own int()/try/except parsing) with mqtt.router.MessageRouter
+(compiled MESSAGE_SCHEMA, typed namedtuple). Payloads are Puzzle12 button
+states and Puzzle8 tokens, with a share of malformed ones.
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from mqtt.puzzles.puzzle8 import Puzzle8  # noqa: E402
+from mqtt.puzzles.puzzle12 import Puzzle12  # noqa: E402
+from mqtt.router import MessageRouter  # noqa: E402
+
+
+def legacy_route(payload):
+    """What _on_message plus the puzzle handlers used to do"""
+    parts = payload.split(',')
+    if not (parts[0].startswith('P') and len(parts[0]) > 1):
+        return None
+    puzzle_id = int(parts[0][1:])
+    if puzzle_id == 12:
+        if len(parts) < 3:
+            return None
+        try:
+            return puzzle_id, (int(parts[1]), [int(c) for c in parts[2].strip()])
+        except (ValueError, IndexError):
+            return None
+    if puzzle_id == 8:
+        if len(parts) < 4:
+            return None
+        try:
+            return puzzle_id, (int(parts[1]), int(parts[2]), int(parts[3]))
+        except ValueError:
+            return None
+    return None
+
+
+def make_payloads(count, malformed):
+    payloads = []
+    for _ in range(count):
+        if random.random() < malformed:
+            payloads.append(random.choice(["P12,x,110010", "P8,1,2", "P12,3,11a010", "P8,,4,1"]))
+        elif random.random() < 0.8:
+            buttons = "".join(random.choice("01") for _ in range(6))
+            payloads.append(f"P12,{random.randint(0, 9)},{buttons}")
+        else:
+            payloads.append(f"P8,{random.randint(0, 5)},{random.randint(0, 30)},{random.randint(0, 4)}")
+    return payloads
+
+
+def timed(fn, payloads):
+    started = time.perf_counter()
+    routed = sum(1 for payload in payloads if fn(payload) is not None)
+    return time.perf_counter() - started, routed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=200_000)
+    parser.add_argument("--malformed", type=float, default=0.05, help="share of malformed payloads")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    payloads = make_payloads(args.messages, args.malformed)
+
+    router = MessageRouter()
+    for puzzle_class in (Puzzle8, Puzzle12):
+        router.register(SimpleNamespace(id=int(puzzle_class.MESSAGE_SCHEMA.split(",")[0][1:]),
+                                        MESSAGE_SCHEMA=puzzle_class.MESSAGE_SCHEMA))
+
+    legacy_s, legacy_routed = timed(legacy_route, payloads)
+    router_s, router_routed = timed(router.route, payloads)
+    if legacy_routed != router_routed:
+        print(f"FAIL: legacy routed {legacy_routed}, router routed {router_routed}")
+        sys.exit(1)
+
+    print(f"messages={args.messages} routed={router_routed} malformed={router.stats()['malformed']}")
+    print(f"legacy  {legacy_s / args.messages * 1e6:7.3f} us/msg")
+    print(f"router  {router_s / args.messages * 1e6:7.3f} us/msg  ({legacy_s / router_s:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
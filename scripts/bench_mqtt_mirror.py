@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""MQTT publishes of the puzzles/<id> mirror per mode (MQTT_MIRROR_MODE).
+
+Plays the same random game on virtual time (like simulate_game.py) once per
+mirror mode, through the real push path: SSE hub first, then the mirror
+reusing the hub's encoded JSON. Prints pushes, MQTT messages published and
+how many were saved. Every push must come out of the mirror in order, except
+snapshot refreshes superseded inside a batch.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+sys.path.insert(0, str(REPO_ROOT / "scripts"))
+
+from config import PUZZLE_ORDER  # noqa: E402
+from mqtt.client import MQTTClient  # noqa: E402
+from mqtt.mirror import PuzzleMirror  # noqa: E402
+from mqtt.puzzle_factory import PUZZLE_CLASSES  # noqa: E402
+from mqtt.simulation import SimulatedClient  # noqa: E402
+from mqtt.sse_hub import SSEHub  # noqa: E402
+from simulate_game import random_game  # noqa: E402
+
+
+class RecordingBroker:
+    def __init__(self):
+        self.messages = []
+
+    def publish(self, topic, payload, retain=False):
+        self.messages.append((topic, payload))
+
+
+class MirrorClient(SimulatedClient):
+    """SimulatedClient that goes through MQTTClient's push path and mirror"""
+
+    def __init__(self, mode, window, start_time):
+        super().__init__(PUZZLE_ORDER, start_time=start_time)
+        self.mirror = PuzzleMirror(self, mode=mode, window=window)
+
+    def _connect(self):
+        self.client = RecordingBroker()
+        self.connected = True
+
+    def push_update(self, data, full=None):
+        # What the mirror should carry: the whole payload, not a delta patch
+        self.pushed.append((self.clock.monotonic(), data if full is None else full))
+        MQTTClient.push_update(self, data, full)
+
+
+def play(steps, mode, window, seed, start_time):
+    random.seed(seed)
+    client = MirrorClient(mode, window, start_time)
+    for puzzle_class in PUZZLE_CLASSES.values():
+        client.register_puzzle(puzzle_class(client))
+    hub = SSEHub(snapshot_provider=client.get_current_state)
+    client.set_update_callback(hub.publish)
+    started = time.perf_counter()
+    client.run(steps)
+    client.advance(window * 2)  # let the last coalesce window flush
+    return client, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds-per-puzzle", type=float, default=300)
+    parser.add_argument("--rate", type=float, default=20, help="random messages per virtual second")
+    parser.add_argument("--timer-seconds", type=float, default=120)
+    parser.add_argument("--windows", type=float, nargs="+", default=[0.05, 0.25, 1.0])
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    steps = random_game(SimpleNamespace(
+        seconds_per_puzzle=args.seconds_per_puzzle, rate=args.rate, timer_seconds=args.timer_seconds
+    ))
+    start_time = time.time()
+
+    runs = [("every", 0)] + [("batch", window) for window in args.windows] + [("off", 0)]
+    print(f"{'mode':>16} {'pushes':>7} {'published':>10} {'saved':>7} {'superseded':>11} {'wall ms':>8}")
+    failed = False
+    for mode, window in runs:
+        client, elapsed = play(steps, mode, window, args.seed, start_time)
+        stats = client.mirror.stats()
+        label = f"{mode} {window * 1000:.0f}ms" if mode == "batch" else mode
+        saved = 1 - stats["published"] / stats["pushes"]
+        print(f"{label:>16} {stats['pushes']:>7} {stats['published']:>10} {saved:>7.0%}"
+              f" {stats['superseded']:>11} {elapsed * 1000:>8.1f}")
+        if mode == "off":
+            continue
+        pushed = [json.loads(json.dumps(payload)) for _, payload in client.pushed]
+        mirrored = []
+        for _, payload in client.client.messages:
+            message = json.loads(payload)
+            mirrored.extend(message if mode == "batch" else [message])
+        if any("patch" in message for message in mirrored):
+            print(f"FAIL: {label} mirrored delta patches")
+            failed = True
+        if len(mirrored) != len(pushed) - stats["superseded"] or mirrored[-1] != pushed[-1]:
+            print(f"FAIL: {label} mirrored {len(mirrored)} of {len(pushed)} pushes")
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
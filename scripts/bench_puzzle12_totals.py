@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""Puzzle12 button totals: re-summing every box per message vs running sums.
+
+Feeds random "P12,<box>,<buttons>" payloads from --boxes terminals at
+--rate messages per second through the in-process broker, once into a copy
+of the old handle_message (rebuilds the totals from all of box_states and
+compares lists, printing both each time) and into Puzzle12 (subtracts the
+box's previous buttons, adds the new ones and compares one packed int),
+without and with its per-message log (LOG_TOTALS). Reports the cost
+of one handle_message called in a loop without threads, the time it holds
+the puzzle lock at --rate and dispatch -> handled latency (median of 3
+runs), and checks both end with the same totals.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from collections import deque
+from pathlib import Path
+from types import SimpleNamespace
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from mqtt.client import MQTTClient  # noqa: E402
+from mqtt.inprocess import InProcessBroker  # noqa: E402
+from mqtt.puzzles.puzzle12 import Puzzle12, unpack  # noqa: E402
+from mqtt.router import compile_schema  # noqa: E402
+from mqtt.simulation import SimulatedClient  # noqa: E402
+
+
+class ResummingPuzzle12(Puzzle12):
+    """handle_message as it was before the running totals"""
+
+    def handle_message(self, message):
+        box_id, buttons = message.box, message.buttons
+
+        with self.lock:
+            if self.solved or self.processing_wrong_result:
+                return
+
+            self.box_states[box_id] = buttons
+
+            totals = [0] * 6
+            for state in self.box_states.values():
+                for i, v in enumerate(state):
+                    totals[i] += v
+
+            print(f"Received box {box_id} state: {buttons}, Totals so far: {totals}")
+
+            streak_idx = self.current_streak - 1
+            giff_idx = self.current_giff - 1
+            target = list(self.botons[streak_idx][giff_idx])
+
+            print(f"Totals: {totals}, Target: {target}")
+
+            if totals == target:
+                if self._solve_timer is None:
+                    self._solve_timer = self.schedule(3.0, self._confirm_solved)
+            else:
+                self._cancel_solve_timer()
+
+
+class LoggingPuzzle12(Puzzle12):
+    LOG_TOTALS = True
+
+
+def payloads(boxes, count, seed):
+    rng = random.Random(seed)
+    return [f"P12,{rng.randint(1, boxes)},{rng.getrandbits(6):06b}" for _ in range(count)]
+
+
+def direct(puzzle_class, messages):
+    """Microseconds per handle_message call, straight from this thread"""
+    client = SimulatedClient([12])
+    puzzle = puzzle_class(client)
+    client.register_puzzle(puzzle)
+    client.start_puzzle(12)
+    puzzle.schedule = lambda delay, fn: None
+    parse = compile_schema(Puzzle12.MESSAGE_SCHEMA).parse
+    parsed = [parse(payload.split(",")) for payload in messages]
+    started = time.perf_counter()
+    for message in parsed:
+        puzzle.handle_message(message)
+    return (time.perf_counter() - started) / len(parsed) * 1e6
+
+
+def run(puzzle_class, messages, rate):
+    app = SimpleNamespace(static_folder=str(REPO_ROOT / "static"))
+    client = MQTTClient(app, [12], worker_queue_size=len(messages) + 1, broker=InProcessBroker())
+    puzzle = puzzle_class(client)
+    client.register_puzzle(puzzle)
+    client.start_puzzle(12)
+    puzzle.schedule = lambda delay, fn: None  # never solve: every message takes the full path
+
+    sent_at, held, latencies = deque(), [], []
+    handle = puzzle.handle_message
+
+    def timed_handle(message):
+        started = time.perf_counter()
+        try:
+            handle(message)
+        finally:
+            done = time.perf_counter()
+            held.append(done - started)
+            latencies.append(done - sent_at.popleft())
+
+    puzzle.handle_message = timed_handle
+    started = time.perf_counter()
+    for index, payload in enumerate(messages):
+        delay = started + index / rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        sent_at.append(time.perf_counter())
+        client.dispatch(payload)
+    deadline = time.monotonic() + 30
+    while len(latencies) < len(messages) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    puzzle.stop()
+    totals = [sum(state[i] for state in puzzle.box_states.values()) for i in range(6)]
+    consistent = puzzle_class is ResummingPuzzle12 or list(unpack(puzzle.totals_key)) == totals
+    return held, latencies, totals, consistent
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--boxes", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--rate", type=float, default=1000, help="messages per second")
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--seed", type=int, default=12)
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'boxes':>6} {'handler':>12} {'call us':>8} {'held p50 us':>12} {'held p99 us':>12} {'latency p50 us':>15} {'latency p99 us':>15}")
+    for boxes in args.boxes:
+        messages = payloads(boxes, int(args.rate * args.seconds), args.seed)
+        seen = {}
+        for puzzle_class, name in ((ResummingPuzzle12, "re-sum"), (LoggingPuzzle12, "running+log"), (Puzzle12, "running")):
+            rows = []
+            for _ in range(3):
+                stdout = sys.stdout
+                sys.stdout = open(os.devnull, "w")  # handlers print every message
+                try:
+                    cost = direct(puzzle_class, messages)
+                    held, latencies, totals, consistent = run(puzzle_class, messages, args.rate)
+                finally:
+                    sys.stdout.close()
+                    sys.stdout = stdout
+                seen[name] = totals
+                failed |= not consistent
+                rows.append((cost, percentile(held, 0.5), percentile(held, 0.99),
+                             percentile(latencies, 0.5), percentile(latencies, 0.99)))
+            row = [sorted(column)[1] for column in zip(*rows)]
+            print(f"{boxes:>6} {name:>12} {row[0]:>8.1f} {row[1]:>12.1f} {row[2]:>12.1f} {row[3]:>15.1f} {row[4]:>15.1f}")
+        if not seen["re-sum"] == seen["running+log"] == seen["running"]:
+            print(f"{boxes:>6} totals DIFFER between the two handlers")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""Puzzle throughput and latency on the in-process broker (no network).
+
+MQTTClient runs on mqtt.inprocess.InProcessBroker; a second client of the
+same broker plays the hardware and publishes TO_FLASK.
+Payloads are random values generated from each puzzle's MESSAGE_SCHEMA.
+Latency is from publish to the end of the puzzle's handle_message; the
+puzzle worker queue is sized so nothing is dropped. Flat out (the default)
+latency is mostly queueing; --rate paces the publisher instead.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from collections import deque
+from pathlib import Path
+from types import SimpleNamespace
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from mqtt.client import MQTTClient  # noqa: E402
+from mqtt.inprocess import InProcessBroker  # noqa: E402
+from mqtt.puzzle_factory import PUZZLE_CLASSES  # noqa: E402
+from mqtt.router import compile_schema  # noqa: E402
+
+RANDOM_FIELDS = {
+    "int": lambda: str(random.randint(0, 9)),
+    "float": lambda: f"{random.uniform(-3, 3):.2f}",
+    "str": lambda: "".join(random.choice("01234") for _ in range(3)),
+    "bits": lambda: "".join(random.choice("01") for _ in range(6)),
+}
+
+
+def random_payloads(puzzle_class, count):
+    spec = puzzle_class.MESSAGE_SCHEMA
+    head, *fields = spec.split(",")
+    types = [field.split("=")[0].split(":")[1] for field in fields]
+    compile_schema(spec)  # fail early on a bad schema
+    return [",".join([head] + [RANDOM_FIELDS[kind]() for kind in types]) for _ in range(count)]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+def run(puzzle_id, messages, rate, quiet, tracing=False):
+    broker = InProcessBroker()
+    app = SimpleNamespace(static_folder=str(REPO_ROOT / "static"))
+    client = MQTTClient(app, [puzzle_id], worker_queue_size=messages + 1, broker=broker, tracing=tracing)
+    puzzle = PUZZLE_CLASSES[puzzle_id](client)
+    client.register_puzzle(puzzle)
+    client.start_puzzle(puzzle_id)
+
+    sent_at = deque()
+    latencies = []
+    handle = puzzle.handle_message
+
+    def timed_handle(message):
+        try:
+            handle(message)
+        finally:
+            latencies.append(time.perf_counter() - sent_at.popleft())
+
+    puzzle.handle_message = timed_handle
+    payloads = random_payloads(PUZZLE_CLASSES[puzzle_id], messages)
+    device = broker.client("device")
+    device.loop_start()
+
+    stdout = sys.stdout
+    if quiet:
+        sys.stdout = open(os.devnull, "w")  # some handlers print every message
+    try:
+        started = time.perf_counter()
+        for index, payload in enumerate(payloads):
+            if rate:
+                delay = started + index / rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            sent_at.append(time.perf_counter())
+            device.publish("TO_FLASK", payload)
+        deadline = time.monotonic() + 60
+        while len(latencies) < len(payloads) - client.router.stats()["malformed"] and time.monotonic() < deadline:
+            time.sleep(0.001)
+        elapsed = time.perf_counter() - started
+    finally:
+        if quiet:
+            sys.stdout.close()
+            sys.stdout = stdout
+    client.stop_current_puzzle()
+    return {
+        "handled": len(latencies),
+        "rate": len(latencies) / elapsed,
+        "p50": percentile(latencies, 0.5),
+        "p99": percentile(latencies, 0.99),
+        "max": max(latencies, default=0.0),
+        "pushes": client.last_event_id,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--puzzles", type=int, nargs="+", default=[3, 9, 11, 12])
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--rate", type=float, default=0, help="messages per second (0 = flat out)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="keep the puzzles' own prints")
+    parser.add_argument("--tracing", action="store_true", help="with latency tracing on (LATENCY_TRACING)")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    print(f"{'puzzle':>6} {'handled':>8} {'msg/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'pushes':>7}")
+    for puzzle_id in args.puzzles:
+        result = run(puzzle_id, args.messages, args.rate, quiet=not args.verbose, tracing=args.tracing)
+        print(f"{puzzle_id:>6} {result['handled']:>8} {result['rate']:>10,.0f} {result['p50'] * 1000:>8.3f}"
+              f" {result['p99'] * 1000:>8.3f} {result['max'] * 1000:>8.3f} {result['pushes']:>7}")
+
+
+if __name__ == "__main__":
+    main()
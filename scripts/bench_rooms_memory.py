@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""Compare memory of N rooms in one process against N single-room processes.
+
+Each measured process builds the Flask app, the main MQTTClient with its
+puzzles and SSE hub, plus the requested extra Rooms (config.ROOMS style), then
+starts a puzzle in every room and feeds it some messages. The MQTT client
+never connects, so no broker is needed. Peak RSS is read from getrusage.
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+import warnings
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+
+def peak_rss_kb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def run_worker(rooms, messages):
+    """Host `rooms` rooms in this process and print its peak RSS as JSON"""
+    warnings.simplefilter("ignore", DeprecationWarning)
+    import paho.mqtt.client as mqtt
+    from flask import Flask
+
+    from config import PUZZLE_ORDER
+    from mqtt import MQTTClient, Room, SSEHub, create_puzzles
+
+    class OfflineClient(MQTTClient):
+        def _connect(self):
+            self.client = mqtt.Client()
+
+    app = Flask("bench", static_folder=str(REPO_ROOT / "static"))
+    main_client = OfflineClient(app, PUZZLE_ORDER)
+    create_puzzles(main_client, PUZZLE_ORDER)
+    main_hub = SSEHub(snapshot_provider=main_client.get_current_state)
+    main_client.set_update_callback(main_hub.publish)
+    clients = [main_client]
+    for index in range(1, rooms):
+        clients.append(Room(f"room{index}", main_client, PUZZLE_ORDER).client)
+
+    puzzle_id = PUZZLE_ORDER[0]
+    for client in clients:
+        client.start_puzzle(puzzle_id)
+        for message in range(messages):
+            client.dispatch(f"P{puzzle_id},{message % 10},{message % 7}")
+    time.sleep(0.5)  # let the per-puzzle workers drain
+
+    print(json.dumps({"rooms": rooms, "rss_kb": peak_rss_kb()}))
+
+
+def measure(rooms, messages):
+    output = subprocess.run(
+        [sys.executable, __file__, "--worker-rooms", str(rooms), "--messages", str(messages)],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])["rss_kb"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rooms", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--messages", type=int, default=50, help="messages fed to each room")
+    parser.add_argument("--worker-rooms", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker_rooms:
+        run_worker(args.worker_rooms, args.messages)
+        return
+
+    single = measure(1, args.messages)
+    print(f"{'rooms':>5} {'one process MB':>15} {'N processes MB':>15} {'saved':>7}")
+    for rooms in args.rooms:
+        shared = measure(rooms, args.messages)
+        separate = single * rooms
+        print(f"{rooms:>5} {shared / 1024:>15.1f} {separate / 1024:>15.1f} {1 - shared / separate:>7.0%}")
+
+
+if __name__ == "__main__":
+    main()
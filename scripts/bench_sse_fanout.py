@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Benchmark SSE fan-out cost per event as the number of subscribers grows.
+
+Compares the legacy path (raw dict queued per client, json.dumps in every
+client generator) with SSEHub (encode once, share the bytes), reporting
+each side's two costs apart:
+- serialize: JSON encoding per event. Legacy pays it once per subscriber,
+  the hub once in total, so only the legacy column grows with subscribers
+- deliver: queueing the event to each client and taking it out again, per
+  subscriber. The hub's client queues coalesce and count, so this part is
+  dearer than a bare queue.Queue and the hub's total still grows linearly
+"""
+import argparse
+import json
+import queue
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from mqtt.sse_hub import SSEHub, encode_event  # noqa: E402
+
+
+SAMPLE_EVENT = {
+    "puzzle_id": 1,
+    "operations": [[result, index + 1, "N"] for index, result in enumerate(range(5, 20))],
+    "solved": {"result": 12, "text": "5 + 7 = 12"},
+    "round": 2,
+    "round_size": 15,
+}
+
+
+def run_legacy(subscribers, events):
+    """(serialize, deliver) seconds in total"""
+    clients = [queue.Queue() for _ in range(subscribers)]
+    serialize = deliver = 0.0
+    for _ in range(events):
+        start = time.perf_counter()
+        for q in clients:
+            q.put(SAMPLE_EVENT)
+        pending = [q.get_nowait() for q in clients]
+        encode_start = time.perf_counter()
+        for data in pending:
+            f"data: {json.dumps(data)}\n\n".encode("utf-8")
+        end = time.perf_counter()
+        deliver += encode_start - start
+        serialize += end - encode_start
+    return serialize, deliver
+
+
+def run_hub(subscribers, events):
+    """(serialize, deliver) seconds in total; publish() encodes, so that part is timed on its own"""
+    start = time.perf_counter()
+    for event_id in range(events):
+        encode_event(SAMPLE_EVENT, event_id)
+    serialize = time.perf_counter() - start
+
+    hub = SSEHub()
+    clients = [hub.subscribe() for _ in range(subscribers)]
+    start = time.perf_counter()
+    for _ in range(events):
+        hub.publish(SAMPLE_EVENT)
+        for client in clients:
+            client.get(timeout=0)
+    return serialize, time.perf_counter() - start - serialize
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--subscribers", type=int, nargs="+", default=[1, 4, 16, 64, 256])
+    args = parser.parse_args()
+
+    print(f"{'':>6} {'serialize us/event':>28} {'deliver us/event/sub':>28} {'total us/event':>24}")
+    print(f"{'subs':>6} {'legacy':>14} {'hub':>13} {'legacy':>14} {'hub':>13} {'legacy':>12} {'hub':>11}")
+    for subscribers in args.subscribers:
+        legacy = [seconds / args.events * 1e6 for seconds in run_legacy(subscribers, args.events)]
+        hub = [seconds / args.events * 1e6 for seconds in run_hub(subscribers, args.events)]
+        print(f"{subscribers:>6} {legacy[0]:>14.1f} {hub[0]:>13.1f} {legacy[1] / subscribers:>14.2f} "
+              f"{hub[1] / subscribers:>13.2f} {sum(legacy):>12.1f} {sum(hub):>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
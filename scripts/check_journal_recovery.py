@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""Crash and recover puzzles from the session journal (mqtt/journal.py).
+
+For each puzzle: a client with a SessionJournal in a temporary directory,
+on virtual time (VirtualScheduler), starts it and handles random TO_FLASK
+input (from the MESSAGE_SCHEMA, as in bench_puzzle_throughput.py) in small
+bursts with up to a few seconds between them, so its timers, the snapshots
+after them and the snapshot roll-overs happen mid-game. Then it "crashes"
+(its journal stops writing) and a second client on the same directory
+recovers: its puzzle attributes (snapshot_state) must match the crashed
+one's. The crashed puzzle keeps running as the game that never stopped:
+both advance --settle virtual seconds, take the same new input and advance
+again, and must still match, so a recovered puzzle that never leaves a
+pause, or whose timers jump to another phase, fails. Also compares the
+dispatch -> handle_message latency of Puzzle12 at a fixed rate with and
+without the journal. Exits 1 on any mismatch.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from types import SimpleNamespace
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+sys.path.insert(0, str(REPO_ROOT / "scripts"))
+
+from bench_puzzle_throughput import random_payloads  # noqa: E402
+from mqtt.client import MQTTClient  # noqa: E402
+from mqtt.clock import VirtualClock  # noqa: E402
+from mqtt.inprocess import InProcessBroker  # noqa: E402
+from mqtt.journal import SessionJournal  # noqa: E402
+from mqtt.puzzle_factory import PUZZLE_CLASSES  # noqa: E402
+from mqtt.scheduler import VirtualScheduler  # noqa: E402
+
+# Deadlines read from the clock while a message is handled: a replayed
+# message reads the time of the recovery instead
+CLOCK_FIELDS = {
+    2: {"block_until"},
+}
+
+
+def make_client(puzzle_id, directory, snapshot_interval, queue_size=256, clock=None):
+    journal = SessionJournal(directory, fsync_interval=0.02, snapshot_interval=snapshot_interval) if directory else None
+    app = SimpleNamespace(static_folder=str(REPO_ROOT / "static"))
+    scheduler = VirtualScheduler(clock) if clock else None
+    client = MQTTClient(app, [puzzle_id], worker_queue_size=queue_size, broker=InProcessBroker(), journal=journal,
+                        clock=clock, scheduler=scheduler)
+    client.register_puzzle(PUZZLE_CLASSES[puzzle_id](client))
+    return client, journal
+
+
+def wait_idle(client, total, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if sum(worker["handled"] for worker in client.dispatcher.stats()["puzzles"]) >= total:
+            return True
+        time.sleep(0.005)
+    return False
+
+
+def flush(client):
+    """Wait until every worker has run what was queued so far (messages, snapshots)"""
+    for worker in client.dispatcher.workers.values():
+        done = threading.Event()
+        worker.call(done.set)
+        done.wait(10)
+
+
+def play(client, payloads, rng, burst=10, max_gap=3.0):
+    """Bursts of input with up to max_gap virtual seconds between them"""
+    for start in range(0, len(payloads), burst):
+        for payload in payloads[start:start + burst]:
+            client.dispatch(payload)
+        flush(client)
+        client.scheduler.advance(rng.uniform(0, max_gap))
+        flush(client)
+
+
+def mismatches(puzzle_id, expected, actual):
+    ignored = CLOCK_FIELDS.get(puzzle_id, set())
+    return sorted(name for name in set(expected) | set(actual)
+                  if name not in ignored and repr(expected.get(name)) != repr(actual.get(name)))
+
+
+def check(puzzle_id, messages, snapshot_interval, settle, probes, seed):
+    directory = tempfile.mkdtemp(prefix=f"journal-p{puzzle_id}-")
+    clock = VirtualClock()
+    client, journal = make_client(puzzle_id, directory, snapshot_interval, clock=clock)
+    random.seed(seed)
+    payloads = random_payloads(PUZZLE_CLASSES[puzzle_id], messages)
+    later = random_payloads(PUZZLE_CLASSES[puzzle_id], probes)
+    client.start_puzzle(puzzle_id)
+    play(client, payloads, random.Random(seed))
+    journal.sync()
+    puzzle = client.puzzles[puzzle_id]
+    expected = puzzle.snapshot_state()
+
+    # Crash: nothing more reaches the disk. The puzzle itself runs on as the
+    # game that never stopped.
+    journal.current = None
+    segments = sorted(os.listdir(directory))
+
+    recovered_clock = VirtualClock(clock.start_time)
+    recovered_clock.advance_to(clock.monotonic())
+    recovered_client, recovered_journal = make_client(puzzle_id, directory, snapshot_interval, clock=recovered_clock)
+    summary = recovered_journal.recover(recovered_client, budget=5.0)
+    if summary is None:
+        return None, segments, {}
+    recovered = recovered_client.puzzles[puzzle_id]
+    actual = recovered.snapshot_state()
+    found = {"after recovery": (mismatches(puzzle_id, expected, actual), expected, actual)}
+
+    # Snapshots reseed random: without them both games draw the same values
+    recovered_journal.current = None
+    for side in (client, recovered_client):
+        random.seed(seed)  # both draw the same values from here on
+        side.scheduler.advance(settle)
+        flush(side)
+        for payload in later:
+            side.dispatch(payload)
+        flush(side)
+        side.scheduler.advance(settle)
+        flush(side)
+    expected, actual = puzzle.snapshot_state(), recovered.snapshot_state()
+    found[f"{settle:g} s + {probes} inputs later"] = (mismatches(puzzle_id, expected, actual), expected, actual)
+    errors = client.scheduler.errors + recovered_client.scheduler.errors
+    if errors:
+        found["scheduler"] = ([f"{errors} callback errors"], {}, {})
+    for side in (client, recovered_client):
+        side.stop_current_puzzle()
+    recovered_journal.sync()
+    return summary, segments, found
+
+
+def latency(puzzle_id, messages, rate, journaled):
+    """dispatch -> end of handle_message at a fixed rate: (p50, p99) in microseconds"""
+    directory = tempfile.mkdtemp(prefix="journal-bench-") if journaled else None
+    client, journal = make_client(puzzle_id, directory, 30, queue_size=messages + 1)
+    client.start_puzzle(puzzle_id)
+    puzzle = client.puzzles[puzzle_id]
+    sent_at, latencies = deque(), []
+    handle = puzzle.handle_message
+
+    def timed_handle(message):
+        try:
+            handle(message)
+        finally:
+            latencies.append(time.perf_counter() - sent_at.popleft())
+
+    puzzle.handle_message = timed_handle
+    payloads = random_payloads(PUZZLE_CLASSES[puzzle_id], messages)
+    started = time.perf_counter()
+    for index, payload in enumerate(payloads):
+        delay = started + index / rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        sent_at.append(time.perf_counter())
+        client.dispatch(payload)
+    wait_idle(client, messages, timeout=120)
+    puzzle.stop()
+    if journal:
+        journal.sync()
+    latencies.sort()
+    return latencies[len(latencies) // 2] * 1e6, latencies[int(len(latencies) * 0.99)] * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--puzzles", type=int, nargs="+", default=sorted(PUZZLE_CLASSES))
+    parser.add_argument("--messages", type=int, default=400, help="random messages per puzzle")
+    parser.add_argument("--snapshot-interval", type=float, default=5.0, help="virtual seconds between roll-overs")
+    parser.add_argument("--settle", type=float, default=60.0, help="virtual seconds both games run on after the crash")
+    parser.add_argument("--probes", type=int, default=40, help="random messages both games get after --settle")
+    parser.add_argument("--seed", type=int, default=21)
+    parser.add_argument("--bench-messages", type=int, default=6000, help="0 skips the latency comparison")
+    parser.add_argument("--bench-rate", type=float, default=2000, help="messages per second in the comparison")
+    args = parser.parse_args()
+
+    failed = False
+    stdout = sys.stdout
+    for puzzle_id in args.puzzles:
+        sys.stdout = open(os.devnull, "w")  # handlers print every message
+        try:
+            summary, segments, found = check(puzzle_id, args.messages, args.snapshot_interval,
+                                             args.settle, args.probes, args.seed)
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+        if summary is None:
+            print(f"puzzle {puzzle_id:>2}: FAIL nothing recovered from {segments}")
+            failed = True
+            continue
+        bad = any(names for names, _, _ in found.values())
+        failed |= bad
+        print(f"puzzle {puzzle_id:>2}: {'FAIL' if bad else 'ok  '} from {summary['from']} + {summary['replayed']} messages "
+              f"in {summary['ms']:.1f} ms ({segments[-1]})")
+        for when, (names, expected, actual) in found.items():
+            for name in names:
+                print(f"    {when}: {name}: expected {expected.get(name)!r}, recovered {actual.get(name)!r}")
+
+    if args.bench_messages:
+        sys.stdout = open(os.devnull, "w")
+        try:
+            runs = [(journaled, latency(12, args.bench_messages, args.bench_rate, journaled))
+                    for journaled in (False, True) * 3]
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+        for journaled in (False, True):
+            p50 = sorted(result[0] for flag, result in runs if flag == journaled)[1]
+            p99 = sorted(result[1] for flag, result in runs if flag == journaled)[1]
+            print(f"puzzle 12 at {args.bench_rate:.0f} msg/s, {'with' if journaled else 'without'} journal: "
+                  f"dispatch -> handled p50 {p50:.0f} us, p99 {p99:.0f} us (median of 3 runs)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
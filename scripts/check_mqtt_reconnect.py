@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""Kill the MQTT broker mid-game and check nothing the app sends is lost.
+
+Uses a minimal stand-in broker (MQTT 3.1.1, QoS 0: CONNECT, SUBSCRIBE,
+PUBLISH, PINGREQ) on a local port instead of Mosquitto:
+
+1. MQTTClient is created while the broker is down: startup must not block.
+2. The broker starts; Puzzle10 starts and boxes 0-4 are solved through
+   TO_FLASK messages sent by the broker.
+3. The broker is killed. Boxes 5-7 are solved meanwhile (as if the input had
+   arrived just before): P10Solved5..7 must wait in the outbound queue.
+4. The broker comes back on the same port. The client must reconnect,
+   resubscribe TO_FLASK (boxes 8-9 are solved through it) and flush the queue.
+
+Passes when the broker received P10Start, P10Solved0..9 and P10End in order.
+"""
+import argparse
+import socket
+import struct
+import sys
+import threading
+import time
+import warnings
+from pathlib import Path
+from types import SimpleNamespace
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from mqtt.client import MQTTClient  # noqa: E402
+from mqtt.puzzles.puzzle10 import Puzzle10  # noqa: E402
+
+
+def read_packet(sock):
+    """(first byte, body) of one MQTT control packet, or None on EOF"""
+    header = sock.recv(1)
+    if not header:
+        return None
+    length, shift = 0, 0
+    while True:
+        byte = sock.recv(1)
+        if not byte:
+            return None
+        length += (byte[0] & 0x7F) << shift
+        shift += 7
+        if not byte[0] & 0x80:
+            break
+    body = b""
+    while len(body) < length:
+        chunk = sock.recv(length - len(body))
+        if not chunk:
+            return None
+        body += chunk
+    return header[0], body
+
+
+def encode_packet(first_byte, body):
+    length, encoded = len(body), bytearray()
+    while True:
+        byte, length = length % 128, length // 128
+        encoded.append(byte | (0x80 if length else 0))
+        if not length:
+            break
+    return bytes([first_byte]) + bytes(encoded) + body
+
+
+def encode_string(value):
+    data = value.encode("utf-8")
+    return struct.pack("!H", len(data)) + data
+
+
+class StandInBroker:
+    """Just enough of an MQTT broker for one client, killable and restartable"""
+
+    def __init__(self, port):
+        self.port = port
+        self.lock = threading.Lock()
+        self.received = []        # (topic, payload) published by clients, across restarts
+        self.subscriptions = {}   # socket -> set of topics
+        self.server = None
+
+    def start(self):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(("127.0.0.1", self.port))
+        self.server.listen()
+        threading.Thread(target=self._accept, args=(self.server,), daemon=True).start()
+
+    def kill(self):
+        """Drop the listener and every connection, like a crashed broker"""
+        self.server.close()
+        with self.lock:
+            connections, self.subscriptions = list(self.subscriptions), {}
+        for conn in connections:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            conn.close()
+
+    def publish(self, topic, payload):
+        """Deliver a message to the clients subscribed to topic"""
+        packet = encode_packet(0x30, encode_string(topic) + payload.encode("utf-8"))
+        with self.lock:
+            targets = [conn for conn, topics in self.subscriptions.items() if topic in topics]
+        for conn in targets:
+            conn.sendall(packet)
+        return len(targets)
+
+    def subscribed(self, topic):
+        with self.lock:
+            return any(topic in topics for topics in self.subscriptions.values())
+
+    def _accept(self, server):
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return
+            with self.lock:
+                self.subscriptions[conn] = set()
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        try:
+            while True:
+                packet = read_packet(conn)
+                if packet is None:
+                    break
+                first_byte, body = packet
+                kind = first_byte >> 4
+                if kind == 1:  # CONNECT
+                    conn.sendall(encode_packet(0x20, b"\x00\x00"))
+                elif kind == 8:  # SUBSCRIBE
+                    packet_id, position, granted = body[:2], 2, b""
+                    while position < len(body):
+                        (size,) = struct.unpack("!H", body[position:position + 2])
+                        topic = body[position + 2:position + 2 + size].decode("utf-8")
+                        with self.lock:
+                            self.subscriptions.get(conn, set()).add(topic)
+                        position += 2 + size + 1
+                        granted += b"\x00"
+                    conn.sendall(encode_packet(0x90, packet_id + granted))
+                elif kind == 3:  # PUBLISH, QoS 0
+                    (size,) = struct.unpack("!H", body[:2])
+                    topic = body[2:2 + size].decode("utf-8")
+                    with self.lock:
+                        self.received.append((topic, body[2 + size:].decode("utf-8")))
+                elif kind == 12:  # PINGREQ
+                    conn.sendall(encode_packet(0xD0, b""))
+                elif kind == 14:  # DISCONNECT
+                    break
+        except OSError:
+            pass
+        with self.lock:
+            self.subscriptions.pop(conn, None)
+        conn.close()
+
+
+def wait_for(condition, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def fail(message):
+    print(f"FAIL: {message}")
+    sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=18830)
+    parser.add_argument("--down-seconds", type=float, default=3, help="how long the broker stays dead")
+    args = parser.parse_args()
+    warnings.simplefilter("ignore", DeprecationWarning)
+
+    broker = StandInBroker(args.port)
+    app = SimpleNamespace(static_folder=str(REPO_ROOT / "static"))
+
+    started = time.monotonic()
+    client = MQTTClient(app, [10], host="127.0.0.1", port=args.port, reconnect_min=0.2, reconnect_max=1)
+    startup = time.monotonic() - started
+    print(f"startup with the broker down: {startup * 1000:.1f} ms")
+    if startup > 1:
+        fail("MQTTClient blocked on the broker at startup")
+    puzzle = Puzzle10(client)
+    client.register_puzzle(puzzle)
+
+    broker.start()
+    if not wait_for(lambda: broker.subscribed("TO_FLASK"), 10):
+        fail("client never connected and subscribed")
+    client.start_puzzle(10)
+    codes = dict(puzzle.current_codes)
+    for box in range(5):
+        broker.publish("TO_FLASK", f"P10,{box},{codes[box]}")
+    from_flask = lambda: [payload for topic, payload in broker.received if topic == "FROM_FLASK"]  # noqa: E731
+    if not wait_for(lambda: "P10Solved4" in from_flask(), 5):
+        fail("boxes 0-4 were not solved through TO_FLASK")
+
+    broker.kill()
+    print("broker killed")
+    if not wait_for(lambda: not client.connected, 5):
+        fail("client did not notice the broker went away")
+    for box in range(5, 8):
+        client.dispatch(f"P10,{box},{codes[box]}")
+    wait_for(lambda: len(puzzle.solved_boxes) == 8, 5)
+    queued = client.connection_stats()["outbound_queued"]
+    print(f"queued while down: {queued}")
+    time.sleep(args.down_seconds)
+
+    broker.start()
+    print("broker restarted")
+    if not wait_for(lambda: broker.subscribed("TO_FLASK"), 10):
+        fail("client did not reconnect and resubscribe TO_FLASK")
+    for box in range(8, 10):
+        broker.publish("TO_FLASK", f"P10,{box},{codes[box]}")
+    expected = ["P10Start"] + [f"P10Solved{box}" for box in range(10)] + ["P10End"]
+    wait_for(lambda: len(from_flask()) >= len(expected), 5)
+
+    print(f"connection: {client.connection_stats()}")
+    if from_flask() != expected:
+        fail(f"broker got {from_flask()}, expected {expected}")
+    print("OK: nothing lost across the broker restart")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""Puzzle12 stays responsive while it pauses between rounds.
+
+Plays Puzzle12 through all its rounds on the in-process broker, with the
+puzzle timers at --speed times real time and the puzzle lock instrumented
+(mqtt/locks.py): every round gets the box states that add up to its target,
+and while the puzzle pauses after a solved streak a prober sends P12 input
+and reads the state as /current_state does. Fails (exit 1) when any hold of
+the puzzle lock, or the p99 of input latency or get_state() during the
+pauses, goes over --max-hold-ms, or when the rounds do not end solved.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from types import SimpleNamespace
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from mqtt.client import MQTTClient  # noqa: E402
+from mqtt.clock import ScaledClock  # noqa: E402
+from mqtt.inprocess import InProcessBroker  # noqa: E402
+from mqtt.locks import LockRegistry  # noqa: E402
+from mqtt.puzzles.puzzle12 import Puzzle12  # noqa: E402
+from mqtt.scheduler import Scheduler  # noqa: E402
+
+
+def solving_boxes(target):
+    """Box payloads whose buttons add up to target: box k presses every button counted above k"""
+    return [f"P12,{k + 1},{''.join('1' if count > k else '0' for count in target)}" for k in range(max(target))]
+
+
+def wait_for(pushes, key, count, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if sum(1 for push in list(pushes) if push.get(key)) >= count:
+            return True
+        time.sleep(0.002)
+    return False
+
+
+def play(speed, probe_rate):
+    clock = ScaledClock(speed)
+    locks = LockRegistry(hold_threshold=0.01)
+    app = SimpleNamespace(static_folder=str(REPO_ROOT / "static"))
+    client = MQTTClient(app, [12], clock=clock, scheduler=Scheduler(clock=clock.monotonic, speed=speed),
+                        broker=InProcessBroker(), lock_registry=locks)
+    puzzle = Puzzle12(client)
+    client.register_puzzle(puzzle)
+    pushes = deque()
+    client.set_update_callback(lambda data, event_id: pushes.append(json.loads(json.dumps(data))))
+
+    sent_at, input_latency, state_latency, seen_transitioning = {}, [], [], [False]
+    handle = puzzle.handle_message
+
+    def timed_handle(message):
+        try:
+            handle(message)
+        finally:
+            started = sent_at.pop(message.box, None)
+            if started is not None:
+                input_latency.append(time.perf_counter() - started)
+
+    puzzle.handle_message = timed_handle
+
+    def probe(stop):
+        box = 100
+        while not stop.wait(1 / probe_rate):
+            box += 1
+            sent_at[box] = time.perf_counter()
+            client.dispatch(f"P12,{box},000000")  # all buttons up: leaves the totals alone
+            started = time.perf_counter()
+            _, state, _ = client.get_current_state_cached()
+            state_latency.append(time.perf_counter() - started)
+            seen_transitioning[0] |= bool(state.get("transitioning"))
+
+    client.start_puzzle(12)
+    timeout = 10 / speed + 2
+    for round_number in range(1, puzzle.streaks + 1):
+        for payload in solving_boxes(puzzle.get_state()["target"]):
+            client.dispatch(payload)
+        if not wait_for(pushes, "streak_solved", round_number, timeout):
+            break
+        stop = threading.Event()
+        prober = threading.Thread(target=probe, args=(stop,), daemon=True)
+        prober.start()
+        if round_number < puzzle.streaks:
+            done = wait_for(pushes, "startRound", round_number + 1, timeout)
+        else:
+            done = wait_for(pushes, "puzzle_solved", 1, timeout)
+        stop.set()
+        prober.join()
+        if not done:
+            break
+    time.sleep(0.05)
+    state = puzzle.get_state()
+    puzzle.stop()
+    return locks.stats()["locks"][0], state, input_latency, state_latency, seen_transitioning[0]
+
+
+def p99(values):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * 0.99))] * 1000 if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--speed", type=float, default=4.0, help="puzzle timers at this many times real time")
+    parser.add_argument("--probe-rate", type=float, default=200, help="probe messages per second during the pauses")
+    parser.add_argument("--max-hold-ms", type=float, default=50.0)
+    args = parser.parse_args()
+
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")  # handlers print every message
+    try:
+        lock, state, input_latency, state_latency, seen_transitioning = play(args.speed, args.probe_rate)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    failures = []
+    hold_max = max(site["hold_ms_max"] for site in lock["sites"].values())
+    print(f"puzzle lock: {lock['hold']['count']} holds, max {hold_max:.2f} ms")
+    for name, site in lock["sites"].items():
+        print(f"    {name}: {site['acquisitions']} x, hold avg {site['hold_ms_avg']:.3f} ms, max {site['hold_ms_max']:.3f} ms")
+    print(f"during the pauses: {len(input_latency)} inputs, dispatch -> handled p99 {p99(input_latency):.2f} ms; "
+          f"{len(state_latency)} state reads, p99 {p99(state_latency):.2f} ms")
+    if hold_max > args.max_hold_ms:
+        failures.append(f"lock held {hold_max:.1f} ms > {args.max_hold_ms:g} ms")
+    if not input_latency or p99(input_latency) > args.max_hold_ms:
+        failures.append("input during the pauses was not handled in time")
+    if not state_latency or p99(state_latency) > args.max_hold_ms:
+        failures.append("state reads during the pauses were slow")
+    if not seen_transitioning:
+        failures.append("get_state() never reported transitioning")
+    if not state["puzzle_solved"]:
+        failures.append(f"puzzle not solved, stopped at round {state['round']}")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if not failures:
+        print(f"ok: {state['total_rounds']} rounds solved, lock holds under {args.max_hold_ms:g} ms")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
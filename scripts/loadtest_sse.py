@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""Load test for the async serving mode (SERVER_MODE = "async").
+
+Starts AsyncServer in-process on a free port, opens N concurrent
+/state_stream subscribers, publishes puzzle events and checks that every
+subscriber receives each one within --max-latency-ms. A plain Flask route is
+requested while the streams are open to check the WSGI side keeps working.
+Exits with status 1 when the bound is not met.
+"""
+import argparse
+import asyncio
+import json
+import resource
+import socket
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from flask import Flask, jsonify  # noqa: E402
+
+from async_server import AsyncServer  # noqa: E402
+from mqtt.sse_hub import SSEHub  # noqa: E402
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def raise_fd_limit(needed):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < needed:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(needed, hard), hard))
+
+
+def start_server(hub, port, threads):
+    app = Flask(__name__)
+
+    @app.route("/ping")
+    def ping():
+        return jsonify({"ok": True})
+
+    server = AsyncServer(app, hub, host="127.0.0.1", port=port, threads=threads)
+    ready = threading.Event()
+
+    def run():
+        async def main():
+            await server.start()
+            ready.set()
+            await server.server.serve_forever()
+        asyncio.run(main())
+
+    threading.Thread(target=run, daemon=True, name="async-server").start()
+    ready.wait(10)
+    return server
+
+
+async def subscriber(port, events, latencies, connected):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port, limit=1 << 20)
+    writer.write(f"GET /state_stream HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\n\r\n".encode())
+    await writer.drain()
+    await reader.readuntil(b"\r\n\r\n")
+    await reader.readuntil(b": init\n\n")
+    connected()
+
+    received = 0
+    while received < events:
+        block = await reader.readuntil(b"\n\n")
+        now = time.perf_counter()
+        for line in block.decode().splitlines():
+            if line.startswith("data: "):
+                sent_at = json.loads(line[6:])["sent_at"]
+                latencies.append((now - sent_at) * 1000)
+                received += 1
+    writer.close()
+
+
+async def http_get(port, path):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n".encode())
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return response.split(b"\r\n", 1)[0].decode()
+
+
+async def run(args):
+    hub = SSEHub(max_pending=args.events + 8)
+    port = free_port()
+    start_server(hub, port, args.threads)
+
+    latencies = []
+    connected = 0
+
+    def on_connected():
+        nonlocal connected
+        connected += 1
+
+    tasks = [
+        asyncio.create_task(subscriber(port, args.events, latencies, on_connected))
+        for _ in range(args.subscribers)
+    ]
+    while connected < args.subscribers:
+        await asyncio.sleep(0.05)
+    while hub.client_count() < args.subscribers:
+        await asyncio.sleep(0.05)
+
+    ping_status = await http_get(port, "/ping")
+    threads_open = threading.active_count()
+
+    for index in range(args.events):
+        # Publish from a worker thread, as the MQTT side does
+        sent_at = time.perf_counter()
+        await asyncio.to_thread(hub.publish, {"puzzle_id": 1, "seq": index, "sent_at": sent_at})
+        await asyncio.sleep(args.interval_ms / 1000)
+
+    await asyncio.wait_for(asyncio.gather(*tasks), timeout=30)
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"subscribers={args.subscribers} events={args.events} deliveries={len(latencies)}")
+    print(f"threads while streaming={threads_open}  /ping -> {ping_status}")
+    print(f"latency ms: p50={statistics.median(latencies):.1f} p95={p95:.1f} max={latencies[-1]:.1f}"
+          f" (bound {args.max_latency_ms} ms)")
+    ok = latencies[-1] <= args.max_latency_ms and len(latencies) == args.subscribers * args.events
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--subscribers", type=int, default=500)
+    parser.add_argument("--events", type=int, default=20)
+    parser.add_argument("--interval-ms", type=float, default=50)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--max-latency-ms", type=float, default=250)
+    args = parser.parse_args()
+
+    raise_fd_limit(args.subscribers * 2 + 64)
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""Replay TO_FLASK scenarios at real hardware rates and measure screen latency.
+
+A scenario is a text file with one message per line, in the usual payload
+syntax (see scripts/scenarios/*.txt):
+
+    # at(s)  payload          {t} = terminal 0..N-1, {t1} = terminal 1..N
+    0.000    P3,{t},3
+    3.000    P3,{t},1
+
+A line without a time comes --gap seconds after the previous one, and the
+mosquitto_pub lines of scriptsBash/*.sh are read as well. Lines with {t} are
+played by --terminals simulated terminals at once, each on its own thread
+(--jitter spreads them), all over one MQTT connection. --speed divides every
+time, --repeat plays the scenario again.
+
+Latency is measured from publish to the next /state_stream event of the same
+puzzle, i.e. how long a press takes to change the screen; publishes that an
+event answers together count once. With --in-process the app is imported
+here on the in-process broker (no Mosquitto, no HTTP) and events are read
+from its SSE hub; otherwise it talks to a running app and broker.
+"""
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+import urllib.request
+import warnings
+from collections import defaultdict, deque
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+MOSQUITTO_PAYLOAD = re.compile(r'-m\s+"([^"]+)"|-m\s+(\S+)')
+
+
+def load_scenario(path, gap):
+    """[(at seconds, payload template)] from a scenario or mosquitto_pub script"""
+    steps = []
+    at = -gap
+    for raw in Path(path).read_text().splitlines():
+        line = raw.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith("mosquitto_pub"):
+            match = MOSQUITTO_PAYLOAD.search(line)
+            if not match:
+                continue
+            at, payload = at + gap, match.group(1) or match.group(2)
+        else:
+            first, _, rest = line.partition(" ")
+            try:
+                at, payload = float(first), rest.strip()
+            except ValueError:
+                at, payload = at + gap, line
+        steps.append((at, payload))
+    return steps
+
+
+def plan(steps, terminals, jitter, speed, repeat, repeat_gap):
+    """Per-terminal lists of (at, payload), sorted, with {t} expanded"""
+    length = max((at for at, _ in steps), default=0) + repeat_gap
+    schedule = defaultdict(list)
+    for round_index in range(repeat):
+        offset = round_index * length
+        for at, payload in steps:
+            if "{t" not in payload:
+                schedule["main"].append(((offset + at) / speed, payload))
+                continue
+            for terminal in range(terminals):
+                delay = random.uniform(0, jitter) if jitter else 0
+                expanded = payload.replace("{t1}", str(terminal + 1)).replace("{t}", str(terminal))
+                schedule[terminal].append(((offset + at) / speed + delay, expanded))
+    for messages in schedule.values():
+        messages.sort(key=lambda item: item[0])
+    return schedule
+
+
+class LatencyTracker:
+    """Pair publishes with the next SSE event of their puzzle"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.waiting = defaultdict(deque)  # puzzle_id -> publish times not answered yet
+        self.latencies = defaultdict(list)
+        self.published = 0
+        self.events = 0
+        self.timing_errors = []
+
+    def published_at(self, payload, scheduled_at, sent_at):
+        match = re.match(r"P(-?\d+),", payload)
+        with self.lock:
+            self.published += 1
+            self.timing_errors.append(sent_at - scheduled_at)
+            if match:
+                self.waiting[int(match.group(1))].append(sent_at)
+
+    def event(self, data, received_at):
+        puzzle_id = data.get("puzzle_id")
+        with self.lock:
+            self.events += 1
+            waiting = self.waiting.get(puzzle_id)
+            if waiting:
+                self.latencies[puzzle_id].append(received_at - waiting[0])
+                waiting.clear()
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+def play(schedule, publish, tracker):
+    started = time.perf_counter() + 0.1
+
+    def terminal(messages):
+        for at, payload in messages:
+            target = started + at
+            while True:
+                remaining = target - time.perf_counter()
+                if remaining <= 0:
+                    break
+                # Sleep most of the wait, spin the last millisecond
+                time.sleep(remaining - 0.001 if remaining > 0.002 else 0)
+            sent_at = time.perf_counter()
+            publish(payload)
+            tracker.published_at(payload, target, sent_at)
+
+    threads = [threading.Thread(target=terminal, args=(messages,), daemon=True) for messages in schedule.values()]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def in_process_target(start):
+    """Import the app on the in-process broker; returns (publish, subscribe events)"""
+    import config
+    config.MQTT_IN_PROCESS = True
+    import app as web
+
+    device = web.mqtt_client.broker.client("load-driver")
+    device.loop_start()
+    if start is not None:
+        if start not in web.mqtt_client.puzzles:
+            # Puzzles outside PUZZLE_ORDER can be driven too
+            from mqtt.puzzle_factory import PUZZLE_CLASSES
+            web.mqtt_client.register_puzzle(PUZZLE_CLASSES[start](web.mqtt_client))
+        web.mqtt_client.start_puzzle(start)
+
+    def read_events(tracker, stop):
+        subscriber = web.sse_hub.subscribe(label="load-driver")
+        while not stop.is_set():
+            frame = subscriber.get(timeout=0.1)
+            if frame is None or b"data: " not in frame:
+                continue
+            tracker.event(json.loads(frame.split(b"data: ", 1)[1]), time.perf_counter())
+        web.sse_hub.unsubscribe(subscriber)
+
+    return lambda payload: device.publish("TO_FLASK", payload), read_events
+
+
+def network_target(args):
+    """Talk to a running app (HTTP) and broker (MQTT)"""
+    import paho.mqtt.client as mqtt
+    from config import MQTT_HOST, MQTT_PORT
+
+    client = mqtt.Client()
+    client.connect(args.host or MQTT_HOST, args.port or MQTT_PORT, 60)
+    client.loop_start()
+    if args.start is not None:
+        urllib.request.urlopen(urllib.request.Request(
+            f"{args.url}/start_puzzle/{args.start}", data=b"", method="POST"), timeout=5)
+
+    def read_events(tracker, stop):
+        with urllib.request.urlopen(f"{args.url}/state_stream", timeout=5) as stream:
+            for line in stream:
+                if stop.is_set():
+                    break
+                if line.startswith(b"data: "):
+                    tracker.event(json.loads(line[6:]), time.perf_counter())
+
+    return lambda payload: client.publish("TO_FLASK", payload), read_events
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenario", type=Path)
+    parser.add_argument("--terminals", type=int, default=10, help="simulated terminals for {t} lines")
+    parser.add_argument("--jitter", type=float, default=0.05, help="random spread of terminals, seconds")
+    parser.add_argument("--speed", type=float, default=1, help="rate multiplier (2 = twice as fast)")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--repeat-gap", type=float, default=1, help="seconds between repetitions")
+    parser.add_argument("--gap", type=float, default=0.1, help="spacing of lines without a time")
+    parser.add_argument("--start", type=int, help="start this puzzle first")
+    parser.add_argument("--settle", type=float, default=1, help="seconds to wait for the last events")
+    parser.add_argument("--in-process", action="store_true", help="run the app here on the in-process broker")
+    parser.add_argument("--url", default="http://localhost:5000", help="running app (without --in-process)")
+    parser.add_argument("--host", help="MQTT broker (default: config.MQTT_HOST)")
+    parser.add_argument("--port", type=int, help="MQTT port (default: config.MQTT_PORT)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    warnings.simplefilter("ignore", DeprecationWarning)
+
+    random.seed(args.seed)
+    steps = load_scenario(args.scenario, args.gap)
+    schedule = plan(steps, args.terminals, args.jitter, args.speed, args.repeat, args.repeat_gap)
+    publish, read_events = in_process_target(args.start) if args.in_process else network_target(args)
+
+    tracker = LatencyTracker()
+    stop = threading.Event()
+    reader = threading.Thread(target=read_events, args=(tracker, stop), daemon=True)
+    reader.start()
+    time.sleep(0.2)  # let the stream connect before the first publish
+
+    started = time.perf_counter()
+    play(schedule, publish, tracker)
+    elapsed = time.perf_counter() - started
+    time.sleep(args.settle)
+    stop.set()
+
+    errors = [abs(error) for error in tracker.timing_errors]
+    print(f"published={tracker.published} in {elapsed:.2f}s ({tracker.published / elapsed:,.0f} msg/s)"
+          f" over {len(schedule)} terminals; sse events={tracker.events}")
+    print(f"send timing error: p50={percentile(errors, 0.5) * 1000:.3f}ms"
+          f" p99={percentile(errors, 0.99) * 1000:.3f}ms")
+    print(f"{'puzzle':>6} {'samples':>8} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for puzzle_id, latencies in sorted(tracker.latencies.items()):
+        print(f"{puzzle_id:>6} {len(latencies):>8} {percentile(latencies, 0.5) * 1000:>8.2f}"
+              f" {percentile(latencies, 0.9) * 1000:>8.2f} {percentile(latencies, 0.99) * 1000:>8.2f}"
+              f" {max(latencies) * 1000:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
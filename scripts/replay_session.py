@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""Replay a recorded session (RECORD_SESSIONS) and diff its pushes.
+
+The recording's inputs (TO_FLASK payloads, puzzle starts/stops,
+timer_expired, random seeds) go back through create_puzzles and
+MQTTClient._on_message:
+- --virtual: mqtt.simulation.SimulatedClient, instantly on virtual time
+- otherwise on the in-process broker at --speed times real time (1 = as
+  recorded), puzzle timers scaled to match, with latency tracing per stage
+
+The pushes of the replay are compared per puzzle with the recorded ones
+(--ignore drops fields that differ by nature, e.g. "generation"). Exits 1
+with --strict when they differ.
+"""
+import argparse
+import difflib
+import json
+import os
+import random
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from mqtt.client import MQTTClient  # noqa: E402
+from mqtt.clock import ScaledClock  # noqa: E402
+from mqtt.inprocess import InProcessBroker  # noqa: E402
+from mqtt.puzzle_factory import create_puzzles  # noqa: E402
+from mqtt.recorder import load_recording  # noqa: E402
+from mqtt.scheduler import Scheduler  # noqa: E402
+from mqtt.simulation import SimulatedClient  # noqa: E402
+
+
+def replay_virtual(puzzle_order, steps, settle):
+    client = SimulatedClient(puzzle_order)
+    create_puzzles(client, puzzle_order)
+    pushed = []
+    # Encoded at push time, like the recording: puzzles mutate what they pushed
+    client.set_update_callback(lambda data, event_id: pushed.append((client.clock.monotonic(), json.dumps(data))))
+    client.run(steps)
+    client.advance(settle)
+    return client, pushed
+
+
+def replay_realtime(puzzle_order, steps, speed, settle):
+    clock = ScaledClock(speed)
+    broker = InProcessBroker()
+    app = SimpleNamespace(static_folder=str(REPO_ROOT / "static"))
+    client = MQTTClient(app, puzzle_order, worker_queue_size=100000, clock=clock,
+                        scheduler=Scheduler(clock=clock.monotonic, speed=speed), broker=broker, tracing=True)
+    create_puzzles(client, puzzle_order)
+    started = clock.monotonic()
+    pushed = []
+    client.set_update_callback(lambda data, event_id: pushed.append((clock.monotonic() - started, json.dumps(data))))
+    device = broker.client("replay")
+    device.connect_async("in-process")
+    device.loop_start()
+    while not client.connected:
+        time.sleep(0.01)
+
+    for step in steps:
+        delay = step["at"] - (clock.monotonic() - started)
+        if delay > 0:
+            clock.sleep(delay)
+        if "mqtt" in step:
+            device.publish("TO_FLASK", step["mqtt"])
+        elif "start" in step:
+            client.start_puzzle(step["start"])
+        elif "stop" in step:
+            with client.lock:
+                client.stop_current_puzzle()
+        elif "timer_expired" in step:
+            client.timer_expired()
+        elif "seed" in step:
+            random.seed(step["seed"])
+    clock.sleep(settle)
+    return client, pushed
+
+
+def by_puzzle(pushes, until, ignore):
+    streams = {}
+    for at, data in pushes:
+        if at > until:
+            continue
+        if isinstance(data, str):
+            data = json.loads(data)
+        data = {key: value for key, value in data.items() if key not in ignore}
+        streams.setdefault(data.get("puzzle_id"), []).append(json.dumps(data, sort_keys=True))
+    return streams
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("recording", help="data/recordings/<start>.jsonl")
+    parser.add_argument("--virtual", action="store_true", help="virtual time instead of the in-process broker")
+    parser.add_argument("--speed", type=float, default=1.0, help="times real time (not with --virtual)")
+    parser.add_argument("--settle", type=float, default=1.0, help="recorded seconds to keep running after the last input")
+    parser.add_argument("--ignore", nargs="*", default=["generation"], help="push fields left out of the diff")
+    parser.add_argument("--show", type=int, default=5, help="differences printed per puzzle")
+    parser.add_argument("--strict", action="store_true", help="exit 1 when the pushes differ")
+    args = parser.parse_args()
+
+    header, steps, recorded = load_recording(args.recording)
+    if not steps:
+        print("No inputs in the recording")
+        return 1
+    # Start at the first input: a recording can begin with a long idle stretch
+    offset = steps[0]["at"]
+    steps = [{**step, "at": step["at"] - offset} for step in steps]
+    recorded = [(at - offset, data) for at, data in recorded if at >= offset]
+    puzzle_order = header.get("puzzle_order") or []
+    until = steps[-1]["at"] + args.settle
+
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")  # handlers print every message
+    started = time.perf_counter()
+    try:
+        if args.virtual:
+            client, replayed = replay_virtual(puzzle_order, steps, args.settle)
+        else:
+            client, replayed = replay_realtime(puzzle_order, steps, args.speed, args.settle)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    elapsed = time.perf_counter() - started
+
+    inputs = sum(1 for step in steps if "mqtt" in step)
+    mode = "virtual time" if args.virtual else f"{args.speed:g}x"
+    print(f"{args.recording}: {inputs} TO_FLASK inputs over {steps[-1]['at']:.1f} s, replayed at {mode} in {elapsed:.2f} s")
+
+    different = False
+    expected, actual = by_puzzle(recorded, until, set(args.ignore)), by_puzzle(replayed, until, set(args.ignore))
+    for puzzle_id in sorted(set(expected) | set(actual), key=str):
+        want, got = expected.get(puzzle_id, []), actual.get(puzzle_id, [])
+        matcher = difflib.SequenceMatcher(None, want, got, autojunk=False)
+        same = sum(block.size for block in matcher.get_matching_blocks())
+        status = "same" if same == len(want) == len(got) else "DIFF"
+        different |= status == "DIFF"
+        print(f"  puzzle {puzzle_id}: {status} recorded {len(want)} pushes, replayed {len(got)}, {same} in common")
+        shown = 0
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == "equal" or shown >= args.show:
+                continue
+            shown += 1
+            for line in want[i1:i2][:2]:
+                print(f"    - {line[:160]}")
+            for line in got[j1:j2][:2]:
+                print(f"    + {line[:160]}")
+
+    if client.tracer is not None:
+        print("  latency per stage (p50 / p99 ms):")
+        for puzzle in client.tracer.stats(recent=0)["puzzles"]:
+            stages = ", ".join(f"{stage} {stats['p50_ms']:.3f} / {stats['p99_ms']:.3f}"
+                               for stage, stats in puzzle["stages"].items())
+            print(f"    puzzle {puzzle['puzzle_id']}: {stages}")
+    return 1 if args.strict and different else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
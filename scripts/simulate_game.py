@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""Replay a game on virtual time (mqtt.simulation.SimulatedClient).
+
+With --scenario, replays a JSON list of timed steps (see
+scripts/scenarios/sample_game.json). Without it, plays PUZZLE_ORDER plus the
+final puzzle with random hardware input and timer expirations. Prints the
+virtual game length, the wall time it took and what the puzzles sent.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from config import PUZZLE_FINAL, PUZZLE_ORDER  # noqa: E402
+from mqtt.puzzle_factory import PUZZLE_CLASSES  # noqa: E402
+from mqtt.simulation import SimulatedClient  # noqa: E402
+
+
+def random_game(args):
+    """Steps for a whole game played with random input"""
+    steps = []
+    at = 0.0
+    for puzzle_id in list(PUZZLE_ORDER) + [PUZZLE_FINAL]:
+        steps.append({"at": at, "start": puzzle_id})
+        end = at + args.seconds_per_puzzle
+        next_timer = at + args.timer_seconds
+        while at < end:
+            at += random.expovariate(args.rate)
+            if at >= next_timer:
+                steps.append({"at": next_timer, "timer_expired": True})
+                next_timer += args.timer_seconds
+            parts = [f"P{puzzle_id}", str(random.randint(0, 9)), str(random.randint(-1, 9))]
+            if puzzle_id == 12:
+                parts[2] = "".join(random.choice("01") for _ in range(6))
+            steps.append({"at": at, "mqtt": ",".join(parts)})
+    steps.append({"at": at, "stop": True})
+    return steps
+
+
+def play(steps, seed, start_time):
+    random.seed(seed)
+    client = SimulatedClient(PUZZLE_ORDER, start_time=start_time)
+    # Every puzzle, so scenarios may start ones outside PUZZLE_ORDER
+    for puzzle_class in PUZZLE_CLASSES.values():
+        client.register_puzzle(puzzle_class(client))
+    started = time.perf_counter()
+    client.run(steps)
+    elapsed = time.perf_counter() - started
+    return client, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--scenario", type=Path, help="JSON list of timed steps")
+    parser.add_argument("--seconds-per-puzzle", type=float, default=600)
+    parser.add_argument("--rate", type=float, default=2, help="random messages per virtual second")
+    parser.add_argument("--timer-seconds", type=float, default=120)
+    parser.add_argument("--repeat", type=int, default=1, help="play the same game N times")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--show-sent", action="store_true", help="print every outbound MQTT message")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    if args.scenario:
+        steps = json.loads(args.scenario.read_text())
+    else:
+        steps = random_game(args)
+
+    start_time = time.time()
+    results = [play(steps, args.seed, start_time) for _ in range(args.repeat)]
+    client, _ = results[0]
+    wall = sum(elapsed for _, elapsed in results)
+    virtual = client.clock.monotonic()
+
+    if args.show_sent:
+        for at, topic, message in client.sent:
+            print(f"{at:9.2f}s {topic} {message}")
+
+    finished = [message for _, _, message in client.sent if message.endswith("End")]
+    per_puzzle = Counter(payload.get("puzzle_id") for _, payload in client.pushed)
+    print(f"steps={len(steps)} virtual={virtual:.1f}s wall={wall / args.repeat * 1000:.1f}ms/game"
+          f" speedup={virtual * args.repeat / wall:,.0f}x")
+    print(f"pushes={len(client.pushed)} by puzzle={dict(sorted(per_puzzle.items()))}")
+    print(f"mqtt sent={len(client.sent)} finished={finished}")
+    print(f"dispatch={client.dispatcher.stats()} scheduler={client.scheduler.stats()}")
+
+    # Same seed and steps must give the same game every time
+    reference = [payload for _, payload in client.pushed]
+    if any([payload for _, payload in other.pushed] != reference for other, _ in results[1:]):
+        print("FAIL: replays diverged")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""Stress test for puzzle run generations (stale timers after a restart).
+
+Builds every puzzle against an in-memory client (real SSEHub, Scheduler and
+MessageDispatcher, no MQTT broker), feeds random hardware input and restarts
+each puzzle many times per second. Scheduler delays are divided by --speedup
+so countdowns and delayed flows actually fire between restarts.
+
+A subscriber checks that, per puzzle, the "generation" carried by the stream
+never goes back: an event from a previous run arriving after the first event
+of a newer one is a stale event. Exits with status 1 if any is seen.
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from mqtt.clock import SystemClock  # noqa: E402
+from mqtt.dispatcher import MessageDispatcher  # noqa: E402
+from mqtt.router import MessageRouter  # noqa: E402
+from mqtt.puzzle_factory import PUZZLE_CLASSES  # noqa: E402
+from mqtt.scheduler import Scheduler  # noqa: E402
+from mqtt.sse_hub import SSEHub  # noqa: E402
+
+
+class FastScheduler(Scheduler):
+    def __init__(self, speedup):
+        super().__init__()
+        self.speedup = speedup
+
+    def call_later(self, delay, fn, *args):
+        return super().call_later(delay / self.speedup, fn, *args)
+
+
+class StressClient:
+    """Stands in for MQTTClient: same push path, no broker"""
+
+    def __init__(self, hub, speedup):
+        self.app = SimpleNamespace(static_folder=str(REPO_ROOT / "static"))
+        self.hub = hub
+        self.clock = SystemClock()
+        self.scheduler = FastScheduler(speedup)
+        self.router = MessageRouter()
+        self.dispatcher = MessageDispatcher()
+        self.tracer = None
+        self.locks = None
+        self.journal = None
+        self.current_puzzle_id = 2  # lets Puzzle2's alarm flow run
+        self.push_lock = threading.Lock()
+        self.last_event_id = 0
+        self.sent = 0
+
+    def push_update(self, data, full=None):
+        with self.push_lock:
+            self.last_event_id += 1
+            self.hub.publish(data, self.last_event_id)
+
+    def send_message(self, topic, message):
+        self.sent += 1
+
+
+def check_stream(client, stop, result):
+    """Consume the stream and record generation regressions per puzzle"""
+    latest = {}
+    while not (stop.is_set() and client.stats()["pending"] == 0):
+        frame = client.get(timeout=0.1)
+        if frame is None:
+            continue
+        data = json.loads(frame.decode("utf-8").split("data: ", 1)[1])
+        result["events"] += 1
+        generation = data.get("generation")
+        if generation is None:
+            continue  # delta patch: belongs to the generation of its keyframe
+        puzzle_id = data["puzzle_id"]
+        if generation < latest.get(puzzle_id, 0):
+            result["stale"] += 1
+            if result["stale"] <= 5:
+                print(f"stale event: puzzle {puzzle_id} generation {generation} "
+                      f"after {latest[puzzle_id]}: {sorted(data)}")
+        latest[puzzle_id] = max(generation, latest.get(puzzle_id, 0))
+
+
+def feed_input(mqtt_client, puzzles, stop, rate):
+    while not stop.is_set():
+        puzzle = random.choice(puzzles)
+        if random.random() < 0.05:
+            puzzle.timer_expired()
+        else:
+            parts = [f"P{puzzle.id}", str(random.randint(0, 10)), str(random.randint(-1, 10))]
+            if puzzle.id == 12:
+                parts[2] = "".join(random.choice("01") for _ in range(6))
+            routed = mqtt_client.router.route(",".join(parts))
+            if routed:
+                mqtt_client.dispatcher.dispatch(*routed)
+        time.sleep(1 / rate)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--restarts-per-second", type=float, default=30,
+                        help="restarts per second for each puzzle")
+    parser.add_argument("--input-rate", type=float, default=500, help="messages per second")
+    parser.add_argument("--speedup", type=float, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    hub = SSEHub(max_pending=1_000_000)
+    mqtt_client = StressClient(hub, args.speedup)
+    puzzles = [cls(mqtt_client) for _, cls in sorted(PUZZLE_CLASSES.items())]
+    for puzzle in puzzles:
+        mqtt_client.router.register(puzzle)
+        mqtt_client.dispatcher.register(puzzle)
+        puzzle.reset()
+
+    subscriber = hub.subscribe(label="stress")
+    stop = threading.Event()
+    result = {"events": 0, "stale": 0}
+    checker = threading.Thread(target=check_stream, args=(subscriber, stop, result))
+    checker.start()
+    threading.Thread(target=feed_input, args=(mqtt_client, puzzles, stop, args.input_rate),
+                     daemon=True).start()
+
+    restarts = 0
+    deadline = time.monotonic() + args.seconds
+    while time.monotonic() < deadline:
+        for puzzle in puzzles:
+            puzzle.stop()
+            puzzle.reset()
+            restarts += 1
+        time.sleep(1 / args.restarts_per_second)
+
+    # Let in-flight callbacks finish before draining the stream
+    time.sleep(0.5)
+    stop.set()
+    checker.join()
+
+    dropped = sum(puzzle.stale_dropped for puzzle in puzzles)
+    print(f"puzzles={len(puzzles)} restarts={restarts} events={result['events']}")
+    print(f"stale callbacks/pushes dropped at the source={dropped}")
+    print(f"scheduler={mqtt_client.scheduler.stats()}")
+    print(f"stale events seen by the subscriber={result['stale']}")
+    print("OK" if result["stale"] == 0 else "FAIL")
+    sys.exit(0 if result["stale"] == 0 else 1)
+
+
+if __name__ == "__main__":
+    main()
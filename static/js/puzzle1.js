@@ -663,8 +663,12 @@
             `${minutes.toString().padStart(2, '0')}:${seconds.toString().padStart(2, '0')}`;
     }
 
+    // Kept across reconnects so the server can replay the events we missed
+    let lastEventId = null;
+
     function initSSE() {
-        const es = new EventSource("/state_stream");
+        const streamUrl = lastEventId ? `/state_stream?puzzle=1&last_event_id=${lastEventId}` : "/state_stream?puzzle=1";
+        const es = new EventSource(streamUrl);
 
         es.onopen = () => {
             console.log("SSE connection opened.");
@@ -675,13 +679,16 @@
         es.onmessage = (evt) => {
             try {
                 console.log("Received SSE message:", evt.data);
-                const data = JSON.parse(evt.data);
-                handleUpdate(data);
+                if (evt.lastEventId) lastEventId = evt.lastEventId;
+                const data = SSEDelta.decode(JSON.parse(evt.data));
+                if (data) handleUpdate(data);
             } catch (e) {
                 console.warn("Bad SSE data", e);
             }
         };
 
+        es.addEventListener("resync", () => loadCurrentState());
+
         es.onerror = () => {
             console.error("SSE connection lost. Attempting to reconnect...");
             es.close();
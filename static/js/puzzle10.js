@@ -309,7 +309,7 @@
     }
 
     function initSSE() {
-        const es = new EventSource('/state_stream');
+        const es = new EventSource('/state_stream?puzzle=10');
         es.onmessage = evt => {
             try {
                 handleUpdate(JSON.parse(evt.data));
@@ -319,6 +319,10 @@
             fetch('/start_puzzle/10', { method: 'POST' })
                 .catch(err => console.warn('Failed to start puzzle 10:', err));
         };
+        es.addEventListener('resync', () => {
+            snapshotLoaded = false;
+            loadSnapshot();
+        });
     }
 
     function initAudioPolicyHandling() {
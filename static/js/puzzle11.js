@@ -162,15 +162,26 @@
         }
     }
 
+    function loadSnapshot() {
+        fetch('/current_state')
+            .then(function (r) { return r.json(); })
+            .then(handleUpdate)
+            .catch(function () {});
+    }
+
     function initSSE() {
-        var es = new EventSource('/state_stream');
+        var es = new EventSource('/state_stream?puzzle=11');
         es.onmessage = function (evt) {
-            try { handleUpdate(JSON.parse(evt.data)); } catch (e) {}
+            try {
+                var data = SSEDelta.decode(JSON.parse(evt.data));
+                if (data) handleUpdate(data);
+            } catch (e) {}
         };
         es.onopen = function () {
             fetch('/start_puzzle/11', { method: 'POST' })
                 .catch(function (err) { console.warn('Failed to start puzzle 11:', err); });
         };
+        es.addEventListener('resync', function () { loadSnapshot(); });
     }
 
     document.addEventListener('DOMContentLoaded', function () {
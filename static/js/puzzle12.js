@@ -242,8 +242,15 @@
         }
     }
 
+    function loadSnapshot() {
+        fetch("/current_state")
+            .then(r => r.json())
+            .then(handleUpdate)
+            .catch(() => {});
+    }
+
     function initSSE() {
-        const es = new EventSource("/state_stream");
+        const es = new EventSource("/state_stream?puzzle=12");
         es.onopen = () => {
             fetch("/start_puzzle/12", { method: "POST" })
                 .catch(err => console.warn("Failed to start puzzle 12:", err));
@@ -251,6 +258,7 @@
         es.onmessage = (evt) => {
             try {handleUpdate(JSON.parse(evt.data));} catch (e) { console.warn("Bad SSE data", e);}
         };
+        es.addEventListener("resync", () => loadSnapshot());
     }
 
     function installDebugHelpers() {
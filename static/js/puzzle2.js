@@ -436,6 +436,9 @@
             .catch(err => console.warn("Failed to load current state for puzzle 2:", err));
     }
 
+    // Kept across reconnects so the server can replay the events we missed
+    let lastEventId = null;
+
     function initSSE() {
         
         for (let player = 1; player <= PLAYER_COUNT; player++) {
@@ -449,19 +452,22 @@
 
         loadCurrentState();
 
-        const es = new EventSource("/state_stream");
+        const streamUrl = lastEventId ? `/state_stream?puzzle=2&last_event_id=${lastEventId}` : "/state_stream?puzzle=2";
+        const es = new EventSource(streamUrl);
         es.onopen = () => {
             fetch("/start_puzzle/2", { method: "POST" })
                 .catch(err => console.warn("Failed to start puzzle 2:", err));
         };
         es.onmessage = (evt) => {
             try {
+                if (evt.lastEventId) lastEventId = evt.lastEventId;
                 const data = JSON.parse(evt.data);
                 handleUpdate(data);
             } catch (e) {
                 console.warn("Bad SSE data", e);
             }
         };
+        es.addEventListener("resync", () => loadCurrentState());
         es.onerror = () => {
             es.close();
             setTimeout(initSSE, 5000);
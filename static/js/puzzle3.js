@@ -282,7 +282,7 @@
     }
 
     function initSSE() {
-        const es = new EventSource('/state_stream');
+        const es = new EventSource('/state_stream?puzzle=3');
         es.onmessage = evt => {
             try {
                 handleUpdate(JSON.parse(evt.data));
@@ -293,6 +293,7 @@
             fetch('/start_puzzle/3', { method: 'POST' })
                 .catch(err => console.warn("Failed to start puzzle 3:", err));
         };
+        es.addEventListener('resync', () => loadSnapshot());
         //es.onopen = () => loadSnapshot();
     }
 
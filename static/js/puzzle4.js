@@ -527,8 +527,15 @@
         };
     }
 
+    function loadSnapshot() {
+        fetch('/current_state')
+            .then(r => r.json())
+            .then(handleUpdate)
+            .catch(() => {});
+    }
+
     function initSSE() {
-        const es = new EventSource('/state_stream');
+        const es = new EventSource('/state_stream?puzzle=4');
 
         es.onmessage = evt => {
             try {
@@ -541,6 +548,8 @@
                 .catch(err => console.warn("Failed to start puzzle 4:", err));
         };
 
+        es.addEventListener('resync', () => loadSnapshot());
+
         es.onerror = () => {};
     }
 
@@ -568,7 +568,7 @@
     }
 
     function initSSE() {
-        const es = new EventSource('/state_stream');
+        const es = new EventSource('/state_stream?puzzle=5');
         es.onmessage = evt => { 
             try { 
                 handleUpdate(JSON.parse(evt.data),'SSE'); 
@@ -583,6 +583,10 @@
                 .then(() => loadSnapshot('start_puzzle/5'))
                 .catch(err => console.warn("Failed to start puzzle 5:", err));
         };
+        es.addEventListener('resync', () => {
+            snapshotRequested = false;
+            loadSnapshot('resync');
+        });
         es.onerror = () => console.error('[P5] SSE error');
         
     }
@@ -362,7 +362,7 @@
     }
 
     function initSSE() {
-        const es = new EventSource('/state_stream');
+        const es = new EventSource('/state_stream?puzzle=6');
         es.onmessage = evt => {
             try { handleUpdate(JSON.parse(evt.data)); } catch(e) {
                 console.error('[P6] SSE error:', e);
@@ -373,6 +373,7 @@
             fetch("/start_puzzle/6", { method: "POST" })
                 .catch(err => console.warn("Failed to start puzzle 6:", err));
         };
+        es.addEventListener('resync', () => loadSnapshot());
         es.onerror = () => console.error('[P6] SSE connection error');
     }
 
@@ -118,7 +118,7 @@
     }
 
     function initSSE() {
-        const es = new EventSource('/state_stream');
+        const es = new EventSource('/state_stream?puzzle=7');
         es.onmessage = evt => {
             try {
                 handleUpdate(JSON.parse(evt.data));
@@ -129,6 +129,10 @@
             fetch("/start_puzzle/7", { method: "POST" })
                 .catch(err => console.warn("Failed to start puzzle 7:", err));
         };
+        es.addEventListener('resync', () => {
+            snapshotLoaded = false;
+            loadSnapshot();
+        });
     }
 
     document.addEventListener('DOMContentLoaded', () => {
@@ -317,13 +317,17 @@
     }
 
     function initSSE() {
-        const es = new EventSource('/state_stream');
+        const es = new EventSource('/state_stream?puzzle=8');
         es.onmessage = evt => { try { handleUpdate(JSON.parse(evt.data)); } catch {} };
         es.onopen = () => {
             loadSnapshotOnce();
             fetch("/start_puzzle/8", { method: "POST" })
                 .catch(err => console.warn("Failed to start puzzle 8:", err));
         };
+        es.addEventListener('resync', () => {
+            snapshotLoaded = false;
+            loadSnapshotOnce();
+        });
         es.onerror = () => {};
     }
 
@@ -396,17 +396,26 @@
         }
     }
 
+    function loadSnapshot() {
+        fetch('/current_state')
+            .then(r => r.json())
+            .then(handleUpdate)
+            .catch(() => {});
+    }
+
     function initSSE() {
-        const es = new EventSource('/state_stream');
+        const es = new EventSource('/state_stream?puzzle=9');
         es.onmessage = evt => {
             try {
-                handleUpdate(JSON.parse(evt.data));
+                const data = SSEDelta.decode(JSON.parse(evt.data));
+                if (data) handleUpdate(data);
             } catch {}
         };
         es.onopen = () => {
             fetch('/start_puzzle/9', { method: 'POST' })
                 .catch(err => console.warn('Failed to start puzzle 9:', err));
         };
+        es.addEventListener('resync', () => loadSnapshot());
     }
 
     function installDebugHelpers() {
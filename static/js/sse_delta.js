@@ -0,0 +1,56 @@
+// Rebuilds full SSE payloads for puzzles that push diffs (delta_push on the backend).
+// Keyframes carry the whole payload; patches apply to the previous payload of the
+// same puzzle. Plain payloads from other puzzles pass through unchanged.
+(function () {
+    const chains = {};  // puzzle_id -> { seq, payload }
+
+    function clone(value) {
+        return JSON.parse(JSON.stringify(value));
+    }
+
+    function applyOp(target, op) {
+        const [kind, path, value] = op;
+        if (path.length === 0) return kind === 'set' ? value : target;
+
+        let node = target;
+        for (let i = 0; i < path.length - 1; i++) {
+            node = node[path[i]];
+        }
+        const last = path[path.length - 1];
+        if (kind === 'del') {
+            delete node[last];
+        } else {
+            node[last] = value;
+        }
+        return target;
+    }
+
+    function decode(data) {
+        if (!data || data.delta_seq === undefined) return data;
+
+        const puzzleId = data.puzzle_id;
+        if (data.keyframe) {
+            const payload = Object.assign({}, data);
+            delete payload.delta_seq;
+            delete payload.keyframe;
+            chains[puzzleId] = { seq: data.delta_seq, payload: clone(payload) };
+            return payload;
+        }
+
+        const chain = chains[puzzleId];
+        if (!chain || chain.seq !== data.delta_seq - 1) {
+            // Missed part of the chain: wait for the next keyframe
+            delete chains[puzzleId];
+            return null;
+        }
+
+        let payload = clone(chain.payload);
+        data.patch.forEach(op => {
+            payload = applyOp(payload, op);
+        });
+        chains[puzzleId] = { seq: data.delta_seq, payload: payload };
+        return clone(payload);
+    }
+
+    window.SSEDelta = { decode };
+})();
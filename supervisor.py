@@ -0,0 +1,397 @@
+"""Run every room in config.ROOMS in its own worker process.
+
+    python supervisor.py
+
+Each worker is a normal app.py process (same routes, same MQTTClient) bound
+to a local port, with its MQTT traffic going through this supervisor:
+
+- one broker connection for all rooms: room/<id>/TO_FLASK is forwarded to
+  that room's worker and whatever the worker publishes goes out as
+  room/<id>/<topic> (see mqtt/bridge.py for the worker side);
+- one HTTP entry point on SERVER_HOST:SERVER_PORT: /room/<id>/<path> is
+  proxied to <path> on that room's worker (SSE included). Pages use
+  absolute URLs, so the proxy also sets a room cookie and routes requests
+  without the /room/<id> prefix by it;
+- crashed workers are restarted on the puzzle they were on (the room's
+  current puzzle is saved under SUPERVISOR_STATE_DIR);
+- GET /supervisor/rooms reports per-room CPU, memory, restarts and MQTT
+  event latency.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import paho.mqtt.client as mqtt
+
+from config import (
+    MQTT_HOST, MQTT_PORT, MQTT_KEEPALIVE, MQTT_RECONNECT_MIN, MQTT_RECONNECT_MAX,
+    ROOMS, SERVER_HOST, SERVER_PORT, SERVER_MODE, SERVER_THREADS,
+    SUPERVISOR_BRIDGE_PORT, SUPERVISOR_WORKER_BASE_PORT, SUPERVISOR_STATE_DIR,
+)
+
+BASE_DIR = Path(__file__).resolve().parent
+ROOM_COOKIE = "jocpro_room"
+MONITOR_SECONDS = 1
+PING_SECONDS = 5
+RESTART_DELAY_SECONDS = 1
+MAX_LINE_BYTES = 16 * 1024 * 1024
+
+
+class RoomWorker:
+    """One room's worker process and what the supervisor knows about it"""
+
+    def __init__(self, room_id, puzzle_order, port, state_dir):
+        self.room_id = room_id
+        self.puzzle_order = list(puzzle_order)
+        self.port = port
+        self.state_path = state_dir / f"{room_id}.json"
+        self.state = self._load_state()
+        self.process = None
+        self.started_at = None
+        self.exited_at = None
+        self.restarts = 0
+        self.writer = None  # bridge stream, set once the worker says hello
+
+        self.cpu_ticks = None
+        self.cpu_percent = None
+        self.rss_mb = None
+        self.ping_ms = None
+        self.report = {}
+        self.forwarded = 0
+        self.dropped = 0
+
+    def _load_state(self):
+        try:
+            return json.loads(self.state_path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def save_state(self, state):
+        self.state = state
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.state_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(state))
+        os.replace(tmp_path, self.state_path)
+
+    def start(self):
+        self.process = subprocess.Popen(
+            [
+                sys.executable, str(BASE_DIR / "supervisor.py"),
+                "--worker", self.room_id,
+                "--port", str(self.port),
+                "--puzzles", ",".join(str(puzzle_id) for puzzle_id in self.puzzle_order),
+            ],
+            cwd=BASE_DIR,
+        )
+        self.started_at = time.time()
+        self.exited_at = None
+        self.cpu_ticks = None
+        print(f"[supervisor] Room {self.room_id}: worker pid {self.process.pid} on port {self.port}")
+
+    @property
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def sample(self, interval):
+        """Refresh CPU and memory figures from /proc (Linux only)"""
+        if not self.alive:
+            self.cpu_percent = self.rss_mb = None
+            return
+        pid = self.process.pid
+        try:
+            fields = Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()
+            ticks = int(fields[11]) + int(fields[12])  # utime + stime
+            for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+                if line.startswith("VmRSS:"):
+                    self.rss_mb = round(int(line.split()[1]) / 1024, 1)
+        except (OSError, IndexError, ValueError):
+            return
+        if self.cpu_ticks is not None:
+            seconds = (ticks - self.cpu_ticks) / os.sysconf("SC_CLK_TCK")
+            self.cpu_percent = round(seconds / interval * 100, 1)
+        self.cpu_ticks = ticks
+
+    def stats(self):
+        bridge = self.report.get("bridge", {})
+        worker = self.report.get("worker", {})
+        return {
+            "room": self.room_id,
+            "pid": self.process.pid if self.process else None,
+            "alive": self.alive,
+            "port": self.port,
+            "restarts": self.restarts,
+            "uptime_s": round(time.time() - self.started_at, 1) if self.alive else 0,
+            "connected": self.writer is not None,
+            "cpu_percent": self.cpu_percent,
+            "rss_mb": self.rss_mb,
+            "current_puzzle_id": self.state.get("current_puzzle_id"),
+            "mqtt_forwarded": self.forwarded,
+            "mqtt_dropped": self.dropped,
+            "bridge_ping_ms": self.ping_ms,
+            # Event latency: supervisor -> worker transit, then queue wait and handler
+            "event_transit_ms_avg": bridge.get("transit_ms_avg"),
+            "event_transit_ms_max": bridge.get("transit_ms_max"),
+            "event_queue_wait_ms_max": worker.get("queue_wait_ms_max"),
+            "event_handler_ms_max": worker.get("handler_ms_max"),
+            "events_handled": worker.get("handled"),
+            "last_event_id": worker.get("last_event_id"),
+        }
+
+
+class Supervisor:
+    def __init__(self, rooms, host, port, bridge_port, base_port, state_dir):
+        self.host = host
+        self.port = port
+        self.bridge_port = bridge_port
+        self.workers = {}
+        for offset, (room_id, puzzle_order) in enumerate(rooms.items()):
+            self.workers[str(room_id)] = RoomWorker(
+                str(room_id), puzzle_order, base_port + offset, Path(state_dir)
+            )
+        self.default_room = next(iter(self.workers), None)
+        self.loop = None
+        self.mqtt = None
+
+    # --- Pooled MQTT connection ---
+
+    def _connect_mqtt(self):
+        self.mqtt = mqtt.Client()
+        self.mqtt.on_connect = self._on_mqtt_connect
+        self.mqtt.on_message = self._on_mqtt_message
+        self.mqtt.reconnect_delay_set(MQTT_RECONNECT_MIN, MQTT_RECONNECT_MAX)
+        self.mqtt.connect_async(MQTT_HOST, MQTT_PORT, MQTT_KEEPALIVE)
+        self.mqtt.loop_start()
+
+    def _on_mqtt_connect(self, client, userdata, flags, rc):
+        print(f"[supervisor] Connected to MQTT broker: {rc}")
+        client.subscribe("room/+/TO_FLASK")
+
+    def _on_mqtt_message(self, client, userdata, msg):
+        # paho thread: hand over to the loop, which owns the bridge streams
+        try:
+            _, room_id, topic = msg.topic.split("/", 2)
+            line = json.dumps({
+                "op": "message",
+                "topic": topic,
+                "payload": msg.payload.decode("utf-8"),
+                "at": time.time(),
+            })
+            self.loop.call_soon_threadsafe(self._forward, room_id, line)
+        except Exception as e:
+            print(f"[supervisor] Error in _on_mqtt_message ({msg.topic}): {e}")
+
+    def _forward(self, room_id, line):
+        worker = self.workers.get(room_id)
+        if worker is None:
+            return
+        if worker.writer is None:
+            worker.dropped += 1  # worker down or restarting
+            return
+        worker.forwarded += 1
+        worker.writer.write(line.encode("utf-8") + b"\n")
+
+    def _send(self, worker, message):
+        if worker.writer is not None:
+            worker.writer.write(json.dumps(message).encode("utf-8") + b"\n")
+
+    # --- Bridge to the workers ---
+
+    async def _handle_bridge(self, reader, writer):
+        try:
+            hello = json.loads(await reader.readline())
+        except ValueError:
+            writer.close()
+            return
+        worker = self.workers.get(hello.get("room"))
+        if worker is None:
+            writer.close()
+            return
+        worker.writer = writer
+        self._send(worker, {"op": "restore", "state": worker.state})
+        try:
+            async for line in reader:
+                message = json.loads(line)
+                op = message.get("op")
+                if op == "publish":
+                    self.mqtt.publish(f"room/{worker.room_id}/{message['topic']}", message["payload"],
+                                      retain=message.get("retain", False))
+                elif op == "state":
+                    worker.save_state(message["state"])
+                elif op == "pong":
+                    worker.ping_ms = round((time.time() - message["t"]) * 1000, 3)
+                    worker.report = message
+        except (ConnectionError, ValueError) as e:
+            print(f"[supervisor] Room {worker.room_id}: bridge error {e}")
+        finally:
+            if worker.writer is writer:
+                worker.writer = None
+            writer.close()
+
+    # --- Worker processes ---
+
+    async def _monitor(self):
+        last_ping = 0
+        while True:
+            await asyncio.sleep(MONITOR_SECONDS)
+            now = time.time()
+            for worker in self.workers.values():
+                if not worker.alive:
+                    if worker.exited_at is None:
+                        worker.exited_at = now
+                        print(f"[supervisor] Room {worker.room_id}: worker exited "
+                              f"with {worker.process.returncode}, restarting")
+                    if now - worker.exited_at >= RESTART_DELAY_SECONDS:
+                        worker.restarts += 1
+                        worker.start()
+                worker.sample(MONITOR_SECONDS)
+            if now - last_ping >= PING_SECONDS:
+                last_ping = now
+                for worker in self.workers.values():
+                    self._send(worker, {"op": "ping", "t": now})
+
+    def stop_workers(self):
+        for worker in self.workers.values():
+            if worker.alive:
+                worker.process.terminate()
+
+    # --- HTTP entry point ---
+
+    def _route(self, target, headers):
+        """Return (worker, target on the worker, set room cookie?)"""
+        path, _, query = target.partition("?")
+        parts = path.split("/", 3)
+        if len(parts) >= 3 and parts[1] == "room":
+            rest = "/" + (parts[3] if len(parts) > 3 else "")
+            return self.workers.get(parts[2]), rest + (f"?{query}" if query else ""), True
+        room_id = self.default_room
+        for cookie in headers.get("cookie", "").split(";"):
+            name, _, value = cookie.strip().partition("=")
+            if name == ROOM_COOKIE and value in self.workers:
+                room_id = value
+        return self.workers.get(room_id), target, False
+
+    async def _handle_http(self, reader, writer):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+            lines = head.decode("latin-1").split("\r\n")
+            method, target, protocol = lines[0].split(" ", 2)
+            headers = {}
+            for line in lines[1:]:
+                if line:
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+            if target.split("?")[0] == "/supervisor/rooms":
+                body = json.dumps({"rooms": [w.stats() for w in self.workers.values()]}).encode()
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                             b"Connection: close\r\nContent-Length: %d\r\n\r\n" % len(body) + body)
+                await writer.drain()
+                return
+
+            worker, worker_target, set_cookie = self._route(target, headers)
+            if worker is None:
+                writer.write(b"HTTP/1.1 404 Not Found\r\nConnection: close\r\nContent-Length: 0\r\n\r\n")
+                await writer.drain()
+                return
+            try:
+                upstream_reader, upstream_writer = await asyncio.open_connection("127.0.0.1", worker.port)
+            except OSError:
+                writer.write(b"HTTP/1.1 503 Service Unavailable\r\nConnection: close\r\nContent-Length: 0\r\n\r\n")
+                await writer.drain()
+                return
+
+            # One request per connection, so every request gets routed
+            request_lines = [f"{method} {worker_target} {protocol}"]
+            request_lines += [line for line in lines[1:] if line and not line.lower().startswith("connection:")]
+            request_lines.append("Connection: close")
+            upstream_writer.write(("\r\n".join(request_lines) + "\r\n\r\n").encode("latin-1"))
+
+            async def pipe_request():
+                try:
+                    while chunk := await reader.read(65536):
+                        upstream_writer.write(chunk)
+                        await upstream_writer.drain()
+                except ConnectionError:
+                    pass
+
+            request_task = asyncio.create_task(pipe_request())
+            try:
+                response_head = await upstream_reader.readuntil(b"\r\n\r\n")
+                if set_cookie:
+                    cookie = f"Set-Cookie: {ROOM_COOKIE}={worker.room_id}; Path=/\r\n".encode("latin-1")
+                    response_head = response_head[:-2] + cookie + b"\r\n"
+                writer.write(response_head)
+                await writer.drain()
+                while chunk := await upstream_reader.read(65536):
+                    writer.write(chunk)
+                    await writer.drain()
+            finally:
+                request_task.cancel()
+                upstream_writer.close()
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve_forever(self):
+        self.loop = asyncio.get_running_loop()
+        self._connect_mqtt()
+        bridge = await asyncio.start_server(
+            self._handle_bridge, "127.0.0.1", self.bridge_port, limit=MAX_LINE_BYTES
+        )
+        http = await asyncio.start_server(self._handle_http, self.host, self.port, backlog=1024)
+        for worker in self.workers.values():
+            worker.start()
+        print(f"[supervisor] {len(self.workers)} rooms behind http://{self.host}:{self.port}/room/<id>/")
+        async with bridge, http:
+            await self._monitor()
+
+
+def run_worker(room_id, port, puzzle_order):
+    """Worker process: the usual app.py, bridged to the supervisor"""
+    import config
+    config.PUZZLE_ORDER = puzzle_order
+    config.ROOMS = {}
+    config.ROOM_BRIDGE = {"room": room_id, "address": ("127.0.0.1", SUPERVISOR_BRIDGE_PORT)}
+
+    import app as room_app
+    if SERVER_MODE == "async":
+        from async_server import serve
+        serve(room_app.app, room_app.sse_hub, host="127.0.0.1", port=port, threads=SERVER_THREADS)
+    else:
+        room_app.app.run(host="127.0.0.1", port=port, threaded=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Process-per-room supervisor")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--puzzles", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.port, [int(puzzle_id) for puzzle_id in args.puzzles.split(",")])
+        return
+
+    if not ROOMS:
+        print("[supervisor] config.ROOMS is empty: nothing to run (use app.py for a single room)")
+        return
+    supervisor = Supervisor(
+        ROOMS, SERVER_HOST, SERVER_PORT, SUPERVISOR_BRIDGE_PORT, SUPERVISOR_WORKER_BASE_PORT,
+        SUPERVISOR_STATE_DIR if os.path.isabs(SUPERVISOR_STATE_DIR) else BASE_DIR / SUPERVISOR_STATE_DIR,
+    )
+    try:
+        asyncio.run(supervisor.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        supervisor.stop_workers()
+
+
+if __name__ == "__main__":
+    main()